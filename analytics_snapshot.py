@@ -0,0 +1,33 @@
+"""
+Builds a columnar analytics snapshot of every diet log (see nutrition/analytics.py).
+
+    python analytics_snapshot.py                   into ANALYTICS_SNAPSHOT_DIR
+    python analytics_snapshot.py --dir /data/snap  somewhere else
+
+Run it from cron (e.g. nightly), or queue it from the API with
+POST /api/admin/analytics/snapshot?background=1. Needs numpy.
+"""
+import argparse
+import json
+
+from nutrition import create_app
+from nutrition.analytics import build_snapshot
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export diet logs to a columnar analytics snapshot.")
+    parser.add_argument('--dir', default=None, help="Snapshot directory (default: ANALYTICS_SNAPSHOT_DIR)")
+    parser.add_argument('--keep', type=int, default=None, help="Snapshots to keep (default: ANALYTICS_SNAPSHOT_KEEP)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        manifest = build_snapshot(args.dir, args.keep)
+    summary = {key: manifest[key] for key in ('snapshot_id', 'built_at', 'rows', 'build_seconds')}
+    summary['partitions'] = len(manifest['partitions'])
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+ASGI serving mode.
+
+    uvicorn asgi:application --workers 2
+
+The hot read routes below run as native async handlers on an async SQLAlchemy
+engine, so a request that is waiting on the database does not hold a thread:
+
+    GET /api/dietlogs/summary
+    GET /api/dietlogs
+    GET /api/recipes/<id>
+    GET /api/ingredients
+
+GET /api/events (the per-user change feed) is also served natively, so an idle
+event stream costs a coroutine rather than a worker thread.
+
+Every other route (and any hot-route request using ?fields=, and the diet log
+routes when SHARD_DATABASE_URLS is set or RESULT_CACHE_BACKEND is not 'off')
+is served by the normal Flask app through asgiref's WsgiToAsgi adapter, so
+behaviour is the same as under `python app.py`.
+
+Experimental: the gain over the WSGI mode against MySQL has not been measured
+yet (see loadtest.py); a local SQLite run showed parity. Record the MySQL
+numbers in loadtest.py before relying on it in production.
+
+The async engine URL is derived from SQLALCHEMY_DATABASE_URI (pymysql -> aiomysql,
+sqlite -> aiosqlite) unless ASYNC_DATABASE_URI is set.
+Needs: asgiref, aiomysql (or aiosqlite), greenlet.
+"""
+import asyncio
+import datetime
+import os
+import re
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError, InvalidTokenError
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from nutrition import create_app
+from nutrition.admission import check_rate_limit, retry_after_header
+from nutrition.compression import choose_encoding, compress_body
+from nutrition.diettags import tag_names
+from nutrition.events import HEARTBEAT, RESYNC, format_sse, get_broker
+from nutrition.models import Recipe, Recipe_Ingredient, Ingredient, Nutrition
+from nutrition.routes.dietlogs import (
+    diet_logs_statement, serialize_diet_log,
+    dietlog_summary_options, dietlog_summary_statement, serialize_dietlog_summary
+)
+from nutrition.ratings import serialize_rating
+from nutrition.routes.recipes import serialize_recipe_ingredient
+from nutrition.singleflight import coalesced_call
+
+app = create_app()
+
+ASYNC_DRIVERS = {
+    'mysql+pymysql': 'mysql+aiomysql',
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_database_uri():
+    if os.environ.get('ASYNC_DATABASE_URI'):
+        return os.environ['ASYNC_DATABASE_URI']
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    scheme, _, rest = uri.partition('://')
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+engine = create_async_engine(
+    async_database_uri(),
+    pool_size=int(os.environ.get('ASYNC_DB_POOL_SIZE', 10)),
+    max_overflow=int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 20)),
+    pool_pre_ping=True,
+)
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+wsgi_application = WsgiToAsgi(app)
+
+
+# =========================================================
+# REQUEST / RESPONSE HELPERS
+# =========================================================
+
+class HTTPError(Exception):
+    def __init__(self, status, payload, headers=None):
+        self.status = status
+        self.payload = payload
+        self.headers = headers or []
+
+
+def authenticate(headers):
+    """Same checks and error bodies as @jwt_required() for a header token."""
+    auth = headers.get('authorization', '')
+    if not auth:
+        raise HTTPError(401, {"msg": "Missing Authorization Header"})
+    parts = auth.split()
+    if len(parts) != 2 or parts[0] != 'Bearer':
+        raise HTTPError(422, {"msg": "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"})
+    try:
+        with app.app_context():
+            claims = decode_token(parts[1])
+    except ExpiredSignatureError:
+        raise HTTPError(401, {"msg": "Token has expired"})
+    except InvalidTokenError as e:
+        raise HTTPError(422, {"msg": str(e)})
+    if claims.get('type') != 'access':
+        # @jwt_required() refuses refresh tokens the same way
+        raise HTTPError(422, {"msg": "Only non-refresh tokens are allowed"})
+    return claims[app.config.get('JWT_IDENTITY_CLAIM', 'sub')], claims
+
+
+async def send_json(scope, send, status, payload, headers, extra_headers=()):
+    body = app.json.dumps(payload).encode('utf-8')
+    response_headers = [
+        (b'content-type', b'application/json'),
+        (b'access-control-allow-origin', b'*'),
+        (b'vary', b'Accept-Encoding'),
+        *extra_headers,
+    ]
+    encoding = choose_encoding(headers.get('accept-encoding', ''))
+    if encoding and 200 <= status < 300 and len(body) >= app.config['COMPRESS_MIN_SIZE']:
+        body = compress_body(body, encoding)
+        response_headers.append((b'content-encoding', encoding.encode()))
+    response_headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def query_args(scope):
+    parsed = parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+    return {key: values[0] for key, values in parsed.items()}
+
+
+# =========================================================
+# ASYNC HOT-ROUTE HANDLERS
+# =========================================================
+
+async def dietlog_summary(user_id, claims, args):
+    # Same per-user rate limit as the Flask route. No concurrency slot: an
+    # awaiting handler does not hold a thread, and the async pool bounds the DB.
+    if app.config['ADMISSION_ENABLED']:
+        retry_after = check_rate_limit(app, 'analytics', f"user:{user_id}")
+        if retry_after:
+            raise HTTPError(429, {"error": "Too many requests, slow down."},
+                            [(b'retry-after', retry_after_header(retry_after).encode())])
+    try:
+        options = dietlog_summary_options(args)
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=options['days'] - 1)
+    async with Session() as session:
+        rows = (await session.execute(dietlog_summary_statement(
+            user_id, start_date, end_date, options['group_by'], options['include_planned']))).all()
+    return 200, serialize_dietlog_summary(rows, start_date, end_date, **options)
+
+
+async def diet_logs(user_id, claims, args):
+    date_obj = None
+    if args.get('date'):
+        try:
+            date_obj = datetime.datetime.strptime(args['date'], '%Y-%m-%d').date()
+        except ValueError:
+            return 400, {"error": "Invalid date format. Use YYYY-MM-DD."}
+    async with Session() as session:
+        logs = (await session.execute(diet_logs_statement(user_id, date_obj))).all()
+    return 200, [serialize_diet_log(log, recipe_name) for log, recipe_name in logs]
+
+
+async def recipe_detail(user_id, claims, args, recipe_id):
+    async def load_recipe():
+        async with Session() as session:
+            return await session.get(Recipe, recipe_id, options=[joinedload(Recipe.rating)])
+
+    async def load_ingredients():
+        async with Session() as session:
+            return (await session.execute(
+                select(Recipe_Ingredient, Ingredient.Ingredient_Name)
+                .join(Ingredient, Recipe_Ingredient.Ingredient_ID == Ingredient.Ingredient_ID)
+                .where(Recipe_Ingredient.Recipe_ID == recipe_id)
+                .order_by(Recipe_Ingredient.RecipeIngredient_ID)
+            )).all()
+
+    # Recipe row and ingredient lines are fetched concurrently on two connections
+    recipe, ingredients = await asyncio.gather(load_recipe(), load_ingredients())
+    if not recipe:
+        return 404, {"error": "Recipe not found"}
+
+    # --- ADMIN OVERRIDE ---
+    if claims.get("role") != 'admin' and recipe.Creator_User_ID != user_id:
+        return 403, {"error": "Unauthorized"}
+
+    recipe_data = recipe.to_dict()
+    recipe_data['rating'] = serialize_rating(recipe.rating)
+    recipe_data['tags'] = tag_names(recipe.Tag_Mask)
+    recipe_data['ingredients'] = [serialize_recipe_ingredient(ri, name) for ri, name in ingredients]
+    return 200, recipe_data
+
+
+async def ingredients_list(user_id, claims, args):
+    async def load():
+        async with Session() as session:
+            rows = (await session.execute(
+                select(Ingredient, Nutrition)
+                .outerjoin(Nutrition, Ingredient.Ingredient_ID == Nutrition.Ingredient_ID)
+                .order_by(Ingredient.Ingredient_ID)
+            )).all()
+        results = []
+        for ing, nut in rows:
+            ing_data = ing.to_dict()
+            ing_data['tags'] = tag_names(ing.Tag_Mask)
+            ing_data['nutrition'] = nut.to_dict() if nut else None
+            results.append(ing_data)
+        return 200, results
+
+    if not app.config['COALESCE_ENABLED']:
+        return await load()
+    # Same for every caller, like the Flask route's @coalesced('ingredients', scope='public')
+    return await coalesced_call('ingredients', ('ingredients', 'public'), load, app.config['COALESCE_TIMEOUT_SECONDS'])
+
+
+ROUTES = [
+    (re.compile(r'^/api/dietlogs/summary$'), dietlog_summary),
+    (re.compile(r'^/api/dietlogs$'), diet_logs),
+    (re.compile(r'^/api/recipes/(\d+)$'), recipe_detail),
+    (re.compile(r'^/api/ingredients$'), ingredients_list),
+]
+# The async engine only reaches the main database, so with sharding on the
+# routes that read user tables go through Flask (which picks the user's shard).
+USER_TABLE_ROUTES = {dietlog_summary, diet_logs}
+if app.config['SHARD_DATABASE_URLS']:
+    ROUTES = [(pattern, handler) for pattern, handler in ROUTES if handler not in USER_TABLE_ROUTES]
+# The Flask versions of these read through the result cache (@cached_result). Its
+# backends block, so with the cache on they go through Flask too, and both modes
+# serve the same cached (or fresh) answers. ingredients_list coalesces like its
+# Flask twin; recipe detail has neither in either mode.
+CACHED_ROUTES = {dietlog_summary, diet_logs}
+if app.config['RESULT_CACHE_BACKEND'] != 'off':
+    ROUTES = [(pattern, handler) for pattern, handler in ROUTES if handler not in CACHED_ROUTES]
+
+
+def match_route(scope):
+    if scope['method'] != 'GET':
+        return None, None
+    for pattern, handler in ROUTES:
+        m = pattern.match(scope['path'])
+        if m:
+            return handler, [int(g) for g in m.groups()]
+    return None, None
+
+
+# =========================================================
+# CHANGE FEED (Server-Sent Events)
+# =========================================================
+
+async def event_stream(scope, receive, send, headers, args):
+    """Async twin of nutrition/routes/events.py:stream_events."""
+    if 'authorization' not in headers and args.get('jwt'):
+        headers = dict(headers, authorization=f"Bearer {args['jwt']}")
+    try:
+        user_id, claims = authenticate(headers)
+    except HTTPError as e:
+        return await send_json(scope, send, e.status, e.payload, headers)
+
+    config = app.config
+    broker = get_broker(app)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue(maxsize=config['EVENTS_QUEUE_SIZE'])
+    overflowed = asyncio.Event()
+
+    def enqueue(event):
+        try:
+            events.put_nowait(event)
+        except asyncio.QueueFull:
+            overflowed.set()
+
+    def deliver(event):
+        # Publishers run in Flask's threads (or the broker's receiver thread)
+        try:
+            loop.call_soon_threadsafe(enqueue, event)
+        except RuntimeError:
+            pass # Event loop already closed
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def send_chunk(text, more_body=True):
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': more_body})
+
+    token, refused = broker.subscribe_within(
+        user_id, deliver, config['EVENTS_MAX_CONNECTIONS'], config['EVENTS_MAX_CONNECTIONS_PER_USER'])
+    if refused == 'total':
+        return await send_json(scope, send, 503, {"error": "Too many open event streams"}, headers, [(b'retry-after', b'30')])
+    if refused == 'user':
+        return await send_json(scope, send, 429, {"error": "Too many open event streams for this user"}, headers, [(b'retry-after', b'30')])
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            (b'access-control-allow-origin', b'*'),
+        ]})
+        await send_chunk("retry: 5000\n\n")
+        while True:
+            if overflowed.is_set():
+                await send_chunk(format_sse(RESYNC), more_body=False)
+                return
+            next_event = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({next_event, disconnected}, timeout=config['EVENTS_HEARTBEAT_SECONDS'],
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_event not in done:
+                next_event.cancel()
+            if disconnected in done:
+                return
+            await send_chunk(format_sse(next_event.result()) if next_event in done else HEARTBEAT)
+    finally:
+        broker.unsubscribe(user_id, token)
+        disconnected.cancel()
+
+
+# =========================================================
+# ASGI ENTRY POINT
+# =========================================================
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] == 'http':
+        handler, path_args = match_route(scope)
+        args = query_args(scope)
+        if scope['method'] == 'GET' and scope['path'] == '/api/events':
+            headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+            await event_stream(scope, receive, send, headers, args)
+            return
+        # ?fields= (sparse fieldsets) is only implemented by the Flask routes
+        if handler and 'fields' not in args:
+            headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+            extra_headers = []
+            try:
+                user_id, claims = authenticate(headers)
+                status, payload = await handler(user_id, claims, args, *path_args)
+            except HTTPError as e:
+                status, payload, extra_headers = e.status, e.payload, e.headers
+            await send_json(scope, send, status, payload, headers, extra_headers)
+            return
+
+    await wsgi_application(scope, receive, send)
+
+
+# gunicorn.conf.py finds the Flask app (for warmup) through this attribute
+application.flask_app = app
@@ -0,0 +1,123 @@
+"""
+Diet log write benchmark: one commit per request vs. group commit.
+
+    python benchmarks/groupcommit.py --threads 32 --requests 2000
+    DATABASE_URL=mysql+pymysql://... python benchmarks/groupcommit.py
+
+Runs the same burst of POST /api/dietlogs (plus a toggle of each new log with
+--toggles) through the app's test client twice: once with
+DIETLOG_GROUP_COMMIT off and once with it on. Reports writes/second and
+p50/p99 latency for each mode. Uses DATABASE_URL (see nutrition/config.py),
+or a throwaway SQLite file when --sqlite is given. The rows it writes belong
+to a dedicated benchmark user, which is deleted afterwards.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from loadtest import percentile
+from nutrition import create_app
+from nutrition.extensions import db
+from nutrition.models import User
+from nutrition.routes.users import delete_user_accounts
+
+
+def run_mode(app, token, threads, total_requests, toggles):
+    headers = {'Authorization': f'Bearer {token}'}
+    counter = iter(range(total_requests))
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+    start_gate = threading.Barrier(threads)
+
+    def client():
+        http = app.test_client()
+        start_gate.wait()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            resp = http.post('/api/dietlogs', headers=headers, json={'Date': '2026-01-01', 'Notes': 'benchmark'})
+            ok = resp.status_code == 201
+            if ok and toggles:
+                ok = http.put(f"/api/dietlogs/{resp.get_json()['Log_ID']}/toggle", headers=headers).status_code == 200
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    writes = len(latencies) * (2 if toggles else 1)
+    return {
+        'requests': total_requests,
+        'errors': len(errors),
+        'seconds': round(wall, 3),
+        'writes_per_second': round(writes / wall, 1) if wall else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request commits with group commit for diet log writes.")
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--toggles', action='store_true', help="Also toggle each new log (two writes per request)")
+    parser.add_argument('--max-delay-ms', type=float, default=5)
+    parser.add_argument('--max-rows', type=int, default=200)
+    parser.add_argument('--sqlite', action='store_true', help="Use a temporary SQLite file instead of DATABASE_URL")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.sqlite:
+        overrides['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tempfile.mkdtemp()}/groupcommit.db"
+
+    results = {}
+    for mode, group_commit in (('per_request_commit', False), ('group_commit', True)):
+        app = create_app({
+            **overrides,
+            'DIETLOG_GROUP_COMMIT': group_commit,
+            'DIETLOG_GROUP_COMMIT_MAX_DELAY_MS': args.max_delay_ms,
+            'DIETLOG_GROUP_COMMIT_MAX_ROWS': args.max_rows,
+            'ADMISSION_ENABLED': False,
+        })
+        with app.app_context():
+            if args.sqlite:
+                db.create_all()
+            user = User(Name='Group commit benchmark', Email=f'groupcommit-{os.getpid()}-{mode}@benchmark.invalid', Password='!')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.User_ID
+            token = create_access_token(identity=user_id, additional_claims={"role": "user"})
+        try:
+            results[mode] = run_mode(app, token, args.threads, args.requests, args.toggles)
+            buffer = app.extensions.get('dietlog_group_commit')
+            if buffer:
+                buffer.close()
+                results[mode]['avg_batch'] = round(buffer.stats['writes'] / max(1, buffer.stats['batches']), 1)
+                results[mode]['largest_batch'] = buffer.stats['largest_batch']
+        finally:
+            with app.app_context():
+                delete_user_accounts([user_id])
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Import-time benchmark (python -X importtime).
+
+    python benchmarks/importtime.py            # measure and compare with the baseline
+    python benchmarks/importtime.py --update   # measure and write a new baseline
+
+Each scenario runs in a fresh interpreter several times; the median is kept.
+The run fails (exit 1) if a scenario is more than --tolerance slower than
+benchmarks/importtime_baseline.json. Timings are machine-dependent, so update
+the baseline from the same machine you compare on.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINE = os.path.join(HERE, 'importtime_baseline.json')
+
+SCENARIOS = {
+    # Importing the package must not pull in Flask extensions, models or routes
+    'import_package': "import nutrition",
+    # What every test, CLI script and worker pays to get an app
+    'create_app': "from nutrition import create_app; create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})",
+}
+
+
+def parse_importtime(stderr):
+    """Returns (total self time in us, {top-level module: cumulative us})."""
+    total = 0
+    top_level = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        if not name.startswith('  '): # Indentation marks nested imports
+            top_level[name.strip()] = int(cumulative_us)
+    return total, top_level
+
+
+def measure(code, runs):
+    totals = []
+    top_level = {}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        total, top_level = parse_importtime(proc.stderr)
+        totals.append(total)
+    heaviest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        'median_ms': round(statistics.median(totals) / 1000, 1),
+        'heaviest_ms': {name: round(us / 1000, 1) for name, us in heaviest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track import time of the nutrition package.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--update', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown (default 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = {name: measure(code, args.runs) for name, code in SCENARIOS.items()}
+    print(json.dumps(results, indent=2))
+
+    if args.update:
+        with open(BASELINE, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {BASELINE}")
+        return 0
+
+    if not os.path.exists(BASELINE):
+        print("No baseline yet; run with --update to create one.")
+        return 0
+
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    failed = False
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median_ms'], result['median_ms']
+        change = (after - before) / before if before else 0
+        status = 'SLOWER' if change > args.tolerance else 'ok'
+        failed |= status == 'SLOWER'
+        print(f"{name:16s} {before:8.1f} ms -> {after:8.1f} ms ({change:+.0%}) {status}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+End-to-end benchmark suite: a synthetic dataset, page-level request mixes and
+a JSON baseline. Run `python -m benchmarks.suite --help` from the repository root.
+"""
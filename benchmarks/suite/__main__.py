@@ -0,0 +1,146 @@
+"""
+End-to-end benchmark suite.
+
+    python -m benchmarks.suite                          # tiny dataset on a throwaway SQLite file
+    python -m benchmarks.suite --scale small --threads 8 --seconds 30
+    python -m benchmarks.suite --update                 # write benchmarks/suite/baseline.json
+    python -m benchmarks.suite --database-url mysql+pymysql://.../bench_empty
+
+Seeds a synthetic dataset (see datagen.py) into an empty database, runs every
+coverage flow once, then drives weighted page mixes (see pages.py) through the
+app's test client on --threads threads. Reports throughput, p50/p95/p99 per
+page and per route, and SQL statements per request. On SQLite the stored
+routines are served by sqlite_compat.py; on MySQL the real ones run, so load
+the schema's routines into the target database first.
+
+Without --update, results are compared with baseline.json: the run fails
+(exit 1) if a route issues more statements than before, or its p95 or the
+overall throughput is more than --tolerance worse. Timings are
+machine-dependent; statement counts are not.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from flask_jwt_extended import create_access_token
+
+from nutrition import create_app
+from nutrition.extensions import db
+
+from . import datagen, runner, sqlite_compat
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+
+def make_app(database_url, snapshot_dir):
+    overrides = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SHARD_DATABASE_URLS': [],
+        'ADMISSION_ENABLED': False, # Measure the routes, not load shedding
+        'ANALYTICS_SNAPSHOT_DIR': snapshot_dir,
+        'JWT_VERIFY_SUB': False, # The app issues integer identities
+    }
+    if database_url.startswith('sqlite'):
+        overrides['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_compat.engine_options()
+    app = create_app(overrides)
+    with app.app_context():
+        sqlite_compat.install(db.engine)
+    return app
+
+
+def compare(results, baseline, tolerance):
+    """Prints one line per regression check. Returns True if anything regressed."""
+    failed = False
+    before, after = baseline['overall']['requests_per_second'], results['overall']['requests_per_second']
+    change = (after - before) / before if before else 0
+    status = 'SLOWER' if change < -tolerance else 'ok'
+    failed |= status == 'SLOWER'
+    print(f"{'throughput':48s} {before:9.1f} req/s -> {after:9.1f} req/s ({change:+.0%}) {status}")
+    for label, route in sorted(results['routes'].items()):
+        old = baseline['routes'].get(label)
+        if not old:
+            continue
+        if route['max_statements'] > old['max_statements']: # max, since cached routes vary on average
+            failed = True
+            print(f"{label:48s} {old['max_statements']:9d} stmts -> {route['max_statements']:9d} stmts MORE SQL")
+        change = (route['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+        status = 'SLOWER' if change > tolerance else 'ok'
+        failed |= status == 'SLOWER'
+        print(f"{label:48s} {old['p95_ms']:9.2f} ms p95 -> {route['p95_ms']:9.2f} ms p95 ({change:+.0%}) {status}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a synthetic dataset and benchmark page-level request mixes.")
+    parser.add_argument('--scale', choices=sorted(datagen.SCALES), default='tiny')
+    parser.add_argument('--users', type=int, help="Override the scale's user count")
+    parser.add_argument('--years', type=float, help="Override the scale's years of diet logs")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=None, help="Run pages for this long")
+    parser.add_argument('--pages', type=int, default=None, help="Run this many pages (default 2000 unless --seconds)")
+    parser.add_argument('--database-url', default=None, help="An EMPTY database to seed (default: a temporary SQLite file)")
+    parser.add_argument('--update', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown (default 0.2 = 20%%)")
+    args = parser.parse_args()
+    if args.seconds is None and args.pages is None:
+        args.pages = 2000
+
+    scale = dict(datagen.SCALES[args.scale])
+    if args.users:
+        scale['users'] = args.users
+    if args.years:
+        scale['years'] = args.years
+
+    workdir = tempfile.mkdtemp(prefix='nutrition-bench-') # SQLite file and analytics snapshots
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    app = make_app(database_url, os.path.join(workdir, 'analytics'))
+    with app.app_context():
+        db.create_all()
+        fixtures = datagen.seed(scale, args.seed)
+        tokens = {uid: create_access_token(identity=uid, additional_claims={"role": "user"}, expires_delta=False)
+                  for uid in fixtures['user_ids']}
+        tokens[fixtures['admin_id']] = create_access_token(
+            identity=fixtures['admin_id'], additional_claims={"role": "admin"}, expires_delta=False)
+    print(f"Seeded {json.dumps(fixtures['counts'])}", file=sys.stderr)
+
+    coverage, coverage_errors = runner.run_coverage(app, fixtures, tokens, args.seed)
+    results, page_errors = runner.run_pages(app, fixtures, tokens, args.threads, args.seconds, args.pages, args.seed)
+    results = {
+        'scale': args.scale,
+        'dataset': fixtures['counts'],
+        'database': database_url.split(':', 1)[0].split('+')[0],
+        **results,
+        'coverage': coverage.summary(),
+        'untouched_routes': runner.untouched_routes(app, list(results['routes']) + list(coverage.samples)),
+    }
+    if not args.database_url:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+    for error in coverage_errors + page_errors:
+        print(f"ERROR {error}", file=sys.stderr)
+
+    if args.update:
+        with open(BASELINE, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {BASELINE}")
+        return 0
+
+    if not os.path.exists(BASELINE):
+        print("No baseline yet; run with --update to create one.")
+        return 1 if coverage_errors else 0
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    if (baseline.get('scale'), baseline.get('database')) != (results['scale'], results['database']):
+        print(f"Baseline is for {baseline.get('scale')} on {baseline.get('database')}; comparing anyway.")
+    failed = compare(results, baseline, args.tolerance)
+    return 1 if failed or coverage_errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Synthetic dataset for the benchmark suite.
+
+seed(scale) fills an empty database with users, ingredients with nutrition,
+recipes with ingredients, meal plans, diet logs going back `years`, feedback
+and weight history, using multi-row INSERTs. The same --seed always produces
+the same data. Recipe popularity is skewed (a few recipes get most logs and
+feedback), like real usage.
+"""
+import datetime
+import random
+
+from sqlalchemy import insert, select
+
+from nutrition.diettags import parse_restrictions, rebuild_recipe_tags, tag_mask
+from nutrition.extensions import bcrypt, db
+from nutrition.models import (
+    User, Ingredient, Nutrition, Recipe, Recipe_Ingredient, Meal_Plan, MealPlan_Recipe,
+    User_Diet_Log, Feedback, User_Weight_History, Recipe_Log,
+)
+from nutrition.lognutrition import backfill_log_nutrition
+from nutrition.ratings import rebuild_recipe_ratings
+
+SCALES = {
+    # users, ingredients, recipes, meal plans per user, fraction of days a user logs, meals per logged day, years
+    'tiny': {'users': 50, 'ingredients': 120, 'recipes': 150, 'plans_per_user': 2, 'active_days': 0.6, 'meals_per_day': 3, 'years': 0.25},
+    'small': {'users': 300, 'ingredients': 400, 'recipes': 800, 'plans_per_user': 3, 'active_days': 0.6, 'meals_per_day': 3, 'years': 1},
+    'medium': {'users': 2000, 'ingredients': 1000, 'recipes': 4000, 'plans_per_user': 4, 'active_days': 0.6, 'meals_per_day': 3, 'years': 2},
+}
+PASSWORD = 'benchmark'
+CHUNK_ROWS = 5000
+CATEGORIES = ['Grain', 'Vegetable', 'Fruit', 'Dairy', 'Meat', 'Fish', 'Legume', 'Nut', 'Spice', 'Oil']
+CUISINES = ['Italian', 'Indian', 'Mexican', 'Japanese', 'Thai', 'French', 'Greek', 'American', None]
+MEAL_TYPES = ['Breakfast', 'Lunch', 'Dinner', 'Snack']
+CATEGORY_TAGS = {'Grain': ['gluten'], 'Dairy': ['dairy'], 'Meat': ['meat'], 'Fish': ['fish'], 'Nut': ['tree_nuts']}
+ALLERGIES = [None, None, None, 'peanuts', 'gluten', 'shellfish, sesame', None, 'milk']
+DIETS = [None, None, 'Vegetarian', None, 'vegan', None, 'halal', None, 'gluten-free']
+ACTIVITY_LEVELS = ['Sedentary', 'Light', 'Moderate', 'Active', 'Very Active']
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), CHUNK_ROWS):
+        db.session.execute(insert(model), rows[start:start + CHUNK_ROWS])
+
+
+def _ids(column):
+    return [row[0] for row in db.session.execute(select(column).order_by(column))]
+
+
+def seed(scale, rng_seed=1, today=None):
+    """Seeds the current app's database. Returns the fixtures the request mixes need."""
+    rng = random.Random(rng_seed)
+    today = today or datetime.date.today()
+    password = bcrypt.generate_password_hash(PASSWORD).decode('utf-8') # One hash: bcrypt is slow on purpose
+
+    users = [{
+        'Name': f'Bench User {i}', 'Email': f'bench{i}@benchmark.invalid', 'Password': password,
+        'Date_Of_Birth': datetime.date(1960, 1, 1) + datetime.timedelta(days=rng.randrange(15000)),
+        'Gender': rng.choice(['Male', 'Female', 'Other']),
+        'Height_cm': rng.randrange(150, 200), 'Weight_kg': round(rng.uniform(50, 110), 1),
+        'Activity_Level': rng.choice(ACTIVITY_LEVELS), 'role': 'user',
+        'Allergies': ALLERGIES[i % len(ALLERGIES)], 'Dietary_Preferences': DIETS[i % len(DIETS)],
+        'Restriction_Mask': parse_restrictions(ALLERGIES[i % len(ALLERGIES)], DIETS[i % len(DIETS)]),
+    } for i in range(scale['users'])]
+    users.append({'Name': 'Bench Admin', 'Email': 'admin@benchmark.invalid', 'Password': password, 'role': 'admin'})
+    _insert(User, users)
+    user_ids = _ids(User.User_ID)
+    admin_id = db.session.scalar(select(User.User_ID).where(User.Email == 'admin@benchmark.invalid'))
+    member_ids = [uid for uid in user_ids if uid != admin_id]
+
+    ingredients = [{
+        'Ingredient_Name': f'Ingredient {i}', 'Unit_Of_Measure': rng.choice(['g', 'ml']),
+        'Category': rng.choice(CATEGORIES),
+    } for i in range(scale['ingredients'])]
+    for ingredient in ingredients:
+        ingredient['Tag_Mask'] = tag_mask(CATEGORY_TAGS.get(ingredient['Category'], []))
+    _insert(Ingredient, ingredients)
+    ingredient_ids = _ids(Ingredient.Ingredient_ID)
+    _insert(Nutrition, [{
+        'Ingredient_ID': iid, 'Calories': round(rng.uniform(10, 600), 2),
+        'Protein_g': round(rng.uniform(0, 30), 2), 'Carbohydrates_g': round(rng.uniform(0, 80), 2),
+        'Fat_g': round(rng.uniform(0, 40), 2), 'Fiber_g': round(rng.uniform(0, 10), 2),
+    } for iid in ingredient_ids])
+
+    _insert(Recipe, [{
+        'Recipe_Name': f'Recipe {i}', 'Cuisine_Type': rng.choice(CUISINES),
+        'Description': 'Synthetic benchmark recipe', 'Serving_Size': rng.choice([1, 2, 4]),
+        'Preparation_Time_minutes': rng.randrange(5, 60), 'Cooking_Time_minutes': rng.randrange(0, 120),
+        'Difficulty_Level': rng.choice(['Easy', 'Medium', 'Hard']), 'Instructions': 'Mix. Cook. Serve.',
+        'Creator_User_ID': member_ids[i % len(member_ids)], # Recipes are private to their creator
+    } for i in range(scale['recipes'])])
+    recipe_ids = _ids(Recipe.Recipe_ID)
+    recipes_by_user = {}
+    for rid, uid in db.session.execute(select(Recipe.Recipe_ID, Recipe.Creator_User_ID)):
+        recipes_by_user.setdefault(uid, []).append(rid)
+    _insert(Recipe_Ingredient, [
+        {'Recipe_ID': rid, 'Ingredient_ID': iid, 'Quantity': round(rng.uniform(5, 300), 1), 'Unit': 'g'}
+        for rid in recipe_ids for iid in rng.sample(ingredient_ids, rng.randrange(4, 13))
+    ])
+    _insert(Recipe_Log, [{'Recipe_ID': rid, 'Recipe_Name': f'Recipe {i}', 'Created_By': rng.choice(member_ids)}
+                         for i, rid in enumerate(recipe_ids)])
+
+    # Popularity: recipe k is picked with weight 1/(k+1)
+    popularity = [1 / (k + 1) for k in range(len(recipe_ids))]
+    def popular_recipes(n):
+        return rng.choices(recipe_ids, weights=popularity, k=n)
+
+    plans = []
+    for uid in member_ids:
+        for p in range(scale['plans_per_user']):
+            start = today - datetime.timedelta(days=7 * p)
+            plans.append({'User_ID': uid, 'Plan_Name': f'Week {p + 1}', 'Start_Date': start,
+                          'End_Date': start + datetime.timedelta(days=6)})
+    _insert(Meal_Plan, plans)
+    plan_rows = db.session.execute(select(Meal_Plan.MealPlan_ID, Meal_Plan.User_ID, Meal_Plan.Start_Date)).all()
+    _insert(MealPlan_Recipe, [
+        {'MealPlan_ID': pid, 'Recipe_ID': rid, 'Day_of_Plan': start + datetime.timedelta(days=day), 'Meal_Type': meal}
+        for pid, _, start in plan_rows
+        for day in range(7) for meal, rid in zip(MEAL_TYPES[:3], popular_recipes(3))
+    ])
+
+    days = int(scale['years'] * 365)
+    logs = []
+    log_count = 0
+    for uid in member_ids:
+        for back in range(days):
+            if rng.random() > scale['active_days']:
+                continue
+            date = today - datetime.timedelta(days=back)
+            for meal, rid in zip(range(scale['meals_per_day']), popular_recipes(scale['meals_per_day'])):
+                logs.append({'User_ID': uid, 'Recipe_ID': rid, 'Date': date,
+                             'Time': datetime.time(7 + meal * 5, 0), 'Portion_Size': rng.choice([0.5, 1, 1, 1.5]),
+                             'is_finished': back > 0 or rng.random() < 0.5})
+        if len(logs) >= CHUNK_ROWS * 10:
+            _insert(User_Diet_Log, logs)
+            log_count += len(logs)
+            logs = []
+    _insert(User_Diet_Log, logs)
+    log_count += len(logs)
+
+    feedback = []
+    for uid in member_ids:
+        for rid in set(popular_recipes(rng.randrange(2, 12))):
+            feedback.append({'User_ID': uid, 'Recipe_ID': rid, 'Rating': rng.choice([3, 4, 4, 5, 5, 2, 1]),
+                             'Comments': 'Synthetic feedback'})
+    _insert(Feedback, feedback)
+    _insert(User_Weight_History, [
+        {'User_ID': uid, 'Old_Weight': 80, 'New_Weight': round(80 + rng.uniform(-3, 3), 1)}
+        for uid in member_ids for _ in range(rng.randrange(1, 6))
+    ])
+    db.session.commit()
+    rebuild_recipe_ratings()
+    rebuild_recipe_tags()
+    backfill_log_nutrition() # The logs above were inserted without their nutrition snapshot
+
+    plans_by_user = {}
+    for pid, uid, _ in plan_rows:
+        plans_by_user.setdefault(uid, []).append(pid)
+    return {
+        'admin_id': admin_id,
+        'user_ids': member_ids,
+        'recipe_ids': recipe_ids,
+        'recipes_by_user': recipes_by_user,
+        'popularity': popularity,
+        'ingredient_ids': ingredient_ids,
+        'plans_by_user': plans_by_user,
+        'counts': {'users': len(member_ids), 'recipes': len(recipe_ids), 'ingredients': len(ingredient_ids),
+                   'meal_plans': len(plan_rows), 'diet_logs': log_count, 'feedback': len(feedback)},
+    }
@@ -0,0 +1,254 @@
+"""
+Page-level request mixes.
+
+Each page function issues the API calls the frontend makes to render one
+screen, in the same order. The runner picks pages at random by PAGES weight
+(dashboards dominate, as they do in real traffic). Requests are reported
+under their route template, e.g. "GET /api/recipes/{recipe_id}".
+
+COVERAGE_FLOWS run once per suite run, before the timed pages. They create
+their own users, recipes, ingredients and plans, touch every write route and
+admin route the pages don't, and delete what they created.
+"""
+import datetime
+
+
+class PageError(Exception):
+    """A request returned an unexpected status; the page stops there."""
+
+
+class Session:
+    """One simulated browser tab: a test client, a logged-in user and the fixtures to pick from."""
+
+    def __init__(self, client, record, rng, fixtures, tokens, user_id):
+        self.client = client
+        self.record = record # record(label, seconds, statements, ok)
+        self.rng = rng
+        self.fixtures = fixtures
+        self.tokens = tokens
+        self.user_id = user_id
+        self.today = datetime.date.today()
+
+    def request(self, method, template, query=None, json=None, as_user=None, expect=(200, 201, 202), **params):
+        """Calls one route and returns the decoded JSON body (or None)."""
+        token = self.tokens[self.user_id if as_user is None else as_user]
+        path = template.format(**params)
+        def call():
+            response = self.client.open(path, method=method, query_string=query, json=json,
+                                        headers={'Authorization': f'Bearer {token}'})
+            response.get_data() # Streamed bodies (exports) run their queries here
+            return response
+        response, seconds, statements = self.record.timed(call)
+        ok = response.status_code in expect
+        self.record(f"{method} {template}", seconds, statements, ok)
+        if not ok:
+            raise PageError(f"{method} {path} -> {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response.get_json(silent=True)
+
+    def recipe_id(self):
+        """A recipe, weighted by popularity like the seeded logs."""
+        return self.rng.choices(self.fixtures['recipe_ids'], weights=self.fixtures['popularity'])[0]
+
+    def own_recipe_id(self):
+        """One of the user's own recipes (only the creator may open a recipe)."""
+        return self.rng.choice(self.fixtures['recipes_by_user'][self.user_id])
+
+    def plan_id(self):
+        return self.rng.choice(self.fixtures['plans_by_user'][self.user_id])
+
+
+# --- Pages ---
+
+def dashboard(s):
+    s.request('GET', '/api/dietlogs/summary', query={'windows': '1,7'})
+    s.request('GET', '/api/dietlogs', query={'date': s.today.isoformat()})
+    s.request('GET', '/api/recipe-log')
+
+
+def recipe_detail(s):
+    recipe_id = s.own_recipe_id()
+    s.request('GET', '/api/recipes/{recipe_id}', recipe_id=recipe_id)
+    s.request('GET', '/api/recipes/{recipe_id}/calories', recipe_id=recipe_id)
+    s.request('GET', '/api/recipes/{recipe_id}/feedback', recipe_id=recipe_id)
+    s.request('GET', '/api/ingredients')
+
+
+def meal_plan_detail(s):
+    plan_id = s.plan_id()
+    s.request('GET', '/api/mealplans/{plan_id}', plan_id=plan_id)
+    s.request('GET', '/api/mealplans/{plan_id}/summary', plan_id=plan_id)
+    s.request('GET', '/api/mealplans/{plan_id}/shopping-list', plan_id=plan_id)
+    s.request('GET', '/api/recipes')
+
+
+def diet_log(s):
+    s.request('GET', '/api/dietlogs', query={'date': s.today.isoformat()})
+    s.request('GET', '/api/recipes')
+    log = s.request('POST', '/api/dietlogs', json={
+        'Recipe_ID': s.recipe_id(), 'Date': s.today.isoformat(), 'Time': '12:30:00', 'Portion_Size': 1,
+    })
+    s.request('PUT', '/api/dietlogs/{log_id}/toggle', log_id=log['Log_ID'])
+
+
+def recipe_list(s):
+    s.request('GET', '/api/recipes', query={'suitable': 1} if s.rng.random() < 0.5 else None)
+    s.request('GET', '/api/recipes/top-rated')
+
+
+def meal_plan_list(s):
+    s.request('GET', '/api/mealplans')
+    s.request('GET', '/api/recipes')
+
+
+def profile(s):
+    s.request('GET', '/api/users/{user_id}', user_id=s.user_id)
+    s.request('GET', '/api/users/{user_id}/weight-history', user_id=s.user_id)
+    s.request('GET', '/api/users/{user_id}/weight-trend', user_id=s.user_id)
+
+
+def admin(s):
+    admin_id = s.fixtures['admin_id']
+    s.request('GET', '/api/admin/statistics', as_user=admin_id)
+    s.request('GET', '/api/admin/users', as_user=admin_id)
+    s.request('GET', '/api/recipe-log', as_user=admin_id)
+
+
+PAGES = {
+    'dashboard': (dashboard, 35),
+    'recipe_detail': (recipe_detail, 20),
+    'meal_plan_detail': (meal_plan_detail, 15),
+    'diet_log': (diet_log, 10),
+    'recipe_list': (recipe_list, 5),
+    'meal_plan_list': (meal_plan_list, 5),
+    'profile': (profile, 5),
+    'admin': (admin, 5),
+}
+
+
+# --- Coverage flows ---
+
+def _sign_up(s, name):
+    email = f"{name}-{s.rng.randrange(10**9)}@benchmark.invalid"
+    s.request('POST', '/api/users', json={
+        'Name': name, 'Email': email, 'Password': 'benchmark', 'Gender': 'Other',
+        'Height_cm': 170, 'Weight_kg': 70, 'Activity_Level': 'Moderate',
+    })
+    login = s.request('POST', '/api/login', json={'Email': email, 'Password': 'benchmark'})
+    s.tokens[login['user_id']] = login['access_token']
+    return login['user_id']
+
+
+def account_lifecycle(s):
+    user_id = _sign_up(s, 'coverage-user')
+    s.request('GET', '/api/users/{user_id}', as_user=user_id, user_id=user_id)
+    s.request('PUT', '/api/users/{user_id}', as_user=user_id, user_id=user_id, json={'Name': 'Coverage User'})
+    s.request('PUT', '/api/users/{user_id}/weight', as_user=user_id, user_id=user_id, json={'weight': 68.5})
+    s.request('GET', '/api/users/{user_id}/weight-history', as_user=user_id, user_id=user_id)
+    s.request('DELETE', '/api/users/{user_id}', as_user=user_id, user_id=user_id)
+
+
+def recipe_lifecycle(s):
+    admin_id = s.fixtures['admin_id']
+    ingredient = s.request('POST', '/api/ingredients', as_user=admin_id, json={
+        'Ingredient_Name': f"Coverage ingredient {s.rng.randrange(10**9)}", 'Unit_Of_Measure': 'g', 'Category': 'Grain',
+        'nutrition': {'Calories': 350, 'Protein_g': 10, 'Carbohydrates_g': 70, 'Fat_g': 2, 'Fiber_g': 3},
+    })
+    ing_id = ingredient['Ingredient_ID']
+    s.request('GET', '/api/ingredients/{ing_id}', ing_id=ing_id)
+    s.request('PUT', '/api/ingredients/{ing_id}', as_user=admin_id, ing_id=ing_id, json={'Notes': 'benchmark'})
+
+    recipe = s.request('POST', '/api/recipes', json={
+        'Recipe_Name': 'Coverage recipe', 'Cuisine_Type': 'Italian', 'Serving_Size': 2, 'Difficulty_Level': 'Easy',
+    })
+    recipe_id = recipe['Recipe_ID']
+    ri = s.request('POST', '/api/recipes/{recipe_id}/ingredients', recipe_id=recipe_id,
+                   json={'Ingredient_ID': ing_id, 'Quantity': 150, 'Unit': 'g'})
+    s.request('PUT', '/api/recipe-ingredients/{ri_id}', ri_id=ri['RecipeIngredient_ID'], json={'Quantity': 200})
+    s.request('PUT', '/api/recipes/{recipe_id}', recipe_id=recipe_id, json={'Description': 'Updated'})
+
+    s.request('POST', '/api/recipes/{recipe_id}/feedback', recipe_id=recipe_id, json={'Rating': 4, 'Comments': 'Good'})
+    feedback = s.request('GET', '/api/recipes/{recipe_id}/feedback', recipe_id=recipe_id)
+    feedback_id = next(f['Feedback_ID'] for f in feedback if f['User_ID'] == s.user_id)
+    s.request('PUT', '/api/feedback/{feedback_id}', feedback_id=feedback_id, json={'Rating': 5})
+    s.request('DELETE', '/api/feedback/{feedback_id}', feedback_id=feedback_id)
+
+    s.request('DELETE', '/api/recipe-ingredients/{ri_id}', ri_id=ri['RecipeIngredient_ID'])
+    s.request('DELETE', '/api/recipes/{recipe_id}', recipe_id=recipe_id)
+
+    report = s.request('POST', '/api/recipes/import', query={'partial': 1}, json=[{
+        'Recipe_Name': f'Imported recipe {n}', 'Serving_Size': 2,
+        'ingredients': [{'Ingredient_Name': ingredient['Ingredient_Name'].upper(), 'Quantity': 100, 'Unit': 'g'},
+                        {'Ingredient_Name': 'Not an ingredient', 'Quantity': 1, 'Unit': 'g'}],
+    } for n in range(3)])
+    for imported_id in report['recipe_ids']:
+        s.request('DELETE', '/api/recipes/{recipe_id}', recipe_id=imported_id)
+    s.request('DELETE', '/api/ingredients/{ing_id}', as_user=admin_id, ing_id=ing_id)
+
+
+def meal_plan_lifecycle(s):
+    start = s.today + datetime.timedelta(days=30)
+    plan = s.request('POST', '/api/mealplans', json={
+        'Plan_Name': 'Coverage plan', 'Start_Date': start.isoformat(),
+        'End_Date': (start + datetime.timedelta(days=6)).isoformat(),
+    })
+    plan_id = plan['MealPlan_ID']
+    mpr = s.request('POST', '/api/mealplans/{plan_id}/recipes', plan_id=plan_id,
+                    json={'Recipe_ID': s.recipe_id(), 'Day_of_Plan': start.isoformat(), 'Meal_Type': 'Dinner'})
+    s.request('PUT', '/api/mealplans/{plan_id}', plan_id=plan_id, json={'Notes': 'benchmark'})
+    clone = s.request('POST', '/api/mealplans/{plan_id}/clone', plan_id=plan_id, json={'day_offset': 7})
+    s.request('POST', '/api/mealplans/log-day', json={'plan_id': plan_id, 'date': start.isoformat()})
+    s.request('DELETE', '/api/mealplan-recipes/{mpr_id}', mpr_id=mpr['id'])
+    s.request('DELETE', '/api/mealplans/{plan_id}', plan_id=clone['MealPlan_ID'])
+    s.request('DELETE', '/api/mealplans/{plan_id}', plan_id=plan_id)
+
+
+def diet_log_lifecycle(s):
+    # A device's first sync, a page of it, then the delta after this flow's writes
+    first = s.request('GET', '/api/sync', query={'limit': 50})
+    if first['next_cursor']:
+        s.request('GET', '/api/sync', query={'cursor': first['next_cursor'], 'limit': 50})
+    log = s.request('POST', '/api/dietlogs', json={'Recipe_ID': s.recipe_id(), 'Date': s.today.isoformat()})
+    s.request('PUT', '/api/dietlogs/{log_id}', log_id=log['Log_ID'], json={'Portion_Size': 2})
+    for group_by in ('day', 'meal', 'recipe'):
+        s.request('GET', '/api/dietlogs/summary', query={'days': 30, 'group_by': group_by, 'include_planned': 1})
+    s.request('DELETE', '/api/dietlogs/{log_id}', log_id=log['Log_ID'])
+    s.request('GET', '/api/dietlogs')
+    s.request('GET', '/api/dietlogs/export', query={'format': 'csv'})
+    s.request('GET', '/api/sync', query={'since': first['watermark']})
+
+
+def admin_lifecycle(s):
+    admin_id = s.fixtures['admin_id']
+    user_id = _sign_up(s, 'coverage-admin-target')
+    s.request('GET', '/api/admin/users/{user_id}', as_user=admin_id, user_id=user_id)
+    s.request('PUT', '/api/admin/users/{user_id}', as_user=admin_id, user_id=user_id, json={'Allergies': 'none'})
+    s.request('POST', '/api/admin/users/{user_id}/reset-password', as_user=admin_id, user_id=user_id,
+              json={'new_password': 'benchmark2'})
+    s.request('POST', '/api/admin/users/bulk', as_user=admin_id, json={'action': 'set_role', 'role': 'user', 'user_ids': [user_id]})
+    s.request('GET', '/api/admin/compression-stats', as_user=admin_id)
+    s.request('GET', '/api/admin/admission-stats', as_user=admin_id)
+    s.request('GET', '/api/admin/coalescing-stats', as_user=admin_id)
+    job = s.request('POST', '/api/admin/recipe-ratings/rebuild', as_user=admin_id, query={'background': 1})
+    s.request('GET', '/api/jobs/{job_id}', as_user=admin_id, job_id=job['job_id'])
+    s.request('POST', '/api/admin/recipe-ratings/rebuild', as_user=admin_id)
+    s.request('POST', '/api/admin/dietlogs/nutrition/backfill', as_user=admin_id)
+    s.request('POST', '/api/admin/recipe-tags/rebuild', as_user=admin_id)
+    s.request('POST', '/api/admin/sync/tombstones/prune', as_user=admin_id)
+    # The analytics routes answer 503 without numpy
+    s.request('POST', '/api/admin/analytics/snapshot', as_user=admin_id, expect=(201, 503))
+    for path in ('/api/admin/analytics/snapshot', '/api/admin/analytics/calorie-distribution',
+                 '/api/admin/analytics/macro-trends', '/api/admin/analytics/cuisine-popularity'):
+        s.request('GET', path, as_user=admin_id, expect=(200, 503))
+    s.request('DELETE', '/api/admin/users/{user_id}', as_user=admin_id, user_id=user_id)
+
+
+COVERAGE_FLOWS = {
+    'account_lifecycle': account_lifecycle,
+    'recipe_lifecycle': recipe_lifecycle,
+    'meal_plan_lifecycle': meal_plan_lifecycle,
+    'diet_log_lifecycle': diet_log_lifecycle,
+    'admin_lifecycle': admin_lifecycle,
+}
+
+# Routes no page or flow calls: the SSE stream never finishes a response, static is the frontend
+UNCOVERED_ROUTES = {'GET /api/events', 'GET /static/{filename}'}
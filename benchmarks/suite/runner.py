@@ -0,0 +1,163 @@
+"""
+Runs page mixes against an app through its test client and aggregates timings.
+
+Every SQL statement an engine sends is counted per thread (the test client
+handles a request on the calling thread), so each request is reported with
+its statement count next to its latency. A route whose statement count
+grows with the data is usually an N+1.
+"""
+import random
+import re
+import threading
+import time
+
+from sqlalchemy import event
+
+from loadtest import percentile
+from nutrition.extensions import db
+
+from .pages import COVERAGE_FLOWS, PAGES, UNCOVERED_ROUTES, PageError, Session
+
+
+class Recorder:
+    """Collects (seconds, statements, ok) samples per label from many threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.local = threading.local()
+
+    def count_statement(self, *args):
+        self.local.statements = getattr(self.local, 'statements', 0) + 1
+
+    def timed(self, call):
+        before = getattr(self.local, 'statements', 0)
+        start = time.perf_counter()
+        result = call()
+        return result, time.perf_counter() - start, getattr(self.local, 'statements', 0) - before
+
+    def __call__(self, label, seconds, statements, ok):
+        with self.lock:
+            self.samples.setdefault(label, []).append((seconds, statements, ok))
+
+    def summary(self):
+        results = {}
+        for label, samples in sorted(self.samples.items()):
+            ok = sorted(seconds for seconds, _, passed in samples if passed)
+            statements = [count for _, count, _ in samples]
+            results[label] = {
+                'count': len(samples),
+                'errors': len(samples) - len(ok),
+                'p50_ms': round(percentile(ok, 50) * 1000, 2),
+                'p95_ms': round(percentile(ok, 95) * 1000, 2),
+                'p99_ms': round(percentile(ok, 99) * 1000, 2),
+                'avg_statements': round(sum(statements) / len(statements), 1),
+                'max_statements': max(statements),
+            }
+        return results
+
+
+def count_statements(app, recorder):
+    """Attaches the statement counter to every engine of the app."""
+    with app.app_context():
+        for engine in set(db.engines.values()):
+            event.listen(engine, 'before_cursor_execute', recorder.count_statement)
+
+
+def stop_counting(app, recorder):
+    with app.app_context():
+        for engine in set(db.engines.values()):
+            event.remove(engine, 'before_cursor_execute', recorder.count_statement)
+
+
+def route_labels(app):
+    """'METHOD /path/{arg}' for every route the app serves, in the form pages.Session reports."""
+    labels = set()
+    for rule in app.url_map.iter_rules():
+        path = re.sub(r'<(?:\w+:)?(\w+)>', r'{\1}', rule.rule)
+        labels.update(f"{method} {path}" for method in rule.methods - {'HEAD', 'OPTIONS'})
+    return labels
+
+
+def run_coverage(app, fixtures, tokens, seed):
+    """Runs every coverage flow once. Returns (route samples, [errors])."""
+    recorder = Recorder()
+    count_statements(app, recorder)
+    rng = random.Random(seed)
+    errors = []
+    for name, flow in COVERAGE_FLOWS.items():
+        session = Session(app.test_client(), recorder, rng, fixtures, tokens, rng.choice(fixtures['user_ids']))
+        try:
+            flow(session)
+        except PageError as e:
+            errors.append(f"{name}: {e}")
+    stop_counting(app, recorder)
+    return recorder, errors
+
+
+def run_pages(app, fixtures, tokens, threads, seconds=None, pages=None, seed=1):
+    """Runs weighted random pages on `threads` threads until `seconds` pass or `pages` pages are done."""
+    route_recorder = Recorder()
+    page_recorder = Recorder()
+    count_statements(app, route_recorder)
+    names = list(PAGES)
+    weights = [PAGES[name][1] for name in names]
+    remaining = iter(range(pages)) if pages else None
+    lock = threading.Lock()
+    start_gate = threading.Barrier(threads)
+    errors = []
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = app.test_client()
+        start_gate.wait()
+        deadline = time.perf_counter() + seconds if seconds else None
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if remaining is not None:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+            name = rng.choices(names, weights=weights)[0]
+            session = Session(client, route_recorder, rng, fixtures, tokens, rng.choice(fixtures['user_ids']))
+            before = getattr(route_recorder.local, 'statements', 0)
+            start = time.perf_counter()
+            try:
+                PAGES[name][0](session)
+                ok = True
+            except PageError as e:
+                ok = False
+                with lock:
+                    errors.append(f"{name}: {e}")
+            page_recorder(name, time.perf_counter() - start,
+                          getattr(route_recorder.local, 'statements', 0) - before, ok)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    wall = time.perf_counter() - started
+    stop_counting(app, route_recorder)
+
+    page_results = page_recorder.summary()
+    route_results = route_recorder.summary()
+    page_count = sum(r['count'] for r in page_results.values())
+    request_count = sum(r['count'] for r in route_results.values())
+    overall = {
+        'threads': threads,
+        'seconds': round(wall, 2),
+        'pages': page_count,
+        'requests': request_count,
+        'errors': sum(r['errors'] for r in route_results.values()),
+        'pages_per_second': round(page_count / wall, 1) if wall else 0,
+        'requests_per_second': round(request_count / wall, 1) if wall else 0,
+    }
+    return {'overall': overall, 'pages': page_results, 'routes': route_results}, errors[:20]
+
+
+def untouched_routes(app, requested):
+    """Routes the app serves that are not in `requested` (labels from the page and coverage runs)."""
+    return sorted(route_labels(app) - set(requested) - UNCOVERED_ROUTES)
@@ -0,0 +1,156 @@
+"""
+Lets the suite run the app on SQLite: stored routine stand-ins, MySQL-only DDL
+and MySQL's lenient date binding.
+
+Stored routines: install(engine) rewrites `CALL GetMealPlanSummary(?)`, `SELECT
+GetRecipeCalories(?)` and the other routine calls into equivalent SQLite SQL
+just before they reach the driver. Side effects (UpdateUserWeight,
+AddFeedback) run as extra statements on the same connection, inside the
+caller's transaction. The routes keep issuing one routine call, so statement
+counts match MySQL.
+
+The stand-ins follow what the routes read back from each routine:
+GetRecipeCalories is SUM(Calories * Quantity / 100) over the recipe's
+ingredients, the same formula as the diet log summary.
+
+DDL: `ON UPDATE CURRENT_TIMESTAMP` is dropped from server defaults (SQLite
+has no such clause; the models' onupdate sets Updated_At on ORM updates).
+
+Binding: the routes pass request JSON such as "2026-01-31" straight into
+DATE/TIME columns. MySQL parses these; SQLAlchemy's SQLite types only take
+date objects, so the engine's dialect gets types that parse ISO strings.
+Whole-second datetimes are bound as CURRENT_TIMESTAMP writes them
+("2026-01-31 08:00:00", no microseconds): SQLite compares them as text, and
+delta sync pages on Updated_At equality.
+"""
+import datetime
+import re
+import sqlite3
+
+from sqlalchemy import event, types
+from sqlalchemy.dialects.sqlite import base as sqlite_base
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
+
+RECIPE_CALORIES = """
+    SELECT COALESCE(SUM(n.Calories * ri.Quantity / 100), 0)
+    FROM Recipe_Ingredient ri JOIN Nutrition n ON n.Ingredient_ID = ri.Ingredient_ID
+    WHERE ri.Recipe_ID = {recipe}
+"""
+
+NO_ROWS = "SELECT 1 WHERE 0"
+
+
+def get_recipe_calories(cursor, params):
+    return f"SELECT ({RECIPE_CALORIES.format(recipe='?')})", params
+
+
+def get_meal_plan_summary(cursor, params):
+    # "[bench_date]" makes sqlite3 return a datetime.date, as the MySQL driver does
+    return f"""
+        SELECT mp.Plan_Name AS Plan_Name, mpr.Day_of_Plan AS "Day_of_Plan [bench_date]",
+               mpr.Meal_Type AS Meal_Type, r.Recipe_Name AS Recipe_Name,
+               ({RECIPE_CALORIES.format(recipe='r.Recipe_ID')}) AS Recipe_Calories
+        FROM Meal_Plan mp
+        JOIN MealPlan_Recipe mpr ON mpr.MealPlan_ID = mp.MealPlan_ID
+        JOIN Recipe r ON r.Recipe_ID = mpr.Recipe_ID
+        WHERE mp.User_ID = ?
+        ORDER BY mp.Plan_Name, mpr.Day_of_Plan
+    """, params
+
+
+def get_admin_statistics(cursor, params):
+    return """
+        SELECT 'total_users', COUNT(*) FROM User
+        UNION ALL SELECT 'total_recipes', COUNT(*) FROM Recipe
+        UNION ALL SELECT 'total_ingredients', COUNT(*) FROM Ingredient
+        UNION ALL SELECT 'total_diet_logs', COUNT(*) FROM User_Diet_Log
+        UNION ALL SELECT 'most_popular_recipe', (
+            SELECT r.Recipe_Name FROM User_Diet_Log l JOIN Recipe r ON r.Recipe_ID = l.Recipe_ID
+            GROUP BY r.Recipe_ID, r.Recipe_Name ORDER BY COUNT(*) DESC LIMIT 1
+        ) WHERE EXISTS (SELECT 1 FROM User_Diet_Log WHERE Recipe_ID IS NOT NULL)
+    """, params
+
+
+def update_user_weight(cursor, params):
+    user_id, weight = params
+    cursor.execute(
+        "INSERT INTO User_Weight_History (User_ID, Old_Weight, New_Weight) SELECT User_ID, Weight_kg, ? FROM User WHERE User_ID = ?",
+        (weight, user_id),
+    )
+    cursor.execute(
+        "UPDATE User SET Weight_kg = ?, BMI = CASE WHEN Height_cm > 0 THEN ROUND(? / ((Height_cm / 100.0) * (Height_cm / 100.0)), 2) END WHERE User_ID = ?",
+        (weight, weight, user_id),
+    )
+    return NO_ROWS, ()
+
+
+def add_feedback(cursor, params):
+    return "INSERT INTO Feedback (User_ID, Recipe_ID, Rating, Comments) VALUES (?, ?, ?, ?)", params
+
+
+ROUTINES = {
+    'GetRecipeCalories': get_recipe_calories,
+    'GetMealPlanSummary': get_meal_plan_summary,
+    'GetAdminStatistics': get_admin_statistics,
+    'UpdateUserWeight': update_user_weight,
+    'AddFeedback': add_feedback,
+}
+ROUTINE_CALL = re.compile(r'^\s*(?:CALL|SELECT)\s+(%s)\s*\(' % '|'.join(ROUTINES), re.IGNORECASE)
+
+
+def _rewrite(conn, cursor, statement, parameters, context, executemany):
+    match = ROUTINE_CALL.match(statement)
+    if not match:
+        return statement, parameters
+    return ROUTINES[match.group(1)](cursor, tuple(parameters or ()))
+
+
+@compiles(CreateColumn, 'sqlite')
+def _create_column(element, compiler, **kw):
+    return compiler.visit_create_column(element, **kw).replace(' ON UPDATE CURRENT_TIMESTAMP', '')
+
+
+def _iso_type(base, parse):
+    class IsoStringType(base):
+        def bind_processor(self, dialect):
+            process = super().bind_processor(dialect)
+            def bind(value):
+                if isinstance(value, str):
+                    value = parse(value)
+                if isinstance(value, datetime.datetime) and not value.microsecond:
+                    return value.strftime('%Y-%m-%d %H:%M:%S')
+                return process(value) if process else value
+            return bind
+    IsoStringType.__name__ = f'Iso{base.__name__}'
+    return IsoStringType
+
+
+ISO_TYPES = {
+    types.Date: _iso_type(sqlite_base.DATE, datetime.date.fromisoformat),
+    types.Time: _iso_type(sqlite_base.TIME, datetime.time.fromisoformat),
+    types.DateTime: _iso_type(sqlite_base.DATETIME, datetime.datetime.fromisoformat),
+    types.TIMESTAMP: _iso_type(sqlite_base.DATETIME, datetime.datetime.fromisoformat),
+}
+
+
+def _on_connect(dbapi_connection, connection_record):
+    # WAL lets the reader threads run while a writer commits
+    dbapi_connection.execute('PRAGMA journal_mode=WAL')
+    dbapi_connection.execute('PRAGMA synchronous=NORMAL')
+
+
+def engine_options():
+    """SQLALCHEMY_ENGINE_OPTIONS for a benchmark SQLite database."""
+    return {'connect_args': {'detect_types': sqlite3.PARSE_COLNAMES, 'timeout': 30, 'check_same_thread': False}}
+
+
+def install(engine):
+    """Prepares a SQLite engine for the app. Does nothing on other databases; call before first use."""
+    if engine.dialect.name != 'sqlite':
+        return False
+    engine.dialect.colspecs = {**engine.dialect.colspecs, **ISO_TYPES}
+    sqlite3.register_converter('bench_date', lambda value: datetime.date.fromisoformat(value.decode()))
+    event.listen(engine, 'connect', _on_connect)
+    event.listen(engine, 'before_cursor_execute', _rewrite, retval=True)
+    return True
@@ -0,0 +1,93 @@
+"""
+Concurrency check for PUT /api/dietlogs/<id>/toggle.
+
+    python benchmarks/toggle_concurrency.py --log-id 42 --requests 51 --concurrency 16
+
+Fires --requests toggles at one diet log from --concurrency threads at once,
+through the app's test client, as the log's owner. Every toggle must apply
+exactly once, so the final is_finished equals the starting value flipped
+--requests times. Exits 1 on a lost update or on any non-200 response.
+Uses the database from DATABASE_URL (see nutrition/config.py); the log is
+left in its final state.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from nutrition import create_app
+from nutrition.extensions import db
+from nutrition.models import User, User_Diet_Log
+
+
+def run(app, log_id, total_requests, concurrency):
+    with app.app_context():
+        log = db.session.get(User_Diet_Log, log_id)
+        if log is None:
+            raise SystemExit(f"Diet log {log_id} not found")
+        user = db.session.get(User, log.User_ID)
+        token = create_access_token(identity=user.User_ID, additional_claims={"role": user.role})
+        initial = bool(log.is_finished)
+
+    headers = {'Authorization': f'Bearer {token}'}
+    counter = iter(range(total_requests))
+    lock = threading.Lock()
+    start_gate = threading.Barrier(concurrency)
+    failures = []
+
+    def client():
+        http = app.test_client()
+        start_gate.wait()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            resp = http.put(f'/api/dietlogs/{log_id}/toggle', headers=headers)
+            if resp.status_code != 200:
+                with lock:
+                    failures.append(resp.status_code)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        final = bool(db.session.get(User_Diet_Log, log_id).is_finished)
+    expected = initial ^ (total_requests % 2 == 1)
+    return {
+        'requests': total_requests,
+        'concurrency': concurrency,
+        'failed_requests': len(failures),
+        'initial': initial,
+        'expected': expected,
+        'final': final,
+        'seconds': round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that concurrent diet log toggles are not lost.")
+    parser.add_argument('--log-id', type=int, required=True)
+    parser.add_argument('--requests', type=int, default=51)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    result = run(create_app(), args.log_id, args.requests, args.concurrency)
+    for key, value in result.items():
+        print(f"{key:16} {value}")
+    ok = result['final'] == result['expected'] and not result['failed_requests']
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
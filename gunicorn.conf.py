@@ -0,0 +1,96 @@
+"""
+Gunicorn settings for production. Started by `python serve.py`.
+
+Every setting can be overridden from the environment:
+
+    WEB_BIND              address to listen on          (default 0.0.0.0:5000)
+    WEB_CONCURRENCY       number of worker processes    (default 2 * CPUs + 1)
+    WEB_THREADS           threads per worker (gthread)  (default 4)
+    WEB_MAX_REQUESTS      recycle a worker after N requests (default 2000, 0 = never)
+    WEB_TIMEOUT           seconds before a stuck worker is killed (default 60)
+
+Reloading:
+    kill -HUP <master pid>    restart workers gracefully (config changes)
+    kill -USR2 <master pid>   start a new master with new code, then
+    kill -TERM <old master>   once the new workers are up (zero-downtime deploy)
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threaded workers: an open /api/events stream holds one thread, not the whole
+# process, and the worker keeps heartbeating to the master while it streams.
+# The Flask app may keep at most threads - 1 streams per process (post_worker_init).
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+# Build the app once in the master, so workers share the loaded code and model
+# metadata copy-on-write instead of each importing it again.
+preload_app = True
+
+# Recycle workers now and then to cap slow memory growth; jitter stops them all
+# restarting at the same moment.
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = max(1, max_requests // 10) if max_requests else 0
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Finish all lazy ORM setup in the master, then move everything loaded so far
+    # out of the GC's view so collections in the workers don't touch (and copy) those pages.
+    from sqlalchemy.orm import configure_mappers
+    configure_mappers()
+    _backfill_recipe_ratings(_flask_app(server.app), server.log)
+    gc.freeze()
+    server.log.info("Master ready with %s workers", server.num_workers)
+
+
+def _flask_app(gunicorn_app):
+    # app:app is the Flask app itself; asgi:application carries it as .flask_app
+    target = gunicorn_app.wsgi()
+    return getattr(target, 'flask_app', target)
+
+
+def _backfill_recipe_ratings(app, log):
+    # Once, in the master: a database from before Recipe_Rating gets its aggregates
+    # before any worker reads them (recipe ratings, feedback totals, top-rated)
+    from nutrition.extensions import db
+    from nutrition.ratings import backfill_recipe_ratings
+    with app.app_context():
+        try:
+            filled = backfill_recipe_ratings()
+            if filled is not None:
+                log.info("Recipe ratings backfilled for %s recipes", filled)
+        except Exception as e:
+            log.warning("Recipe rating backfill failed: %s", e)
+        finally:
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose() # Workers open their own connections
+
+
+def post_fork(server, worker):
+    # Never share DB sockets opened in the master with a forked worker.
+    from nutrition.extensions import db
+    with _flask_app(server.app).app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Runs before this worker accepts its first request.
+    from nutrition.warmup import run_warmup
+    app = _flask_app(worker.app)
+    if app is worker.app.wsgi():
+        # WSGI streams each hold a thread; leave one for every other request (0 on a
+        # single-threaded worker, where the events route answers 503)
+        app.config['EVENTS_MAX_CONNECTIONS'] = min(app.config['EVENTS_MAX_CONNECTIONS'], worker.cfg.threads - 1)
+    timings = run_warmup(app)
+    worker.log.info("Worker %s warmed up: %s", worker.pid, timings)
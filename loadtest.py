@@ -0,0 +1,131 @@
+"""
+Small load generator for comparing serving modes.
+
+Runs N concurrent clients against one URL and reports throughput, latency
+percentiles and the server's peak resident memory. To compare the WSGI and
+ASGI modes at a fixed memory budget, start each server with the same number of
+processes, then run the same command against both:
+
+    python app.py                                   # or your WSGI server
+    uvicorn asgi:application --port 8000 --workers 1
+
+    python loadtest.py --url http://127.0.0.1:5000/api/dietlogs/summary \
+        --token "$TOKEN" --concurrency 64 --requests 5000 --server-pid <pid>
+    python loadtest.py --url http://127.0.0.1:8000/api/dietlogs/summary \
+        --token "$TOKEN" --concurrency 64 --requests 5000 --server-pid <pid>
+
+Memory is read from /proc (Linux only) and includes the server's child processes.
+
+Measured so far: only a local SQLite run (concurrency 16), where both modes
+served about 90 req/s in about 29 MB. SQLite calls return without waiting on a
+network, so that run cannot show the async path's benefit. The comparison
+against MySQL has not been run, and whether the ASGI mode serves more requests
+per MB there is unverified; until its numbers are recorded here, serve.py
+treats --asgi as experimental.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def process_tree_rss_kb(pid):
+    """Resident memory of pid and its direct children, in KB."""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    total = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(url, token, concurrency, total_requests, server_pid=None):
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+    peak_rss = [0]
+    done = threading.Event()
+
+    def client():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as resp:
+                    resp.read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except (urllib.error.URLError, OSError) as e:
+                with lock:
+                    errors.append(str(e))
+
+    def sample_memory():
+        while not done.wait(0.1):
+            peak_rss[0] = max(peak_rss[0], process_tree_rss_kb(server_pid))
+
+    if server_pid:
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        sampler.start()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    done.set()
+
+    latencies.sort()
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'errors': len(errors),
+        'seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'server_peak_rss_mb': round(peak_rss[0] / 1024, 1) if server_pid else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent GET load test for one endpoint.")
+    parser.add_argument('--url', required=True)
+    parser.add_argument('--token', default=os.environ.get('TOKEN'), help="JWT access token (or $TOKEN)")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--server-pid', type=int, help="PID of the server, to report peak memory")
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.token, args.concurrency, args.requests, args.server_pid), indent=2))
+
+
+if __name__ == '__main__':
+    main()
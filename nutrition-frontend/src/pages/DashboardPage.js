@@ -46,11 +46,11 @@ export default function DashboardPage() {
     // Fetches the analysis summaries
     const fetchSummaries = useCallback(async () => {
         try {
-            const todayRes = await api.get('/dietlogs/summary?days=1');
-            setSummaryToday(todayRes.data);
-            
-            const weekRes = await api.get('/dietlogs/summary?days=7');
-            setSummaryWeek(weekRes.data);
+            // Both windows come back from one request
+            const summaryRes = await api.get('/dietlogs/summary?windows=1,7');
+            const [today, week] = summaryRes.data.windows;
+            setSummaryToday(today);
+            setSummaryWeek(week);
         } catch (err) {
             console.warn('Could not fetch nutritional summary.', err);
             setError('Could not fetch nutritional summary.');
@@ -23,11 +23,13 @@ export default function RecipeListPage() {
     const [recipes, setRecipes] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
+    // --- NEW: Hide recipes with anything the profile's allergies/diet rule out ---
+    const [suitableOnly, setSuitableOnly] = useState(false);
 
     useEffect(() => {
         const fetchRecipes = async () => {
             try {
-                const response = await api.get('/recipes');
+                const response = await api.get(suitableOnly ? '/recipes?suitable=1' : '/recipes');
                 setRecipes(response.data);
             } catch (err) {
                 setError('Could not fetch recipes. Please try again.');
@@ -36,7 +38,7 @@ export default function RecipeListPage() {
             }
         };
         fetchRecipes();
-    }, []);
+    }, [suitableOnly]);
 
     if (loading) return <div className="container"><p>Loading recipes...</p></div>;
     if (error) return <div className="container"><p className="error-message">{error}</p></div>;
@@ -49,8 +51,15 @@ export default function RecipeListPage() {
                     + Add New Recipe
                 </Link>
             </div>
+            <label style={{display: 'block', marginBottom: '1rem'}}>
+                <input
+                    type="checkbox"
+                    checked={suitableOnly}
+                    onChange={(e) => setSuitableOnly(e.target.checked)}
+                /> Only show recipes that suit my allergies and diet
+            </label>
             {recipes.length === 0 ? (
-                <p>You haven't created any recipes yet.</p>
+                <p>{suitableOnly ? 'None of your recipes suit your allergies and diet.' : "You haven't created any recipes yet."}</p>
             ) : (
                 <div className="card-grid">
                     {recipes.map(recipe => (
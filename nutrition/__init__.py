@@ -0,0 +1,38 @@
+"""
+Nutrition API.
+
+    from nutrition import create_app
+
+    app = create_app()                                              # config from the environment
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///dev.db'})  # or override keys
+
+Routes, models and optional dependencies are only imported when create_app() runs,
+so importing the package itself stays cheap.
+"""
+def create_app(config=None):
+    from flask import Flask
+    from .config import load_config
+
+    app = Flask(__name__)
+    app.config.from_mapping(load_config())
+    if config:
+        app.config.from_mapping(config)
+    app.json.ensure_ascii = False
+    if app.config['TRUSTED_PROXY_COUNT']:
+        # Behind a proxy every request comes from its address; take the client's from X-Forwarded-For
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
+
+    from .extensions import db, bcrypt, jwt, cors
+    from .sharding import init_sharding
+    init_sharding(app) # Adds the shard binds, so it must run before db.init_app
+    cors.init_app(app) # <-- This is the only CORS setup you need
+    db.init_app(app)
+    bcrypt.init_app(app)
+    jwt.init_app(app)
+
+    from .compression import compress_response
+    from .routes import register_blueprints
+    register_blueprints(app)
+    app.after_request(compress_response)
+    return app
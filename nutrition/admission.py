@@ -0,0 +1,242 @@
+"""
+Admission control for expensive routes.
+
+Routes opt in with @admission_controlled('<route class>'). Each route class has
+(see ADMISSION_LIMITS in config.py):
+
+  * a concurrency limit with a bounded wait queue. A request beyond the limit
+    waits up to queue_timeout seconds for a slot; if the queue is full or the
+    wait times out it gets 503.
+  * a per-user token bucket (rate requests/second, bursts of up to burst).
+    A request with no token gets 429. Anonymous routes (login) are keyed
+    by client address; behind a reverse proxy set TRUSTED_PROXY_COUNT so that
+    is the client's and not the proxy's.
+
+Both answers are immediate and carry Retry-After. Concurrency slots are per
+process, like the DB pool they protect. Token buckets live in process memory,
+or in a SQLite file shared by all workers on the host when
+ADMISSION_STORE_PATH is set.
+"""
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+_stats_lock = threading.Lock()
+_state_lock = threading.Lock()
+admission_stats = {} # route class -> counters
+
+
+def _count(route_class, key, amount=1):
+    with _stats_lock:
+        counters = admission_stats.setdefault(route_class, {
+            'admitted': 0, 'queued': 0, 'shed_rate_limited': 0, 'shed_queue_full': 0,
+            'shed_queue_timeout': 0, 'store_errors': 0,
+        })
+        counters[key] += amount
+
+
+class ConcurrencyLimiter:
+    """At most `limit` holders; up to `queue_size` more may wait `timeout` seconds for a slot."""
+
+    def __init__(self, limit, queue_size, timeout):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        Returns (refused, queued): refused is None once a slot is held, else the
+        reason the request was turned away; queued says whether it had to wait.
+        """
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return None, False
+            if self.waiting >= self.queue_size:
+                return 'shed_queue_full', False
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.active < self.limit, timeout=self.timeout):
+                    return 'shed_queue_timeout', True
+                self.active += 1
+                return None, True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class MemoryBucketStore:
+    """Token buckets for this process only."""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Takes one token; returns 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            if len(self._buckets) > self.MAX_KEYS:
+                self._prune(now, rate, burst)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def _prune(self, now, rate, burst):
+        # Buckets that have refilled completely behave exactly like missing ones
+        full_after = burst / rate
+        for key in [k for k, (_, stamp) in self._buckets.items() if now - stamp >= full_after]:
+            del self._buckets[key]
+
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=0.5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst):
+        now = time.time() # Wall clock: monotonic clocks are not comparable across processes
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, stamp FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, stamp = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - stamp) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, stamp) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+def _state(app):
+    """Limiters and bucket store for this app, built on first use from its config."""
+    state = app.extensions.get('admission')
+    if state is not None:
+        return state
+    with _state_lock:
+        if 'admission' in app.extensions:
+            return app.extensions['admission']
+        path = app.config.get('ADMISSION_STORE_PATH')
+        state = {
+            'store': SQLiteBucketStore(path) if path else MemoryBucketStore(),
+            'limiters': {
+                name: ConcurrencyLimiter(limits['concurrency'], limits['queue'], limits['queue_timeout'])
+                for name, limits in app.config['ADMISSION_LIMITS'].items()
+            },
+        }
+        app.extensions['admission'] = state
+        return state
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+def _shed(status, retry_after, message):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response
+
+
+def _client_key():
+    from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+    # Works on routes with or without @jwt_required(); anonymous callers are keyed by address
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception: # e.g. a stale token sent to /api/login
+        identity = None
+    return f"user:{identity}" if identity is not None else f"addr:{request.remote_addr}"
+
+
+def check_rate_limit(app, route_class, client_key):
+    """Takes a token from the caller's bucket; returns 0 or the seconds until the next one."""
+    limits = app.config['ADMISSION_LIMITS'][route_class]
+    try:
+        retry_after = _state(app)['store'].take(f"{route_class}:{client_key}", limits['rate'], limits['burst'])
+    except Exception:
+        # A broken shared store must not take the API down with it: admit the request
+        _count(route_class, 'store_errors')
+        return 0
+    if retry_after:
+        _count(route_class, 'shed_rate_limited')
+    return retry_after
+
+
+def admission_controlled(route_class):
+    """Rate-limit and concurrency-limit a route; place it below @jwt_required()."""
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            app = current_app._get_current_object()
+            if not app.config.get('ADMISSION_ENABLED', True):
+                return fn(*args, **kwargs)
+
+            retry_after = check_rate_limit(app, route_class, _client_key())
+            if retry_after:
+                return _shed(429, retry_after, "Too many requests, slow down.")
+
+            limiter = _state(app)['limiters'][route_class]
+            refused, queued = limiter.acquire()
+            if queued:
+                _count(route_class, 'queued')
+            if refused:
+                _count(route_class, refused)
+                return _shed(503, limiter.timeout, "Server busy, try again shortly.")
+            _count(route_class, 'admitted')
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                limiter.release()
+        return decorator
+    return wrapper
+
+
+def admission_snapshot(app):
+    """Counters plus the current in-flight / waiting numbers per route class."""
+    state = _state(app)
+    with _stats_lock:
+        stats = {name: dict(counters) for name, counters in admission_stats.items()}
+    for name, limiter in state['limiters'].items():
+        entry = stats.setdefault(name, {})
+        entry.update({'in_flight': limiter.active, 'waiting': limiter.waiting, 'limit': limiter.limit})
+    return {
+        'pid': os.getpid(),
+        'store': 'shared' if isinstance(state['store'], SQLiteBucketStore) else 'memory',
+        'route_classes': stats,
+    }
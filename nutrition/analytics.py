@@ -0,0 +1,384 @@
+"""
+Columnar analytics snapshots for population-level admin reporting.
+
+build_snapshot() exports every diet log, with its nutrition snapshot and the
+logging user's Gender, Activity_Level and BMI, to ANALYTICS_SNAPSHOT_DIR:
+
+    <dir>/CURRENT                          name of the live snapshot
+    <dir>/<snapshot>/manifest.json         columns, dtypes, dictionaries, partitions
+    <dir>/<snapshot>/month=2026-01/<column>.bin   one raw little-endian array per column
+
+Partitions are calendar months. String columns are stored as small integer
+codes, with the strings listed in the manifest's dictionaries (code 0 = none).
+A new snapshot is written next to the live one and switched in by replacing
+CURRENT, so readers never see a half-written snapshot.
+
+The admin analytics endpoints read the live snapshot through np.memmap. Each
+query touches only the partitions overlapping its date range and only the
+columns it needs, groups with numpy (np.unique / np.bincount), and never
+queries the database. Results are as fresh as the last snapshot, and every
+response says when that was built.
+
+numpy is optional: without it the snapshot endpoints answer 503.
+"""
+import datetime
+import json
+import os
+import shutil
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .lognutrition import SNAPSHOT_COLUMNS
+from .models import User, User_Diet_Log, Recipe, Recipe_Ingredient, Nutrition
+from .sharding import shard_engines
+
+SNAPSHOT_FORMAT = 1
+EXPORT_CHUNK_ROWS = 50000
+NUTRIENTS = ('calories', 'protein_g', 'carbohydrates_g', 'fat_g', 'fiber_g')
+NUTRIENT_COLUMNS = (Nutrition.Calories, Nutrition.Protein_g, Nutrition.Carbohydrates_g, Nutrition.Fat_g, Nutrition.Fiber_g)
+COLUMNS = {
+    'user_id': 'int32',
+    'day': 'int32', # days since 1970-01-01
+    'recipe_id': 'int32', # -1: no recipe
+    'portion': 'float32',
+    'finished': 'uint8',
+    'gender': 'uint8', # code into dictionaries['gender']
+    'activity_level': 'uint8', # code into dictionaries['activity_level']
+    'bmi': 'float32', # NaN when unknown
+    'cuisine': 'uint16', # code into dictionaries['cuisine']
+    **{name: 'float32' for name in NUTRIENTS}, # per log, scaled by portion
+}
+ACTIVITY_LEVELS = tuple(User.__table__.c.Activity_Level.type.enums)
+GENDERS = tuple(User.__table__.c.Gender.type.enums)
+
+_numpy = False # Not looked up yet
+
+
+def numpy_module():
+    """Imports numpy on first use. Returns None when it isn't installed."""
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+# --- Building ---
+
+def _recipe_lookup(np):
+    """Per Recipe_ID: nutrition of one portion and cuisine code. Index -1 is the 'no recipe' row."""
+    rows = db.session.execute(
+        select(Recipe.Recipe_ID, Recipe.Cuisine_Type,
+               *[func.sum(column * (Recipe_Ingredient.Quantity / 100)) for column in NUTRIENT_COLUMNS])
+        .outerjoin(Recipe_Ingredient, Recipe.Recipe_ID == Recipe_Ingredient.Recipe_ID)
+        .outerjoin(Nutrition, Recipe_Ingredient.Ingredient_ID == Nutrition.Ingredient_ID)
+        .group_by(Recipe.Recipe_ID, Recipe.Cuisine_Type)
+    ).all()
+    cuisines = [None] + sorted({row.Cuisine_Type for row in rows if row.Cuisine_Type})
+    cuisine_codes = {name: code for code, name in enumerate(cuisines)}
+    size = max((row.Recipe_ID for row in rows), default=0) + 2
+    nutrition = np.zeros((size, len(NUTRIENTS)), dtype='float64')
+    cuisine = np.zeros(size, dtype=COLUMNS['cuisine'])
+    for row in rows:
+        nutrition[row.Recipe_ID] = [float(value or 0) for value in row[2:]]
+        cuisine[row.Recipe_ID] = cuisine_codes.get(row.Cuisine_Type, 0)
+    return nutrition, cuisine, cuisines
+
+
+def _chunk_columns(np, rows, nutrition, cuisine):
+    """
+    Turns one chunk of (User_ID, Date, Recipe_ID, Portion_Size, is_finished, Gender, Activity_Level, BMI,
+    *snapshot nutrition) rows into column arrays.
+    """
+    user_id, date, recipe_id, portion, finished, gender, activity, bmi = zip(*(row[:8] for row in rows))
+    gender_codes = {name: code for code, name in enumerate(GENDERS, 1)}
+    activity_codes = {name: code for code, name in enumerate(ACTIVITY_LEVELS, 1)}
+    recipe = np.array([r if r is not None and r < len(nutrition) - 1 else -1 for r in recipe_id], dtype=COLUMNS['recipe_id'])
+    portion = np.array([float(p) if p is not None else 1.0 for p in portion], dtype='float64')
+    columns = {
+        'user_id': np.array(user_id, dtype=COLUMNS['user_id']),
+        'day': np.array(date, dtype='datetime64[D]').astype(COLUMNS['day']),
+        'recipe_id': recipe,
+        'portion': portion.astype(COLUMNS['portion']),
+        'finished': np.array(finished, dtype=COLUMNS['finished']),
+        'gender': np.array([gender_codes.get(v, 0) for v in gender], dtype=COLUMNS['gender']),
+        'activity_level': np.array([activity_codes.get(v, 0) for v in activity], dtype=COLUMNS['activity_level']),
+        'bmi': np.array([float(v) if v is not None else np.nan for v in bmi], dtype=COLUMNS['bmi']),
+        'cuisine': cuisine[recipe],
+    }
+    per_log = nutrition[recipe] * portion[:, None]
+    # Logs keep the nutrition they were written with; the recipe's current values
+    # only fill in for logs that have no snapshot yet
+    snapshot = np.array([[np.nan if v is None else float(v) for v in row[8:]] for row in rows], dtype='float64')
+    per_log = np.where(np.isnan(snapshot), per_log, snapshot)
+    for i, name in enumerate(NUTRIENTS):
+        columns[name] = per_log[:, i].astype(COLUMNS[name])
+    return columns
+
+
+def _write_chunk(np, path, columns, partitions):
+    months = columns['day'].astype('datetime64[D]').astype('datetime64[M]')
+    for month in np.unique(months):
+        mask = months == month
+        name = f"month={month}"
+        part = partitions.setdefault(name, {'name': name, 'rows': 0, 'min_day': None, 'max_day': None})
+        os.makedirs(os.path.join(path, name), exist_ok=True)
+        for column, values in columns.items():
+            with open(os.path.join(path, name, f'{column}.bin'), 'ab') as f:
+                values[mask].astype(np.dtype(COLUMNS[column]).newbyteorder('<')).tofile(f)
+        days = columns['day'][mask]
+        part['rows'] += int(mask.sum())
+        part['min_day'] = int(days.min()) if part['min_day'] is None else min(part['min_day'], int(days.min()))
+        part['max_day'] = int(days.max()) if part['max_day'] is None else max(part['max_day'], int(days.max()))
+
+
+def build_snapshot(directory=None, keep=None):
+    """Exports diet logs to a new snapshot, makes it current and prunes old ones. Returns its manifest."""
+    np = numpy_module()
+    if np is None:
+        raise RuntimeError("Analytics snapshots need numpy")
+    config = current_app.config
+    directory = directory or config['ANALYTICS_SNAPSHOT_DIR']
+    keep = keep or config['ANALYTICS_SNAPSHOT_KEEP']
+    started = time.perf_counter()
+    snapshot_id = datetime.datetime.now().strftime('%Y%m%dT%H%M%S.%f') + f'-{os.getpid()}'
+    building = os.path.join(directory, f'.building-{snapshot_id}')
+    os.makedirs(building)
+
+    try:
+        nutrition, cuisine, cuisines = _recipe_lookup(np)
+        partitions = {}
+        statement = select(
+            User_Diet_Log.User_ID, User_Diet_Log.Date, User_Diet_Log.Recipe_ID, User_Diet_Log.Portion_Size,
+            User_Diet_Log.is_finished, User.Gender, User.Activity_Level, User.BMI,
+            *[getattr(User_Diet_Log, column) for column in SNAPSHOT_COLUMNS],
+        ).join(User, User_Diet_Log.User_ID == User.User_ID)
+        for engine in shard_engines():
+            with Session(engine) as session:
+                result = session.execute(statement.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS))
+                for rows in result.partitions():
+                    _write_chunk(np, building, _chunk_columns(np, rows, nutrition, cuisine), partitions)
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'snapshot_id': snapshot_id,
+            'built_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'rows': sum(part['rows'] for part in partitions.values()),
+            'columns': COLUMNS,
+            'dictionaries': {'gender': [None, *GENDERS], 'activity_level': [None, *ACTIVITY_LEVELS], 'cuisine': cuisines},
+            'partitions': sorted(partitions.values(), key=lambda part: part['name']),
+        }
+        manifest['build_seconds'] = round(time.perf_counter() - started, 3)
+        with open(os.path.join(building, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(building, os.path.join(directory, snapshot_id))
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(directory, f'.CURRENT-{snapshot_id}')
+    with open(pointer, 'w') as f:
+        f.write(snapshot_id)
+    os.replace(pointer, os.path.join(directory, 'CURRENT')) # Atomic switch for readers
+
+    # Readers still mapping a pruned snapshot keep their open files (POSIX unlink semantics)
+    snapshots = sorted(name for name in os.listdir(directory) if not name.startswith('.') and name != 'CURRENT')
+    for name in snapshots[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return manifest
+
+
+# --- Reading ---
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self._maps = {}
+
+    def info(self):
+        keys = ('snapshot_id', 'built_at', 'rows', 'build_seconds')
+        return {**{key: self.manifest[key] for key in keys}, 'partitions': len(self.manifest['partitions'])}
+
+    def scan(self, names, start_day=None, end_day=None):
+        """Yields {column: memmapped array} per partition overlapping [start_day, end_day], rows filtered to the range."""
+        np = numpy_module()
+        for part in self.manifest['partitions']:
+            if (start_day is not None and part['max_day'] < start_day) or (end_day is not None and part['min_day'] > end_day):
+                continue
+            columns = {name: self._column(part, name) for name in set(names) | {'day'}}
+            day = columns['day']
+            if (start_day is not None and part['min_day'] < start_day) or (end_day is not None and part['max_day'] > end_day):
+                mask = np.ones(len(day), dtype=bool)
+                if start_day is not None:
+                    mask &= day >= start_day
+                if end_day is not None:
+                    mask &= day <= end_day
+                columns = {name: values[mask] for name, values in columns.items()}
+            yield columns
+
+    def _column(self, part, name):
+        key = (part['name'], name)
+        if key not in self._maps:
+            dtype = numpy_module().dtype(self.manifest['columns'][name]).newbyteorder('<')
+            self._maps[key] = numpy_module().memmap(
+                os.path.join(self.path, part['name'], f'{name}.bin'), dtype=dtype, mode='r', shape=(part['rows'],)
+            )
+        return self._maps[key]
+
+
+_snapshot_lock = threading.Lock()
+
+
+def current_snapshot(app):
+    """The live Snapshot, reopened when CURRENT changes; None if none has been built."""
+    directory = app.config['ANALYTICS_SNAPSHOT_DIR']
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            snapshot_id = f.read().strip()
+    except FileNotFoundError:
+        return None
+    snapshot = app.extensions.get('analytics_snapshot')
+    if snapshot is not None and snapshot.manifest['snapshot_id'] == snapshot_id:
+        return snapshot
+    with _snapshot_lock:
+        snapshot = app.extensions.get('analytics_snapshot')
+        if snapshot is None or snapshot.manifest['snapshot_id'] != snapshot_id:
+            snapshot = Snapshot(os.path.join(directory, snapshot_id))
+            app.extensions['analytics_snapshot'] = snapshot
+        return snapshot
+
+
+def to_day(date):
+    return None if date is None else (date - datetime.date(1970, 1, 1)).days
+
+
+def from_day(day):
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))).isoformat()
+
+
+# --- Queries (vectorized over the memmapped columns) ---
+
+def _user_days(np, columns, finished_only):
+    """(unique user-day keys, index of the first row of each, per-row group index) for one partition."""
+    mask = columns['finished'] == 1 if finished_only else slice(None)
+    keys = columns['user_id'][mask].astype('int64') * 100000 + columns['day'][mask]
+    return (mask, *np.unique(keys, return_index=True, return_inverse=True))
+
+
+def calorie_distribution(snapshot, start_day=None, end_day=None, bin_width=250, finished_only=True):
+    """Daily calories per user-day, grouped by the user's Activity_Level: summary statistics and a histogram."""
+    np = numpy_module()
+    levels, totals = [], []
+    for columns in snapshot.scan(['user_id', 'finished', 'activity_level', 'calories'], start_day, end_day):
+        mask, _, first, inverse = _user_days(np, columns, finished_only)
+        calories = columns['calories'][mask]
+        if not len(calories):
+            continue
+        totals.append(np.bincount(inverse, weights=calories))
+        levels.append(columns['activity_level'][mask][first])
+    if not totals:
+        return []
+    levels, totals = np.concatenate(levels), np.concatenate(totals)
+
+    names = snapshot.manifest['dictionaries']['activity_level']
+    result = []
+    for code in np.unique(levels):
+        values = totals[levels == code]
+        counts = np.bincount((values // bin_width).astype('int64'))
+        p10, p25, p50, p75, p90 = np.percentile(values, [10, 25, 50, 75, 90])
+        result.append({
+            'activity_level': names[code],
+            'user_days': int(len(values)),
+            'mean': round(float(values.mean()), 1),
+            'p10': round(float(p10), 1), 'p25': round(float(p25), 1), 'median': round(float(p50), 1),
+            'p75': round(float(p75), 1), 'p90': round(float(p90), 1),
+            'histogram': [{'from': i * bin_width, 'to': (i + 1) * bin_width, 'user_days': int(n)}
+                          for i, n in enumerate(counts) if n],
+        })
+    return result
+
+
+def _bucket(np, day, bucket):
+    """Bucket start (as a day number) for each day: the day, its Monday, or the 1st of its month."""
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return day - (day + 3) % 7 # 1970-01-01 was a Thursday
+    return day.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(day.dtype)
+
+
+def macro_trends(snapshot, start_day=None, end_day=None, bucket='week', finished_only=True):
+    """Average daily nutrients per logging user-day, and the energy split across macros, per day/week/month."""
+    np = numpy_module()
+    sums = {} # bucket start -> [user_days, calories, protein, carbs, fat, fiber]
+    for columns in snapshot.scan(['user_id', 'finished', *NUTRIENTS], start_day, end_day):
+        mask, _, first, inverse = _user_days(np, columns, finished_only)
+        if not len(inverse):
+            continue
+        buckets, bucket_index = np.unique(_bucket(np, columns['day'][mask], bucket), return_inverse=True)
+        per_bucket = [np.bincount(bucket_index[first], minlength=len(buckets))] # user-days
+        per_bucket += [np.bincount(bucket_index, weights=columns[name][mask], minlength=len(buckets)) for name in NUTRIENTS]
+        for i, start in enumerate(buckets):
+            totals = sums.setdefault(int(start), [0.0] * (len(NUTRIENTS) + 1))
+            for j, values in enumerate(per_bucket):
+                totals[j] += float(values[i])
+
+    result = []
+    for start in sorted(sums):
+        user_days, calories, protein, carbs, fat, fiber = sums[start]
+        macro_kcal = protein * 4 + carbs * 4 + fat * 9
+        result.append({
+            'period_start': from_day(start),
+            'user_days': int(user_days),
+            'avg_calories': round(calories / user_days, 1),
+            'avg_protein_g': round(protein / user_days, 1),
+            'avg_carbohydrates_g': round(carbs / user_days, 1),
+            'avg_fat_g': round(fat / user_days, 1),
+            'avg_fiber_g': round(fiber / user_days, 1),
+            'energy_share': {
+                'protein': round(protein * 4 / macro_kcal, 3) if macro_kcal else None,
+                'carbohydrates': round(carbs * 4 / macro_kcal, 3) if macro_kcal else None,
+                'fat': round(fat * 9 / macro_kcal, 3) if macro_kcal else None,
+            },
+        })
+    return result
+
+
+def cuisine_popularity(snapshot, start_day=None, end_day=None, finished_only=False):
+    """Logs, distinct users and calories per cuisine, most logged first."""
+    np = numpy_module()
+    names = snapshot.manifest['dictionaries']['cuisine']
+    logs = np.zeros(len(names), dtype='int64')
+    calories = np.zeros(len(names), dtype='float64')
+    pairs = []
+    for columns in snapshot.scan(['user_id', 'finished', 'recipe_id', 'cuisine', 'calories'], start_day, end_day):
+        mask = columns['recipe_id'] >= 0
+        if finished_only:
+            mask &= columns['finished'] == 1
+        cuisine = columns['cuisine'][mask].astype('int64')
+        logs += np.bincount(cuisine, minlength=len(names))
+        calories += np.bincount(cuisine, weights=columns['calories'][mask], minlength=len(names))
+        pairs.append(np.unique(cuisine * 2**32 + columns['user_id'][mask]))
+    users = np.zeros(len(names), dtype='int64')
+    if pairs:
+        users = np.bincount(np.unique(np.concatenate(pairs)) // 2**32, minlength=len(names))
+
+    total = int(logs.sum())
+    result = [{
+        'cuisine': names[code] or 'Unspecified',
+        'logs': int(logs[code]),
+        'users': int(users[code]),
+        'share': round(int(logs[code]) / total, 4),
+        'calories': round(float(calories[code]), 1),
+    } for code in np.argsort(-logs, kind='stable') if logs[code]]
+    return result
@@ -0,0 +1,82 @@
+"""Negotiated gzip/brotli compression for JSON and text responses."""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request, current_app
+
+COMPRESS_LEVEL = 6
+COMPRESS_CACHE_SIZE = 256
+COMPRESS_MIMETYPES = ('application/json', 'text/csv', 'text/plain', 'text/html')
+_compress_cache = OrderedDict() # (encoding, body digest) -> compressed body, LRU
+_compress_lock = threading.Lock()
+compression_stats = {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cache_hits': 0}
+_brotli = False # Not looked up yet
+
+def brotli_module():
+    """Imports brotli on first use. Returns None when it isn't installed (gzip only)."""
+    global _brotli
+    if _brotli is False:
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        _brotli = brotli
+    return _brotli
+
+def choose_encoding(accept_encoding):
+    accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+    if 'br' in accepted and brotli_module() is not None:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli_module().compress(body, quality=5)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+
+def compress_response(response):
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+    
+    body = response.get_data()
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+    
+    # GET bodies repeat (catalog lists, recipe details), so keep their compressed form around
+    cacheable = request.method == 'GET'
+    compressed = None
+    if cacheable:
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with _compress_lock:
+            compressed = _compress_cache.get(key)
+            if compressed is not None:
+                _compress_cache.move_to_end(key)
+                compression_stats['cache_hits'] += 1
+    if compressed is None:
+        compressed = compress_body(body, encoding)
+        if cacheable:
+            with _compress_lock:
+                _compress_cache[key] = compressed
+                if len(_compress_cache) > COMPRESS_CACHE_SIZE:
+                    _compress_cache.popitem(last=False)
+    
+    with _compress_lock:
+        compression_stats['responses'] += 1
+        compression_stats['bytes_in'] += len(body)
+        compression_stats['bytes_out'] += len(compressed)
+    
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
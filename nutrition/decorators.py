@@ -0,0 +1,19 @@
+"""Route decorators shared by the blueprints."""
+from functools import wraps
+
+from flask import jsonify
+from flask_jwt_extended import jwt_required, get_jwt
+
+# --- NEW: Admin-Only Decorator ---
+def admin_required():
+    def wrapper(fn):
+        @wraps(fn)
+        @jwt_required()
+        def decorator(*args, **kwargs):
+            claims = get_jwt()
+            if claims.get("role") == "admin":
+                return fn(*args, **kwargs)
+            else:
+                return jsonify({"error": "Admins only!"}), 403
+        return decorator
+    return wrapper
@@ -0,0 +1,165 @@
+"""
+Allergen and diet tags as bitmasks.
+
+Each ingredient carries a Tag_Mask of what it contains (TAGS: peanuts, gluten,
+dairy, meat, ...). A recipe's Tag_Mask is the OR of its ingredients' masks and
+is kept up to date when ingredients are added to or removed from a recipe, or
+an ingredient's tags change. A user's Restriction_Mask is parsed from the
+free-text Allergies and Dietary_Preferences fields when the profile is saved:
+allergens map to their tag, diets (DIETS: vegan, halal, gluten-free, ...) to
+every tag they rule out.
+
+Filtering a recipe list is then a single predicate, Tag_Mask & mask = 0
+(suitable_for). A recipe is only as well tagged as its ingredients: untagged
+ingredients count as containing nothing.
+
+Existing MySQL databases need the columns added, then
+POST /api/admin/recipe-tags/rebuild to fill in the recipe masks:
+
+    ALTER TABLE Ingredient ADD COLUMN Tag_Mask INT NOT NULL DEFAULT 0;
+    ALTER TABLE Recipe ADD COLUMN Tag_Mask INT NOT NULL DEFAULT 0;
+    ALTER TABLE User ADD COLUMN Restriction_Mask INT NOT NULL DEFAULT 0;
+"""
+import re
+
+from sqlalchemy import select, update
+
+from .extensions import db
+from .models import Ingredient, Recipe, Recipe_Ingredient, User
+from .resultcache import invalidate_catalog_results
+
+# Bit n is TAGS[n]. Masks are stored, so only ever append to this list.
+TAGS = ('peanuts', 'tree_nuts', 'gluten', 'dairy', 'egg', 'soy', 'fish', 'shellfish', 'sesame', 'meat', 'pork', 'alcohol')
+TAG_BITS = {name: 1 << bit for bit, name in enumerate(TAGS)}
+
+def _mask(*names):
+    mask = 0
+    for name in names:
+        mask |= TAG_BITS[name]
+    return mask
+
+# Diet -> the tags it rules out
+DIETS = {
+    'vegan': _mask('dairy', 'egg', 'fish', 'shellfish', 'meat', 'pork'),
+    'vegetarian': _mask('fish', 'shellfish', 'meat', 'pork'),
+    'pescatarian': _mask('meat', 'pork'),
+    'halal': _mask('pork', 'alcohol'),
+    'gluten free': _mask('gluten'),
+    'dairy free': _mask('dairy'),
+    'lactose free': _mask('dairy'),
+    'nut free': _mask('peanuts', 'tree_nuts'),
+}
+
+# Words people write in Allergies / Dietary_Preferences -> tags
+WORDS = {
+    **{name.replace('_', ' '): TAG_BITS[name] for name in TAGS},
+    'peanut': _mask('peanuts'),
+    'nut': _mask('peanuts', 'tree_nuts'), 'nuts': _mask('peanuts', 'tree_nuts'),
+    'tree nut': _mask('tree_nuts'), 'almond': _mask('tree_nuts'), 'almonds': _mask('tree_nuts'),
+    'walnut': _mask('tree_nuts'), 'walnuts': _mask('tree_nuts'), 'cashew': _mask('tree_nuts'), 'cashews': _mask('tree_nuts'),
+    'wheat': _mask('gluten'), 'celiac': _mask('gluten'), 'coeliac': _mask('gluten'),
+    'milk': _mask('dairy'), 'lactose': _mask('dairy'), 'cheese': _mask('dairy'),
+    'eggs': _mask('egg'), 'soya': _mask('soy'),
+    'shrimp': _mask('shellfish'), 'prawn': _mask('shellfish'), 'prawns': _mask('shellfish'),
+    'crab': _mask('shellfish'), 'lobster': _mask('shellfish'),
+    'veggie': DIETS['vegetarian'], 'pescetarian': DIETS['pescatarian'],
+    **DIETS,
+}
+_SPLIT = re.compile(r'[,;/&\n]|\band\b')
+_NOISE = re.compile(r'^(?:no|not|avoid)\s+|\s+(?:free|allergy|allergies|allergic|intolerance|intolerant)$')
+
+
+def tag_mask(names):
+    """Mask for a list of TAGS names. Raises ValueError naming the unknown ones."""
+    unknown = [name for name in names if name not in TAG_BITS]
+    if unknown:
+        raise ValueError(f"Unknown tags: {', '.join(map(str, unknown))}. Known tags: {', '.join(TAGS)}.")
+    return _mask(*names)
+
+
+def tag_names(mask):
+    return [name for name in TAGS if (mask or 0) & TAG_BITS[name]]
+
+
+def parse_restrictions(*texts):
+    """
+    Restriction mask for free text such as "peanuts, shellfish" or "Vegetarian, gluten-free".
+    Words it does not recognise are ignored.
+    """
+    mask = 0
+    for text in texts:
+        for word in _SPLIT.split((text or '').lower()):
+            word = re.sub(r'[\s_-]+', ' ', word).strip()
+            if word not in WORDS:
+                word = _NOISE.sub('', word).strip() # "no pork", "peanut allergy", "egg-free"
+            mask |= WORDS.get(word, 0)
+    return mask
+
+
+def update_restrictions(user):
+    """Re-parses the user's Restriction_Mask from Allergies and Dietary_Preferences. Call before commit."""
+    user.Restriction_Mask = parse_restrictions(user.Allergies, user.Dietary_Preferences)
+
+
+def requested_restrictions(args, user_id):
+    """
+    Mask for a recipe list's filter args, OR-ed together:
+      suitable=1             the caller's own Restriction_Mask
+      avoid=peanuts,gluten   TAGS names
+      diet=vegan,halal       DIETS names
+    Raises ValueError with a message for the client.
+    """
+    mask = 0
+    if args.get('suitable', '').lower() in ('1', 'true', 'yes'):
+        mask |= db.session.scalar(select(User.Restriction_Mask).where(User.User_ID == user_id)) or 0
+    if args.get('avoid'):
+        mask |= tag_mask([name.strip() for name in args['avoid'].split(',') if name.strip()])
+    if args.get('diet'):
+        for name in args['diet'].split(','):
+            diet = re.sub(r'[\s_-]+', ' ', name.lower()).strip()
+            if diet not in DIETS:
+                raise ValueError(f"Unknown diet: {name}. Known diets: {', '.join(DIETS)}.")
+            mask |= DIETS[diet]
+    return mask
+
+
+def suitable_for(mask):
+    """WHERE clause for recipes containing none of the tags in mask."""
+    return Recipe.Tag_Mask.bitwise_and(mask) == 0
+
+
+def refresh_recipe_tags(recipe_ids=None):
+    """
+    Recomputes Tag_Mask of the given recipes (all recipes if None) from their
+    ingredients. Does not commit. Returns the number of recipes updated.
+    """
+    stmt = select(Recipe_Ingredient.Recipe_ID, Ingredient.Tag_Mask)\
+        .join(Ingredient, Recipe_Ingredient.Ingredient_ID == Ingredient.Ingredient_ID)
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return 0
+        stmt = stmt.where(Recipe_Ingredient.Recipe_ID.in_(recipe_ids))
+        masks = dict.fromkeys(recipe_ids, 0)
+    else:
+        masks = dict.fromkeys(db.session.scalars(select(Recipe.Recipe_ID)), 0)
+    # OR-ed here rather than with BIT_OR(), which SQLite lacks
+    for recipe_id, mask in db.session.execute(stmt):
+        masks[recipe_id] |= mask or 0
+    if masks:
+        db.session.execute(update(Recipe), [{'Recipe_ID': recipe_id, 'Tag_Mask': mask} for recipe_id, mask in masks.items()])
+    return len(masks)
+
+
+def rebuild_recipe_tags():
+    """Recomputes every recipe's Tag_Mask, for the initial fill or after out-of-band ingredient edits."""
+    count = refresh_recipe_tags()
+    db.session.commit()
+    invalidate_catalog_results()
+    return count
+
+
+def recipes_using(ingredient_id):
+    return db.session.scalars(
+        select(Recipe_Ingredient.Recipe_ID).where(Recipe_Ingredient.Ingredient_ID == ingredient_id).distinct()
+    ).all()
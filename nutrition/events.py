@@ -0,0 +1,157 @@
+"""
+Per-user change events (served as Server-Sent Events by routes/events.py).
+
+Routes call publish(user_id, 'dietlog.updated', {...}) after their commit.
+The event reaches every open event stream of that user:
+
+  * EVENTS_BROKER=memory (default): streams in this process only.
+  * EVENTS_BROKER=unix: each process also binds a datagram socket in
+    EVENTS_SOCKET_DIR and publish() sends the event to every socket there, so
+    gunicorn workers and the job worker on one host see each other's events.
+    An event whose message would exceed MAX_EVENT_BYTES is sent as a 'resync'
+    event instead, telling the client to refetch.
+
+Subscribers are callables; each stream decides how to queue what it receives
+(a queue.Queue for WSGI, an asyncio.Queue for the ASGI handler).
+"""
+import itertools
+import json
+import os
+import threading
+
+_event_ids = itertools.count(1)
+MAX_EVENT_BYTES = 60000 # Below the receiver's buffer and the datagram size limit
+
+
+class InProcessBroker:
+    """
+    Fans events out to the subscribers registered in this process. Users are
+    keyed by str(user_id), since JWT identities and DB columns may disagree on
+    int vs str.
+    """
+
+    def __init__(self):
+        self._subscribers = {} # str(user_id) -> {token: deliver}
+        self._lock = threading.Lock()
+        self._tokens = itertools.count(1)
+
+    def subscribe(self, user_id, deliver):
+        token = next(self._tokens)
+        with self._lock:
+            self._subscribers.setdefault(str(user_id), {})[token] = deliver
+        return token
+
+    def unsubscribe(self, user_id, token):
+        with self._lock:
+            subscribers = self._subscribers.get(str(user_id), {})
+            subscribers.pop(token, None)
+            if not subscribers:
+                self._subscribers.pop(str(user_id), None)
+
+    def subscribe_within(self, user_id, deliver, max_connections, max_per_user):
+        """
+        subscribe() unless this process already has max_connections streams ('total')
+        or the user has max_per_user ('user'). Returns (token, None) or (None, reason);
+        the check and the subscribe hold the lock together, so concurrent connects
+        cannot overshoot.
+        """
+        with self._lock:
+            if sum(len(s) for s in self._subscribers.values()) >= max_connections:
+                return None, 'total'
+            if len(self._subscribers.get(str(user_id), ())) >= max_per_user:
+                return None, 'user'
+            token = next(self._tokens)
+            self._subscribers.setdefault(str(user_id), {})[token] = deliver
+            return token, None
+
+    def publish(self, user_id, event):
+        self.deliver_local(user_id, event)
+
+    def deliver_local(self, user_id, event):
+        with self._lock:
+            targets = list(self._subscribers.get(str(user_id), {}).values())
+        for deliver in targets:
+            deliver(event)
+
+
+class UnixSocketBroker(InProcessBroker):
+    """In-process fan-out plus delivery to the other processes on this host over datagram sockets."""
+
+    def __init__(self, socket_dir, logger):
+        super().__init__()
+        import socket
+        self.logger = logger
+        os.makedirs(socket_dir, exist_ok=True)
+        self.socket_dir = socket_dir
+        self.path = os.path.join(socket_dir, f"events-{os.getpid()}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._inbox = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._inbox.bind(self.path)
+        self._outbox = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._outbox.setblocking(False)
+        threading.Thread(target=self._receive, name='events-receiver', daemon=True).start()
+
+    def _receive(self):
+        while True:
+            try:
+                message = json.loads(self._inbox.recv(65536))
+                self.deliver_local(message['user_id'], message['event'])
+            except Exception as e:
+                # One bad datagram or subscriber must not stop delivery to this process
+                self.logger.warning("Could not deliver event from socket: %s", e)
+
+    def publish(self, user_id, event):
+        message = json.dumps({'user_id': user_id, 'event': event}, default=str).encode()
+        if len(message) > MAX_EVENT_BYTES:
+            resync = {'id': event['id'], 'type': 'resync', 'data': {"reason": "event too large; refetch your data"}}
+            message = json.dumps({'user_id': user_id, 'event': resync}).encode()
+        for name in os.listdir(self.socket_dir):
+            if not name.endswith('.sock'):
+                continue
+            path = os.path.join(self.socket_dir, name)
+            try:
+                self._outbox.sendto(message, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a process that has exited
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                pass # That process is not keeping up; its streams will miss this event
+
+
+_broker_lock = threading.Lock()
+
+
+def get_broker(app):
+    broker = app.extensions.get('events')
+    if broker is not None:
+        return broker
+    with _broker_lock:
+        if 'events' not in app.extensions:
+            if app.config['EVENTS_BROKER'] == 'unix':
+                app.extensions['events'] = UnixSocketBroker(app.config['EVENTS_SOCKET_DIR'], app.logger)
+            else:
+                app.extensions['events'] = InProcessBroker()
+        return app.extensions['events']
+
+
+def publish(user_id, event_type, data):
+    """Send a change event to the user's open streams. Call after the change is committed."""
+    from flask import current_app
+    event = {'id': next(_event_ids), 'type': event_type, 'data': data}
+    try:
+        get_broker(current_app).publish(user_id, event)
+    except Exception as e:
+        # The write already succeeded; a lost notification must not turn it into an error
+        current_app.logger.warning("Could not publish %s event: %s", event_type, e)
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+HEARTBEAT = ": ping\n\n"
+RESYNC = {'id': 0, 'type': 'resync', 'data': {"reason": "too many events queued; refetch your data"}}
@@ -0,0 +1,12 @@
+"""Flask extensions, created unbound and attached to an app in create_app()."""
+from flask_bcrypt import Bcrypt
+from flask_cors import CORS
+from flask_jwt_extended import JWTManager
+from flask_sqlalchemy import SQLAlchemy
+
+from .sharding import ShardedSession
+
+db = SQLAlchemy(session_options={'class_': ShardedSession}) # Routes user tables to their shard when sharding is on
+bcrypt = Bcrypt()
+jwt = JWTManager()
+cors = CORS()
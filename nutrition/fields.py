@@ -0,0 +1,38 @@
+"""Sparse fieldsets: ?fields=a,b,nutrition.c on list and detail routes."""
+from flask import request
+
+def parse_fields(model, nested=None):
+    """
+    Parses ?fields= for a model. Returns (fields, nested_fields):
+      - fields: set of column names (primary key always included), or None if ?fields= is absent
+      - nested_fields: {relationship_name: set of column names, or None for all columns}
+    Raises ValueError for unknown names.
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return None, {}
+    
+    nested = nested or {}
+    columns = set(model.__table__.columns.keys())
+    fields = {c.name for c in model.__table__.primary_key.columns}
+    nested_fields = {}
+    for name in (f.strip() for f in raw.split(',')):
+        if not name:
+            continue
+        rel, _, sub = name.partition('.')
+        if rel in nested:
+            if not sub:
+                nested_fields[rel] = None
+            elif sub in nested[rel].__table__.columns.keys():
+                if nested_fields.get(rel, set()) is not None:
+                    nested_fields.setdefault(rel, set()).add(sub)
+            else:
+                raise ValueError(f"Unknown field: {name}")
+        elif name in columns:
+            fields.add(name)
+        else:
+            raise ValueError(f"Unknown field: {name}")
+    return fields, nested_fields
+
+def model_columns(model, names):
+    return [getattr(model, name) for name in names]
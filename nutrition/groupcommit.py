@@ -0,0 +1,170 @@
+"""
+Group commit for diet log writes (opt-in: DIETLOG_GROUP_COMMIT=1).
+
+Around mealtimes many users add and toggle diet logs at once, and each request
+pays for its own transaction commit. With group commit on, add_diet_log and
+toggle_diet_log hand their write to a per-process writer thread instead. The
+writer collects whatever arrives within DIETLOG_GROUP_COMMIT_MAX_DELAY_MS (or
+up to DIETLOG_GROUP_COMMIT_MAX_ROWS writes) and applies it in one transaction.
+
+Each request waits on a Future that resolves only after that transaction has
+committed, so a 201/200 still means the row is durable. If the batch fails,
+its writes are retried one transaction each, and only the writes that fail
+again get an error. Two toggles of the same log in one batch both apply;
+both callers see the final state. With sharding on, a batch is written as one
+transaction per shard.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import select, update, not_
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .models import User_Diet_Log
+from .sharding import current_shard
+
+_STOP = object()
+
+
+class DietLogWriteBuffer:
+    def __init__(self, app, max_rows, max_delay_ms):
+        self.app = app
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.stats = {'batches': 0, 'writes': 0, 'largest_batch': 0, 'batch_failures': 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='dietlog-group-commit', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def insert(self, values):
+        """Future resolving to the new log's to_dict()."""
+        return self._submit(('insert', values))
+
+    def toggle(self, log_id, user_id, is_admin):
+        """Future resolving to the log's to_dict(), or None if no row matched (missing or not owned)."""
+        return self._submit(('toggle', (log_id, user_id, is_admin)))
+
+    def close(self):
+        """Writes out everything already submitted, then stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _submit(self, op):
+        future = Future()
+        self._queue.put(((*op, current_shard()), future)) # Written on the caller's shard
+        return future
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            stopping = False
+            while len(batch) < self.max_rows:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            by_shard = {}
+            for item in batch:
+                by_shard.setdefault(item[0][2], []).append(item)
+            for shard, items in by_shard.items():
+                try:
+                    with self.app.app_context():
+                        self._write(db.engines[shard] if shard else db.engine, items)
+                except Exception as e:
+                    # Never leave a request waiting forever
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+            if stopping:
+                return
+
+    def _write(self, engine, batch):
+        self.stats['batches'] += 1
+        self.stats['writes'] += len(batch)
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+
+        with Session(engine, expire_on_commit=False) as session:
+            try:
+                applied = [self._apply(session, op) for op, _ in batch]
+                session.commit()
+                outcomes = [(future, result, None) for (_, future), result in zip(batch, applied)]
+            except Exception:
+                session.rollback()
+                self.stats['batch_failures'] += 1
+                outcomes = []
+                for op, future in batch:
+                    try:
+                        result = self._apply(session, op)
+                        session.commit()
+                        outcomes.append((future, result, None))
+                    except Exception as e:
+                        session.rollback()
+                        outcomes.append((future, None, e))
+
+            # One SELECT reads back every touched row (ids and server defaults)
+            log_ids = {result.Log_ID if isinstance(result, User_Diet_Log) else result
+                       for _, result, error in outcomes if result is not None}
+            rows = {}
+            if log_ids:
+                rows = {log.Log_ID: log.to_dict() for log in session.scalars(
+                    select(User_Diet_Log).where(User_Diet_Log.Log_ID.in_(log_ids))
+                    .execution_options(populate_existing=True)
+                )}
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            elif result is None:
+                future.set_result(None)
+            else:
+                future.set_result(rows.get(result.Log_ID if isinstance(result, User_Diet_Log) else result))
+
+    def _apply(self, session, op):
+        kind, args, _ = op
+        if kind == 'insert':
+            log = User_Diet_Log(**args)
+            session.add(log)
+            return log
+        log_id, user_id, is_admin = args
+        clause = User_Diet_Log.Log_ID == log_id
+        # --- ADMIN OVERRIDE ---
+        if not is_admin:
+            clause = clause & (User_Diet_Log.User_ID == user_id)
+        result = session.execute(
+            update(User_Diet_Log).where(clause).values(is_finished=not_(User_Diet_Log.is_finished))
+            .execution_options(synchronize_session=False)
+        )
+        return log_id if result.rowcount else None
+
+
+_buffer_lock = threading.Lock()
+
+
+def diet_log_write_buffer(app):
+    """The app's write buffer, or None when group commit is off."""
+    if not app.config.get('DIETLOG_GROUP_COMMIT'):
+        return None
+    app = getattr(app, '_get_current_object', lambda: app)() # The writer thread needs the app, not the current_app proxy
+    buffer = app.extensions.get('dietlog_group_commit')
+    if buffer is not None:
+        return buffer
+    with _buffer_lock:
+        if 'dietlog_group_commit' not in app.extensions:
+            app.extensions['dietlog_group_commit'] = DietLogWriteBuffer(
+                app, app.config['DIETLOG_GROUP_COMMIT_MAX_ROWS'], app.config['DIETLOG_GROUP_COMMIT_MAX_DELAY_MS']
+            )
+        return app.extensions['dietlog_group_commit']
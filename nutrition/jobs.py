@@ -0,0 +1,165 @@
+"""
+Background jobs: a durable queue in the Background_Job table.
+
+Slow routes can enqueue a job and return 202; `python worker.py` picks the
+jobs up. Handlers are registered with @job_handler next to the routes they
+belong to.
+
+A running job holds a lease: the worker renews Heartbeat_At every third of
+JOB_LEASE_SECONDS while the handler runs. A job whose lease lapsed (its worker
+died, was OOM-killed or hung) goes back to the queue, and is marked failed
+once it has used Max_Attempts claims, so a job that kills its worker is not
+retried forever.
+
+Existing MySQL databases need the lease column:
+
+    ALTER TABLE Background_Job ADD COLUMN Heartbeat_At DATETIME NULL;
+"""
+import datetime
+import json
+import threading
+
+from flask import request, jsonify, current_app
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .models import Background_Job
+from .sharding import on_user_shard
+
+# No external broker: the queue is just rows in our own database.
+JOB_HANDLERS = {}
+
+def job_handler(job_type):
+    """Registers a function as the handler for a job type. It receives the decoded payload."""
+    def wrapper(fn):
+        JOB_HANDLERS[job_type] = fn
+        return fn
+    return wrapper
+
+def wants_background():
+    return request.args.get('background', '').lower() in ('1', 'true', 'yes')
+
+def enqueue_job(job_type, payload, created_by=None, max_attempts=5, delay_seconds=0, session=None):
+    """Queues a job and commits. Pass session to queue it outside db.session's transaction."""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+    job = Background_Job(
+        Job_Type=job_type,
+        Payload=json.dumps(payload),
+        Status='queued',
+        Attempts=0,
+        Max_Attempts=max_attempts,
+        Run_After=datetime.datetime.now() + datetime.timedelta(seconds=delay_seconds),
+        Created_By=created_by
+    )
+    session = session or db.session
+    session.add(job)
+    session.commit()
+    return job
+
+def job_accepted_response(job, message):
+    return jsonify({
+        "message": message,
+        "job_id": job.Job_ID,
+        "status_url": f"/api/jobs/{job.Job_ID}"
+    }), 202
+
+def job_backoff_seconds(attempts):
+    config = current_app.config
+    return min(config['JOB_BACKOFF_BASE_SECONDS'] * (2 ** max(attempts - 1, 0)), config['JOB_BACKOFF_MAX_SECONDS'])
+
+def claim_next_job(worker_id):
+    """Atomically moves one due job from 'queued' to 'running'. Returns it, or None."""
+    now = datetime.datetime.now()
+    candidates = db.session.query(Background_Job.Job_ID)\
+        .filter(Background_Job.Status == 'queued', Background_Job.Run_After <= now)\
+        .order_by(Background_Job.Run_After, Background_Job.Job_ID)\
+        .limit(10)\
+        .all()
+    
+    for (job_id,) in candidates:
+        # The Status guard makes this a compare-and-swap, so two workers never
+        # run the same job even without SELECT ... FOR UPDATE.
+        claimed = Background_Job.query.filter_by(Job_ID=job_id, Status='queued').update({
+            'Status': 'running',
+            'Locked_By': worker_id,
+            'Started_At': now,
+            'Heartbeat_At': now,
+            'Attempts': Background_Job.Attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Background_Job, job_id)
+    return None
+
+def requeue_stale_jobs():
+    """
+    Puts 'running' jobs whose lease lapsed back in the queue, or marks them
+    failed when that was their last attempt (the claim counted it). Returns
+    how many were requeued.
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=current_app.config['JOB_LEASE_SECONDS'])
+    stale = Background_Job.query.filter(
+        Background_Job.Status == 'running',
+        func.coalesce(Background_Job.Heartbeat_At, Background_Job.Started_At) < cutoff
+    )
+    stale.filter(Background_Job.Attempts >= Background_Job.Max_Attempts).update({
+        'Status': 'failed',
+        'Locked_By': None,
+        'Finished_At': datetime.datetime.now(),
+        'Last_Error': "Worker stopped renewing the job's lease on its last attempt"
+    }, synchronize_session=False)
+    count = stale.filter(Background_Job.Attempts < Background_Job.Max_Attempts).update({
+        'Status': 'queued',
+        'Locked_By': None,
+        'Last_Error': "Worker stopped renewing the job's lease"
+    }, synchronize_session=False)
+    db.session.commit()
+    return count
+
+def _renew_lease(engine, job_id, worker_id, interval, stop):
+    """Touches the job's Heartbeat_At every `interval` seconds until `stop` is set."""
+    while not stop.wait(interval):
+        try:
+            with Session(engine) as session:
+                session.query(Background_Job)\
+                    .filter_by(Job_ID=job_id, Status='running', Locked_By=worker_id)\
+                    .update({'Heartbeat_At': datetime.datetime.now()}, synchronize_session=False)
+                session.commit()
+        except Exception as e:
+            print(f"[{worker_id}] lease renewal for job {job_id} failed: {e}", flush=True)
+
+def run_job(job):
+    """Runs a claimed job and records success, a retry with backoff, or final failure."""
+    job_id = job.Job_ID
+    stop_renewing = threading.Event()
+    threading.Thread(
+        target=_renew_lease,
+        args=(db.engine, job_id, job.Locked_By, current_app.config['JOB_LEASE_SECONDS'] / 3, stop_renewing),
+        name=f'job-{job_id}-lease', daemon=True
+    ).start()
+    try:
+        handler = JOB_HANDLERS[job.Job_Type]
+        payload = json.loads(job.Payload or '{}')
+        with on_user_shard(payload.get('user_id')): # Per-user jobs run on that user's shard
+            result = handler(payload)
+        job = db.session.get(Background_Job, job_id)
+        job.Status = 'succeeded'
+        job.Result = json.dumps(result)
+        job.Last_Error = None
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Background_Job, job_id)
+        job.Last_Error = str(e)
+        if job.Attempts >= job.Max_Attempts:
+            job.Status = 'failed'
+        else:
+            job.Status = 'queued'
+            job.Run_After = datetime.datetime.now() + datetime.timedelta(seconds=job_backoff_seconds(job.Attempts))
+    finally:
+        stop_renewing.set()
+    job.Locked_By = None
+    job.Finished_At = datetime.datetime.now()
+    db.session.commit()
+    return job
@@ -0,0 +1,139 @@
+"""
+Nutrition snapshots on diet logs.
+
+Every User_Diet_Log row stores the calories and macros it was logged with
+(SNAPSHOT_COLUMNS), worked out from its recipe's ingredients and Portion_Size
+when the log is written, or when its recipe or portion is edited. Diet log
+summaries, exports and analytics snapshots read those columns straight off
+the log, so editing a recipe or an ingredient later leaves past days alone.
+
+A log without a recipe has NULL nutrition. Logs written before the columns
+existed are NULL too until backfill_log_nutrition() fills them
+(POST /api/admin/dietlogs/nutrition/backfill); until then summaries and
+exports read them through logged_nutrition(), which falls back to the
+recipe's current nutrition as the analytics snapshot does. Existing MySQL
+databases need the columns added first:
+
+    ALTER TABLE User_Diet_Log
+        ADD COLUMN Calories DECIMAL(10,2), ADD COLUMN Protein_g DECIMAL(10,2),
+        ADD COLUMN Carbohydrates_g DECIMAL(10,2), ADD COLUMN Fat_g DECIMAL(10,2),
+        ADD COLUMN Fiber_g DECIMAL(10,2);
+"""
+from flask import current_app
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .models import Nutrition, Recipe_Ingredient, User_Diet_Log
+from .resultcache import invalidate_user_results
+from .sharding import shard_engines
+
+# Diet log column -> the Nutrition column (per 100 g of ingredient) it is summed from
+SNAPSHOT_COLUMNS = {
+    'Calories': Nutrition.Calories,
+    'Protein_g': Nutrition.Protein_g,
+    'Carbohydrates_g': Nutrition.Carbohydrates_g,
+    'Fat_g': Nutrition.Fat_g,
+    'Fiber_g': Nutrition.Fiber_g,
+}
+
+
+def recipe_nutrition(recipe_ids, session=None):
+    """{Recipe_ID: {column: amount in one portion}} for the given recipes, in one query."""
+    session = session or db.session
+    recipe_ids = {recipe_id for recipe_id in recipe_ids if recipe_id is not None}
+    per_recipe = {recipe_id: dict.fromkeys(SNAPSHOT_COLUMNS, 0) for recipe_id in recipe_ids}
+    if recipe_ids:
+        rows = session.execute(
+            select(Recipe_Ingredient.Recipe_ID,
+                   *[func.sum(column * (Recipe_Ingredient.Quantity / 100)) for column in SNAPSHOT_COLUMNS.values()])
+            .join(Nutrition, Recipe_Ingredient.Ingredient_ID == Nutrition.Ingredient_ID)
+            .where(Recipe_Ingredient.Recipe_ID.in_(recipe_ids))
+            .group_by(Recipe_Ingredient.Recipe_ID)
+        )
+        for recipe_id, *amounts in rows:
+            per_recipe[recipe_id] = {name: amount or 0 for name, amount in zip(SNAPSHOT_COLUMNS, amounts)}
+    return per_recipe
+
+
+def logged_nutrition():
+    """
+    {snapshot column: SQL expression} for a User_Diet_Log row's nutrition: its
+    snapshot, or for a log not backfilled yet its recipe's current nutrition
+    times Portion_Size. The correlated sum only runs for logs without one.
+    """
+    expressions = {}
+    for name, column in SNAPSHOT_COLUMNS.items():
+        per_portion = select(func.sum(column * (Recipe_Ingredient.Quantity / 100)))\
+            .select_from(Recipe_Ingredient)\
+            .join(Nutrition, Recipe_Ingredient.Ingredient_ID == Nutrition.Ingredient_ID)\
+            .where(Recipe_Ingredient.Recipe_ID == User_Diet_Log.Recipe_ID)\
+            .scalar_subquery()
+        expressions[name] = func.coalesce(
+            getattr(User_Diet_Log, name), per_portion * func.coalesce(User_Diet_Log.Portion_Size, 1)
+        )
+    return expressions
+
+
+def log_nutrition(recipe_id, portion_size, per_recipe=None):
+    """
+    The snapshot columns for a log of `portion_size` portions of `recipe_id`
+    (all None without a recipe). per_recipe is a recipe_nutrition() result to
+    reuse; without it the recipe is looked up.
+    """
+    if recipe_id is None:
+        return dict.fromkeys(SNAPSHOT_COLUMNS)
+    if per_recipe is None or recipe_id not in per_recipe:
+        per_recipe = recipe_nutrition([recipe_id])
+    portion = float(1 if portion_size is None else portion_size)
+    return {name: round(float(amount) * portion, 2) for name, amount in per_recipe[recipe_id].items()}
+
+
+def log_nutrition_for_update(log_id, values):
+    """
+    The snapshot columns to add to an update of log `log_id` that sets `values`,
+    or {} when the update changes neither its recipe nor its portion.
+    """
+    if 'Recipe_ID' not in values and 'Portion_Size' not in values:
+        return {}
+    current = db.session.execute(
+        select(User_Diet_Log.Recipe_ID, User_Diet_Log.Portion_Size).where(User_Diet_Log.Log_ID == log_id)
+    ).first()
+    if current is None:
+        return {} # The update itself reports the missing log
+    return log_nutrition(values.get('Recipe_ID', current.Recipe_ID), values.get('Portion_Size', current.Portion_Size))
+
+
+def backfill_log_nutrition(recompute=False, batch_size=None):
+    """
+    Fills in the snapshot of every log that has a recipe but no snapshot yet,
+    or, with recompute=True, recomputes every such log from its recipe as it
+    is now. Walks the logs in Log_ID order, batch_size per transaction, on
+    every shard. Returns the number of logs written.
+    """
+    batch_size = batch_size or current_app.config['DIETLOG_NUTRITION_BACKFILL_BATCH']
+    written = 0
+    for engine in shard_engines():
+        with Session(engine) as session:
+            per_recipe = {}
+            last_id = 0
+            while True:
+                stmt = select(User_Diet_Log.Log_ID, User_Diet_Log.User_ID, User_Diet_Log.Recipe_ID, User_Diet_Log.Portion_Size)\
+                    .where(User_Diet_Log.Log_ID > last_id, User_Diet_Log.Recipe_ID.is_not(None))\
+                    .order_by(User_Diet_Log.Log_ID)\
+                    .limit(batch_size)
+                if not recompute:
+                    stmt = stmt.where(User_Diet_Log.Calories.is_(None))
+                rows = session.execute(stmt).all()
+                if not rows:
+                    break
+                # Each recipe is summed once per shard, however many logs use it
+                per_recipe.update(recipe_nutrition({row.Recipe_ID for row in rows} - per_recipe.keys(), session))
+                session.execute(update(User_Diet_Log), [
+                    {'Log_ID': row.Log_ID, **log_nutrition(row.Recipe_ID, row.Portion_Size, per_recipe)} for row in rows
+                ])
+                session.commit()
+                invalidate_user_results(*{row.User_ID for row in rows})
+                written += len(rows)
+                last_id = rows[-1].Log_ID
+    return written
@@ -0,0 +1,307 @@
+"""Database models (mapping to the NutritionDB tables)."""
+import datetime
+from decimal import Decimal
+
+from sqlalchemy import text, ForeignKey, UniqueConstraint, Index, Enum, DECIMAL, TIME, DATE, TIMESTAMP
+from sqlalchemy.orm import relationship
+
+from .extensions import db
+
+# Helper class to add a .to_dict() method to all models
+class Base(db.Model):
+    __abstract__ = True
+    
+    def to_dict(self, exclude=None, relationships=None, only=None):
+        if exclude is None:
+            exclude = []
+        
+        data = {}
+        for c in self.__table__.columns:
+            if c.name in exclude:
+                continue
+            if only is not None and c.name not in only: # Sparse fieldset (?fields=)
+                continue
+            
+            val = getattr(self, c.name)
+            
+            if isinstance(val, (datetime.date, datetime.time)):
+                data[c.name] = val.isoformat()
+            elif isinstance(val, Decimal):
+                data[c.name] = float(val)
+            elif isinstance(val, datetime.datetime):
+                data[c.name] = val.isoformat()
+            else:
+                data[c.name] = val
+                
+        if relationships:
+            for rel_name, rel_fields in relationships.items():
+                rel_data = []
+                rel_object = getattr(self, rel_name)
+                if isinstance(rel_object, list): # One-to-many
+                    for item in rel_object:
+                        rel_data.append(item.to_dict(exclude=rel_fields.get('exclude', [])))
+                elif rel_object: # One-to-one
+                    rel_data = rel_object.to_dict(exclude=rel_fields.get('exclude', []))
+                data[rel_name] = rel_data
+        return data
+
+class User(Base):
+    __tablename__ = 'User'
+    User_ID = db.Column(db.Integer, primary_key=True)
+    Name = db.Column(db.String(100), nullable=False)
+    Email = db.Column(db.String(255), nullable=False, unique=True)
+    Password = db.Column(db.String(255), nullable=False) # Will store hash
+    Date_Of_Birth = db.Column(DATE)
+    Gender = db.Column(Enum('Male', 'Female', 'Other'), default='Other')
+    Height_cm = db.Column(db.SmallInteger)
+    Weight_kg = db.Column(DECIMAL(5, 2))
+    Activity_Level = db.Column(Enum('Sedentary', 'Light', 'Moderate', 'Active', 'Very Active'), default='Moderate')
+    Dietary_Preferences = db.Column(db.String(100))
+    Allergies = db.Column(db.String(255))
+    Restriction_Mask = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Parsed from the two above, see diettags.py
+    BMI = db.Column(DECIMAL(5, 2))
+    role = db.Column(Enum('user', 'admin'), nullable=False, default='user') # <-- Admin role
+    Created_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    Updated_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'))
+    
+    # Relationships
+    recipes = relationship('Recipe', back_populates='creator')
+    
+    # --- THIS IS THE FIX for the DELETE error ---
+    # These tell SQLAlchemy to delete all child objects when the parent User is deleted.
+    # passive_deletes=True stops it from loading every child row first; the rows are
+    # removed by delete_user_accounts() and the ON DELETE CASCADE foreign keys instead.
+    diet_logs = relationship('User_Diet_Log', back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
+    meal_plans = relationship('Meal_Plan', back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
+    feedback = relationship('Feedback', back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
+    weight_history = relationship('User_Weight_History', back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
+
+    # --- END OF FIX ---
+
+class Recipe(Base):
+    __tablename__ = 'Recipe'
+    Recipe_ID = db.Column(db.Integer, primary_key=True)
+    Recipe_Name = db.Column(db.String(200), nullable=False)
+    Description = db.Column(db.Text)
+    Cuisine_Type = db.Column(db.String(100))
+    Preparation_Time_minutes = db.Column(db.SmallInteger, default=0)
+    Cooking_Time_minutes = db.Column(db.SmallInteger, default=0)
+    Serving_Size = db.Column(DECIMAL(4, 2), nullable=False, default=1)
+    Difficulty_Level = db.Column(Enum('Easy', 'Medium', 'Hard'), default='Easy')
+    Instructions = db.Column(db.Text)
+    Creator_User_ID = db.Column(db.Integer, ForeignKey('User.User_ID', ondelete='SET NULL', onupdate='CASCADE'))
+    Tag_Mask = db.Column(db.Integer, nullable=False, default=0, server_default='0') # OR of its ingredients' tags
+    Created_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    Updated_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+                           onupdate=db.func.current_timestamp()) # Delta sync reads it (see sync.py)
+
+    __table_args__ = (
+        Index('ix_Recipe_Creator_Updated', 'Creator_User_ID', 'Updated_At'),
+        Index('ix_Recipe_Updated', 'Updated_At'),
+    )
+    
+    # Relationships
+    creator = relationship('User', back_populates='recipes')
+    ingredients = relationship('Recipe_Ingredient', back_populates='recipe', cascade="all, delete-orphan")
+    diet_logs = relationship('User_Diet_Log', back_populates='recipe')
+    meal_plans = relationship('MealPlan_Recipe', back_populates='recipe')
+    feedback = relationship('Feedback', back_populates='recipe', cascade="all, delete-orphan")
+    rating = relationship('Recipe_Rating', uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+
+class Ingredient(Base):
+    __tablename__ = 'Ingredient'
+    Ingredient_ID = db.Column(db.Integer, primary_key=True)
+    Ingredient_Name = db.Column(db.String(150), nullable=False, unique=True)
+    Unit_Of_Measure = db.Column(db.String(50), nullable=False)
+    Category = db.Column(db.String(50), nullable=False)
+    Notes = db.Column(db.String(255))
+    Tag_Mask = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Allergens and diet tags, see diettags.py
+    Updated_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+                           onupdate=db.func.current_timestamp())
+
+    __table_args__ = (Index('ix_Ingredient_Updated', 'Updated_At'),)
+    
+    # Relationships
+    nutrition = relationship('Nutrition', uselist=False, back_populates='ingredient', cascade="all, delete-orphan")
+    recipes = relationship('Recipe_Ingredient', back_populates='ingredient')
+
+class Nutrition(Base):
+    __tablename__ = 'Nutrition'
+    Nutrition_ID = db.Column(db.Integer, primary_key=True)
+    Ingredient_ID = db.Column(db.Integer, ForeignKey('Ingredient.Ingredient_ID', ondelete='CASCADE', onupdate='CASCADE'), nullable=False, unique=True)
+    Calories = db.Column(DECIMAL(6, 2))
+    Carbohydrates_g = db.Column(DECIMAL(6, 2), default=0)
+    Protein_g = db.Column(DECIMAL(6, 2), default=0)
+    Fat_g = db.Column(DECIMAL(6, 2), default=0)
+    Fiber_g = db.Column(DECIMAL(6, 2), default=0)
+    Vitamins = db.Column(db.String(255))
+    Minerals = db.Column(db.String(255))
+    Other_Nutrients = db.Column(db.Text)
+    Updated_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'))
+    
+    # Relationships
+    ingredient = relationship('Ingredient', back_populates='nutrition')
+
+class Recipe_Ingredient(Base):
+    __tablename__ = 'Recipe_Ingredient'
+    RecipeIngredient_ID = db.Column(db.Integer, primary_key=True)
+    Recipe_ID = db.Column(db.Integer, ForeignKey('Recipe.Recipe_ID', ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
+    Ingredient_ID = db.Column(db.Integer, ForeignKey('Ingredient.Ingredient_ID', ondelete='RESTRICT', onupdate='CASCADE'), nullable=False)
+    Quantity = db.Column(DECIMAL(8, 3), nullable=False)
+    Unit = db.Column(db.String(50), nullable=False)
+    
+    __table_args__ = (UniqueConstraint('Recipe_ID', 'Ingredient_ID'),)
+    
+    # Relationships
+    recipe = relationship('Recipe', back_populates='ingredients')
+    ingredient = relationship('Ingredient', back_populates='recipes')
+
+class User_Diet_Log(Base):
+    __tablename__ = 'User_Diet_Log'
+    Log_ID = db.Column(db.Integer, primary_key=True)
+    User_ID = db.Column(db.Integer, ForeignKey('User.User_ID', ondelete='CASCADE', onupdate='CASCADE'))
+    Recipe_ID = db.Column(db.Integer, ForeignKey('Recipe.Recipe_ID', ondelete='SET NULL', onupdate='CASCADE'))
+    Date = db.Column(DATE, nullable=False)
+    Time = db.Column(TIME)
+    Portion_Size = db.Column(DECIMAL(5, 2), default=1)
+    Notes = db.Column(db.Text)
+    is_finished = db.Column(db.Boolean, nullable=False, default=False)
+    # Nutrition of this log (recipe x Portion_Size) as of when it was written; see nutrition/lognutrition.py
+    Calories = db.Column(DECIMAL(10, 2))
+    Protein_g = db.Column(DECIMAL(10, 2))
+    Carbohydrates_g = db.Column(DECIMAL(10, 2))
+    Fat_g = db.Column(DECIMAL(10, 2))
+    Fiber_g = db.Column(DECIMAL(10, 2))
+    Created_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    Updated_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+                           onupdate=db.func.current_timestamp())
+
+    __table_args__ = (Index('ix_User_Diet_Log_User_Updated', 'User_ID', 'Updated_At'),)
+    
+    # Relationships
+    user = relationship('User', back_populates='diet_logs')
+    recipe = relationship('Recipe', back_populates='diet_logs')
+
+class Meal_Plan(Base):
+    __tablename__ = 'Meal_Plan'
+    MealPlan_ID = db.Column(db.Integer, primary_key=True)
+    User_ID = db.Column(db.Integer, ForeignKey('User.User_ID', ondelete='CASCADE', onupdate='CASCADE'))
+    Plan_Name = db.Column(db.String(150), nullable=False)
+    Start_Date = db.Column(DATE)
+    End_Date = db.Column(DATE)
+    Notes = db.Column(db.Text)
+    Created_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    Updated_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+                           onupdate=db.func.current_timestamp())
+
+    __table_args__ = (Index('ix_Meal_Plan_User_Updated', 'User_ID', 'Updated_At'),)
+    
+    # Relationships
+    user = relationship('User', back_populates='meal_plans')
+    recipes = relationship('MealPlan_Recipe', back_populates='meal_plan', cascade="all, delete-orphan")
+
+class MealPlan_Recipe(Base):
+    __tablename__ = 'MealPlan_Recipe'
+    id = db.Column(db.Integer, primary_key=True)
+    MealPlan_ID = db.Column(db.Integer, ForeignKey('Meal_Plan.MealPlan_ID', ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
+    Recipe_ID = db.Column(db.Integer, ForeignKey('Recipe.Recipe_ID', ondelete='RESTRICT', onupdate='CASCADE'), nullable=False)
+    Day_of_Plan = db.Column(DATE)
+    Meal_Type = db.Column(Enum('Breakfast', 'Lunch', 'Dinner', 'Snack'), default='Lunch')
+    
+    # Relationships
+    meal_plan = relationship('Meal_Plan', back_populates='recipes')
+    recipe = relationship('Recipe', back_populates='meal_plans')
+
+class Feedback(Base):
+    __tablename__ = 'Feedback'
+    Feedback_ID = db.Column(db.Integer, primary_key=True)
+    User_ID = db.Column(db.Integer, ForeignKey('User.User_ID', ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
+    Recipe_ID = db.Column(db.Integer, ForeignKey('Recipe.Recipe_ID', ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
+    Rating = db.Column(db.SmallInteger, nullable=False)
+    Comments = db.Column(db.Text)
+    Date = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    Updated_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'))
+    
+    # Newest-first feedback pages for one recipe
+    __table_args__ = (Index('ix_Feedback_Recipe_Date', 'Recipe_ID', 'Date'),)
+    
+    # Relationships
+    user = relationship('User', back_populates='feedback')
+    recipe = relationship('Recipe', back_populates='feedback')
+
+# --- NEW: Per-recipe rating aggregates, kept in step with Feedback (see ratings.py) ---
+class Recipe_Rating(Base):
+    __tablename__ = 'Recipe_Rating'
+    Recipe_ID = db.Column(db.Integer, ForeignKey('Recipe.Recipe_ID', ondelete='CASCADE', onupdate='CASCADE'), primary_key=True)
+    Rating_Count = db.Column(db.Integer, nullable=False, default=0)
+    Rating_Sum = db.Column(db.Integer, nullable=False, default=0)
+    Stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    Stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    Stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    Stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    Stars_5 = db.Column(db.Integer, nullable=False, default=0)
+    Avg_Rating = db.Column(DECIMAL(4, 3)) # NULL while the recipe has no ratings
+    
+    # Serves GET /api/recipes/top-rated without sorting the table
+    __table_args__ = (Index('ix_Recipe_Rating_Top', 'Avg_Rating', 'Rating_Count'),)
+
+class User_Weight_History(Base):
+    __tablename__ = 'User_Weight_History'
+    History_ID = db.Column(db.Integer, primary_key=True)
+    User_ID = db.Column(db.Integer, ForeignKey('User.User_ID', ondelete='CASCADE', onupdate='CASCADE'))
+    Old_Weight = db.Column(DECIMAL(5, 2))
+    New_Weight = db.Column(DECIMAL(5, 2))
+    Updated_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+    
+    # Relationship
+    user = relationship('User', back_populates='weight_history')
+
+class Recipe_Log(Base):
+    __tablename__ = 'Recipe_Log'
+    Log_ID = db.Column(db.Integer, primary_key=True)
+    Recipe_ID = db.Column(db.Integer, ForeignKey('Recipe.Recipe_ID', ondelete='CASCADE', onupdate='CASCADE'))
+    Recipe_Name = db.Column(db.String(200))
+    Created_By = db.Column(db.Integer, ForeignKey('User.User_ID', ondelete='SET NULL'))
+    Created_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+
+# --- NEW: Durable queue for background jobs (see jobs.py and worker.py) ---
+class Background_Job(Base):
+    __tablename__ = 'Background_Job'
+    Job_ID = db.Column(db.Integer, primary_key=True)
+    Job_Type = db.Column(db.String(100), nullable=False)
+    Payload = db.Column(db.Text) # JSON-encoded arguments for the handler
+    Status = db.Column(Enum('queued', 'running', 'succeeded', 'failed'), nullable=False, default='queued', index=True)
+    Attempts = db.Column(db.SmallInteger, nullable=False, default=0)
+    Max_Attempts = db.Column(db.SmallInteger, nullable=False, default=5)
+    Run_After = db.Column(db.DateTime, nullable=False, index=True)
+    Locked_By = db.Column(db.String(100))
+    Started_At = db.Column(db.DateTime)
+    Heartbeat_At = db.Column(db.DateTime) # Renewed by the worker while the job runs (its lease)
+    Finished_At = db.Column(db.DateTime)
+    Result = db.Column(db.Text) # JSON-encoded handler return value
+    Last_Error = db.Column(db.Text)
+    Created_By = db.Column(db.Integer) # No FK: the job may outlive the user it deletes
+    Created_At = db.Column(TIMESTAMP, server_default=text('CURRENT_TIMESTAMP'))
+
+# --- NEW: Deleted rows for delta sync, on the global database (see sync.py) ---
+class Sync_Tombstone(Base):
+    __tablename__ = 'Sync_Tombstone'
+    Tombstone_ID = db.Column(db.Integer, primary_key=True)
+    Table_Name = db.Column(db.String(64), nullable=False)
+    Row_ID = db.Column(db.Integer, nullable=False)
+    User_ID = db.Column(db.Integer) # Whose devices see it; NULL = everyone's. No FK: it outlives the user
+    Deleted_At = db.Column(TIMESTAMP, nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+    __table_args__ = (
+        Index('ix_Sync_Tombstone_User_Deleted', 'User_ID', 'Deleted_At'),
+        Index('ix_Sync_Tombstone_Deleted', 'Deleted_At'),
+    )
+
+# --- NEW: Shard directory, on the global database (see sharding.py) ---
+class User_Shard(Base):
+    __tablename__ = 'User_Shard'
+    User_ID = db.Column(db.Integer, primary_key=True) # Allocates User_IDs when sharding is on
+    Email = db.Column(db.String(255), nullable=False, unique=True) # Login looks the shard up by email
+    Shard = db.Column(db.SmallInteger, nullable=False) # Index into SHARD_DATABASE_URLS
+    Locked = db.Column(db.Boolean, nullable=False, default=False) # Set while the user is being moved
+    Moved_At = db.Column(db.DateTime)
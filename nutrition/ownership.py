@@ -0,0 +1,76 @@
+"""
+Single-statement writes on user-owned rows.
+
+The ownership check goes into the WHERE clause, so an UPDATE or DELETE is one
+round trip and the database applies it atomically:
+
+    UPDATE ... WHERE <pk> = :id AND User_ID = :uid      (non-admin callers)
+    UPDATE ... WHERE <pk> = :id                         (admins)
+
+Only when nothing matched do we look the row up again, to tell "not found"
+(404) from "not yours" (403).
+"""
+from flask import jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import select, update, delete
+
+from .extensions import db
+from .sync import record_deletions
+
+
+def owned_row_clause(pk_column, pk, owner_column):
+    """WHERE clause matching this row, and only if the caller owns it (admins own everything)."""
+    clause = pk_column == pk
+    # --- ADMIN OVERRIDE ---
+    if get_jwt().get("role") != 'admin':
+        clause = clause & (owner_column == get_jwt_identity())
+    return clause
+
+
+def not_found_or_forbidden(pk_column, pk, not_found_message):
+    """Error response for a guarded write that matched no rows."""
+    if db.session.execute(select(pk_column).where(pk_column == pk)).first() is None:
+        return jsonify({"error": not_found_message}), 404
+    return jsonify({"error": "Unauthorized"}), 403
+
+
+def guarded_update(model, pk_column, pk, owner_column, values, not_found_message):
+    """
+    UPDATE the row if the caller owns it and commit.
+    Returns None on success, otherwise the error response to send.
+    """
+    if not values:
+        # Nothing to change, but the caller still gets the same 404/403 answers.
+        if db.session.execute(select(pk_column).where(owned_row_clause(pk_column, pk, owner_column))).first():
+            return None
+        return not_found_or_forbidden(pk_column, pk, not_found_message)
+    result = db.session.execute(
+        update(model)
+        .where(owned_row_clause(pk_column, pk, owner_column))
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    # MySQL reports matched (not changed) rows here: SQLAlchemy connects with CLIENT_FOUND_ROWS.
+    if result.rowcount:
+        return None
+    return not_found_or_forbidden(pk_column, pk, not_found_message)
+
+
+def guarded_delete(model, pk_column, pk, owner_column, not_found_message, synced_owner_id=None):
+    """
+    DELETE the row if the caller owns it and commit. For a row of a synced
+    model, synced_owner_id is whose devices are told (see sync.py).
+    Returns None on success, otherwise the error response to send.
+    """
+    result = db.session.execute(
+        delete(model)
+        .where(owned_row_clause(pk_column, pk, owner_column))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount and synced_owner_id is not None:
+        record_deletions(model, [pk], synced_owner_id)
+    db.session.commit()
+    if result.rowcount:
+        return None
+    return not_found_or_forbidden(pk_column, pk, not_found_message)
@@ -0,0 +1,177 @@
+"""
+Recipe rating aggregates (the Recipe_Rating table).
+
+Every path that adds, changes or removes Feedback applies the matching delta
+to the recipe's Recipe_Rating row in the same transaction, so count, sum,
+star histogram and average are always ready to read without touching
+Feedback. rebuild_recipe_ratings() recomputes them all from Feedback, for
+the initial fill or after out-of-band edits. backfill_recipe_ratings() runs it
+once at server start (gunicorn.conf.py) when a database from before the table
+has Feedback but no aggregates.
+
+With sharding on, Feedback is on the user shards and Recipe_Rating on the
+global database, so no transaction covers both. There the Feedback change
+commits first and refresh_recipe_ratings() then recomputes the recipes'
+rows from every shard's Feedback: nothing is lost if it fails, as the next
+change to the recipe (or a rebuild) recomputes it from scratch.
+"""
+import itertools
+
+from sqlalchemy import func, select, update, delete, insert, case, literal
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import Feedback, Recipe_Rating
+from .resultcache import invalidate_catalog_results, invalidate_recipe_owner_results
+from .sharding import scatter_count, scatter_gather, sharding_enabled
+
+STARS = (1, 2, 3, 4, 5)
+
+
+def _stars_column(stars):
+    return getattr(Recipe_Rating, f'Stars_{stars}')
+
+
+def apply_rating_delta(recipe_id, deltas):
+    """
+    Adds {rating: +n / -n} to the recipe's aggregates. Does not commit: call it
+    inside the transaction that changes Feedback.
+    """
+    deltas = {rating: n for rating, n in deltas.items() if n}
+    if not deltas:
+        return
+    invalidate_recipe_owner_results(recipe_id) # Their recipe lists carry the rating
+    count_delta = sum(deltas.values())
+    sum_delta = sum(rating * n for rating, n in deltas.items())
+
+    new_count = Recipe_Rating.Rating_Count + count_delta
+    new_sum = Recipe_Rating.Rating_Sum + sum_delta
+    # Avg_Rating first: MySQL evaluates SET left to right with already-updated values
+    assignments = [
+        (Recipe_Rating.Avg_Rating, case((new_count > 0, new_sum * 1.0 / new_count), else_=None)),
+        (Recipe_Rating.Rating_Count, new_count),
+        (Recipe_Rating.Rating_Sum, new_sum),
+    ]
+    assignments += [(_stars_column(r), _stars_column(r) + n) for r, n in deltas.items() if r in STARS]
+
+    stmt = update(Recipe_Rating).where(Recipe_Rating.Recipe_ID == recipe_id).ordered_values(*assignments)
+    if db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount:
+        return
+
+    # First rating of this recipe. A concurrent first rating may insert the row
+    # between our UPDATE and INSERT; the savepoint lets us retry the UPDATE then.
+    row = {'Recipe_ID': recipe_id, 'Rating_Count': count_delta, 'Rating_Sum': sum_delta,
+           'Avg_Rating': sum_delta / count_delta if count_delta > 0 else None}
+    row.update({f'Stars_{r}': deltas.get(r, 0) for r in STARS})
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Recipe_Rating).values(row))
+    except IntegrityError:
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def remove_feedback_from_ratings(where_clause):
+    """Subtracts the Feedback rows matching where_clause (about to be deleted) from their recipes."""
+    rows = db.session.execute(
+        select(Feedback.Recipe_ID, Feedback.Rating, func.count().label('n'))
+        .where(where_clause)
+        .group_by(Feedback.Recipe_ID, Feedback.Rating)
+    )
+    per_recipe = {}
+    for recipe_id, rating, n in rows:
+        per_recipe.setdefault(recipe_id, {})[rating] = -n
+    for recipe_id, deltas in per_recipe.items():
+        apply_rating_delta(recipe_id, deltas)
+
+
+AGGREGATE_COLUMNS = ['Recipe_ID', 'Rating_Count', 'Rating_Sum', *[f'Stars_{r}' for r in STARS], 'Avg_Rating']
+
+
+def _grouped_feedback():
+    """Feedback grouped per recipe, one column per AGGREGATE_COLUMNS name."""
+    count = func.count(Feedback.Feedback_ID)
+    total = func.sum(Feedback.Rating)
+    return select(
+        Feedback.Recipe_ID, count, total,
+        *[func.sum(case((Feedback.Rating == r, 1), else_=0)) for r in STARS],
+        total * literal(1.0) / count,
+    ).group_by(Feedback.Recipe_ID)
+
+
+def _shard_aggregates(grouped):
+    """Recipe_Rating rows from running grouped on every shard, each recipe's parts added up."""
+    merged = scatter_gather(grouped.order_by(Feedback.Recipe_ID), sort_key=lambda row: row[0])
+    rows = []
+    for recipe_id, parts in itertools.groupby(merged, key=lambda row: row[0]):
+        totals = [sum(values) for values in zip(*(part[1:-1] for part in parts))]
+        rows.append(dict(zip(AGGREGATE_COLUMNS, [recipe_id, *totals, totals[1] / totals[0]])))
+    return rows
+
+
+def rebuild_recipe_ratings():
+    """
+    Recomputes every recipe's aggregates from Feedback with one grouped INSERT ...
+    SELECT (with sharding on, one grouped SELECT per shard, merged here).
+    """
+    db.session.execute(delete(Recipe_Rating))
+    if sharding_enabled():
+        # Feedback is spread over the user shards: add up each shard's aggregates
+        rows = _shard_aggregates(_grouped_feedback())
+        if rows:
+            db.session.execute(insert(Recipe_Rating), rows)
+    else:
+        db.session.execute(insert(Recipe_Rating).from_select(AGGREGATE_COLUMNS, _grouped_feedback()))
+    db.session.commit()
+    invalidate_catalog_results()
+    return db.session.scalar(select(func.count()).select_from(Recipe_Rating))
+
+
+def backfill_recipe_ratings():
+    """
+    Rebuilds the aggregates if Recipe_Rating is empty while Feedback is not.
+    Returns the number of recipes filled, or None when there was nothing to do.
+    """
+    if db.session.scalar(select(Recipe_Rating.Recipe_ID).limit(1)) is not None:
+        return None
+    if not scatter_count(select(func.count()).select_from(select(Feedback.Feedback_ID).limit(1).subquery())):
+        return None
+    return rebuild_recipe_ratings()
+
+
+def refresh_recipe_ratings(recipe_ids):
+    """
+    Recomputes the recipes' aggregates from their Feedback on every shard and
+    commits. Call it after committing the Feedback change. The Recipe_Rating
+    rows are locked before the shards are read, so concurrent refreshes of a
+    recipe take turns and the last one sees every committed change.
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    if not recipe_ids:
+        return
+    db.session.execute(select(Recipe_Rating.Recipe_ID).where(Recipe_Rating.Recipe_ID.in_(recipe_ids)).with_for_update())
+    rows = {row['Recipe_ID']: row for row in _shard_aggregates(_grouped_feedback().where(Feedback.Recipe_ID.in_(recipe_ids)))}
+    for recipe_id in recipe_ids:
+        row = rows.get(recipe_id) or {'Recipe_ID': recipe_id, 'Rating_Count': 0, 'Rating_Sum': 0, 'Avg_Rating': None,
+                                      **{f'Stars_{r}': 0 for r in STARS}}
+        stmt = update(Recipe_Rating).where(Recipe_Rating.Recipe_ID == recipe_id)\
+            .values({name: row[name] for name in AGGREGATE_COLUMNS[1:]})\
+            .execution_options(synchronize_session=False)
+        if not db.session.execute(stmt).rowcount:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(Recipe_Rating).values(row))
+            except IntegrityError:
+                db.session.execute(stmt)
+        invalidate_recipe_owner_results(recipe_id) # Their recipe lists carry the rating
+    db.session.commit()
+
+
+def serialize_rating(rating):
+    """Inline rating block for recipe responses; rating may be None (no feedback yet)."""
+    if rating is None or not rating.Rating_Count:
+        return {"count": 0, "average": None, "histogram": {str(r): 0 for r in STARS}}
+    return {
+        "count": rating.Rating_Count,
+        "average": round(rating.Rating_Sum / rating.Rating_Count, 2),
+        "histogram": {str(r): getattr(rating, f'Stars_{r}') for r in STARS},
+    }
@@ -0,0 +1,222 @@
+"""
+Bulk recipe import.
+
+POST /api/recipes/import takes recipes with their ingredient lines, as JSON (a
+list, or {"recipes": [...]}) or as NDJSON (Content-Type application/x-ndjson,
+one recipe per line, read as it streams in):
+
+    {"Recipe_Name": "Dal", "Cuisine_Type": "Indian", "Serving_Size": 4, ...,
+     "ingredients": [{"Ingredient_Name": "Red lentils", "Quantity": 200, "Unit": "g"},
+                     {"Ingredient_ID": 12, "Quantity": 1, "Unit": "tsp"}]}
+
+Ingredient names are matched, ignoring case and spacing, against an index of
+every ingredient loaded in one query up front, so resolving a line is a dict
+lookup. A recipe with lines that do not resolve is left out and reported
+(with partial=True it is imported without them), as is one that fails
+validation. The rest are written RECIPE_IMPORT_CHUNK_SIZE per transaction:
+a multi-row INSERT for the recipes, one for their ingredient lines and one
+for their Recipe_Log entries. A chunk that fails is rolled back and reported
+recipe by recipe; earlier chunks stay imported.
+
+MySQL has no INSERT ... RETURNING, so there a chunk's recipes are inserted one
+statement each to learn their ids; the ingredient lines and log entries are
+still multi-row. With shards, each chunk's commit copies its new Recipe and
+Recipe_Ingredient rows to the replicas (see sharding.py).
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from sqlalchemy import insert, select
+
+from .extensions import db
+from .models import Ingredient, Recipe, Recipe_Ingredient, Recipe_Log
+
+DIFFICULTY_LEVELS = ('Easy', 'Medium', 'Hard')
+
+
+def ingredient_key(name):
+    return re.sub(r'\s+', ' ', str(name)).strip().casefold()
+
+
+def ingredient_index():
+    """({normalised name: Ingredient_ID}, {Ingredient_ID: Tag_Mask}) for every ingredient, in one query."""
+    by_name, masks = {}, {}
+    for ingredient_id, name, mask in db.session.execute(
+        select(Ingredient.Ingredient_ID, Ingredient.Ingredient_Name, Ingredient.Tag_Mask)
+    ):
+        by_name[ingredient_key(name)] = ingredient_id
+        masks[ingredient_id] = mask or 0
+    return by_name, masks
+
+
+def _integer(value, name):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+        raise ValueError(f"{name} must be a whole number of minutes.")
+    return int(value)
+
+
+def _decimal(value, name):
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number.")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError(f"{name} must be greater than zero.")
+    return amount
+
+
+def resolve_recipe(item, index, partial=False):
+    """
+    The Recipe row, ingredient lines ({Ingredient_ID: (Quantity, Unit)}) and
+    unresolved lines ([(line number, name)]) for one imported recipe. Raises
+    ValueError when the recipe is invalid. Unresolved lines are dropped with
+    partial=True; otherwise the caller skips the recipe.
+    """
+    by_name, masks = index
+    if not isinstance(item, dict):
+        raise ValueError("A recipe must be a JSON object.")
+    name = item.get('Recipe_Name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Recipe_Name is required.")
+    if len(name) > 200:
+        raise ValueError("Recipe_Name is longer than 200 characters.")
+    difficulty = item.get('Difficulty_Level')
+    if difficulty is not None and difficulty not in DIFFICULTY_LEVELS:
+        raise ValueError(f"Difficulty_Level must be one of {', '.join(DIFFICULTY_LEVELS)}.")
+    row = {
+        'Recipe_Name': name,
+        'Description': item.get('Description'),
+        'Cuisine_Type': item.get('Cuisine_Type'),
+        'Preparation_Time_minutes': _integer(item.get('Preparation_Time_minutes'), 'Preparation_Time_minutes'),
+        'Cooking_Time_minutes': _integer(item.get('Cooking_Time_minutes'), 'Cooking_Time_minutes'),
+        'Serving_Size': _decimal(item.get('Serving_Size', 1), 'Serving_Size'),
+        'Difficulty_Level': difficulty,
+        'Instructions': item.get('Instructions'),
+        'Tag_Mask': 0,
+    }
+
+    lines = item.get('ingredients') or []
+    if not isinstance(lines, list):
+        raise ValueError("ingredients must be a list.")
+    resolved, unresolved = {}, []
+    for number, line in enumerate(lines, 1):
+        if not isinstance(line, dict):
+            raise ValueError(f"Ingredient line {number} must be a JSON object.")
+        if line.get('Ingredient_ID') is not None:
+            label = line['Ingredient_ID']
+            if isinstance(label, bool) or not isinstance(label, int):
+                raise ValueError(f"Ingredient line {number}: Ingredient_ID must be an integer.")
+            ingredient_id = label if label in masks else None
+        else:
+            label = line.get('Ingredient_Name')
+            if not label:
+                raise ValueError(f"Ingredient line {number} needs an Ingredient_Name or Ingredient_ID.")
+            if not isinstance(label, str):
+                raise ValueError(f"Ingredient line {number}: Ingredient_Name must be a string.")
+            ingredient_id = by_name.get(ingredient_key(label))
+        unit = line.get('Unit')
+        if not isinstance(unit, str) or not unit.strip():
+            raise ValueError(f"Ingredient line {number} needs a Unit.")
+        if len(unit) > 50:
+            raise ValueError(f"Ingredient line {number}: Unit is longer than 50 characters.")
+        quantity = _decimal(line.get('Quantity'), f"Ingredient line {number}: Quantity")
+        if ingredient_id is None:
+            unresolved.append((number, label))
+            continue
+        if ingredient_id in resolved:
+            # One row per ingredient (Recipe_ID, Ingredient_ID is unique), so repeats are added up
+            total, first_unit = resolved[ingredient_id]
+            if first_unit.strip().lower() != unit.strip().lower():
+                raise ValueError(f"Ingredient line {number} repeats an ingredient in a different unit.")
+            quantity += total
+        resolved[ingredient_id] = (quantity, unit)
+        row['Tag_Mask'] |= masks[ingredient_id]
+    if unresolved and not partial:
+        return row, {}, unresolved
+    return row, resolved, unresolved
+
+
+def _insert_recipes(rows):
+    """Inserts the rows with one multi-row INSERT where the database can return the ids; returns them in order."""
+    if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        return db.session.scalars(insert(Recipe).returning(Recipe.Recipe_ID, sort_by_parameter_order=True), rows).all()
+    return [db.session.execute(insert(Recipe).values(**row)).inserted_primary_key[0] for row in rows]
+
+
+def _write_chunk(chunk, creator_id):
+    """Writes [(position, row, lines)] in one transaction. Returns the new Recipe_IDs and the line count."""
+    rows = [{**row, 'Creator_User_ID': creator_id} for _, row, _ in chunk]
+    recipe_ids = _insert_recipes(rows)
+    ingredient_rows = [
+        {'Recipe_ID': recipe_id, 'Ingredient_ID': ingredient_id, 'Quantity': quantity, 'Unit': unit}
+        for recipe_id, (_, _, lines) in zip(recipe_ids, chunk)
+        for ingredient_id, (quantity, unit) in lines.items()
+    ]
+    if ingredient_rows:
+        db.session.execute(insert(Recipe_Ingredient), ingredient_rows)
+    # Databases that log new recipes with a trigger have already written these
+    logged = set(db.session.scalars(select(Recipe_Log.Recipe_ID).where(Recipe_Log.Recipe_ID.in_(recipe_ids))))
+    log_rows = [
+        {'Recipe_ID': recipe_id, 'Recipe_Name': row['Recipe_Name'], 'Created_By': creator_id}
+        for recipe_id, row in zip(recipe_ids, rows) if recipe_id not in logged
+    ]
+    if log_rows:
+        db.session.execute(insert(Recipe_Log), log_rows)
+    db.session.commit()
+    return recipe_ids, len(ingredient_rows)
+
+
+def import_recipes(items, creator_id, partial=False, dry_run=False, chunk_size=None):
+    """
+    Imports (position, recipe) pairs for creator_id; a recipe may be a
+    ValueError the reader raised for that position. With dry_run=True nothing
+    is written. Returns the import report.
+    """
+    chunk_size = chunk_size or current_app.config['RECIPE_IMPORT_CHUNK_SIZE']
+    index = ingredient_index()
+    report = {'imported': 0, 'ingredient_lines': 0, 'recipe_ids': [], 'unresolved': [], 'errors': []}
+    chunk = []
+
+    def flush():
+        if dry_run:
+            report['imported'] += len(chunk)
+            report['ingredient_lines'] += sum(len(lines) for _, _, lines in chunk)
+        else:
+            try:
+                recipe_ids, line_count = _write_chunk(chunk, creator_id)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning("Recipe import chunk failed: %s", e)
+                report['errors'].extend({'position': position, 'Recipe_Name': row['Recipe_Name'],
+                                         'error': "Could not be saved with the rest of its chunk."}
+                                        for position, row, _ in chunk)
+            else:
+                report['imported'] += len(recipe_ids)
+                report['ingredient_lines'] += line_count
+                report['recipe_ids'].extend(recipe_ids)
+        chunk.clear()
+
+    for position, item in items:
+        try:
+            if isinstance(item, ValueError):
+                raise item
+            row, lines, unresolved = resolve_recipe(item, index, partial)
+        except ValueError as e:
+            report['errors'].append({'position': position, 'error': str(e)})
+            continue
+        report['unresolved'].extend({'position': position, 'Recipe_Name': row['Recipe_Name'], 'line': number,
+                                     'ingredient': label} for number, label in unresolved)
+        if unresolved and not partial:
+            report['errors'].append({'position': position, 'Recipe_Name': row['Recipe_Name'],
+                                     'error': "Some ingredients were not found; see unresolved."})
+            continue
+        chunk.append((position, row, lines))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    report['skipped'] = len(report['errors'])
+    return report
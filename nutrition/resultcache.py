@@ -0,0 +1,378 @@
+"""
+Per-user result cache for read routes.
+
+A read route opts in with @cached_result('<name>') under @jwt_required(). The
+response body is cached under (route, user, query string, user version,
+catalog version). Versions are counters kept in the cache backend:
+
+  * the user's version changes whenever a write touches rows the user's
+    cached reads depend on (their logs, plans, recipes, ratings of their
+    recipes, their account);
+  * the catalog version changes when shared data changes (ingredients,
+    nutrition, recipe contents, rating rebuilds), since any user's logs may
+    point at it.
+
+Invalidation is a single increment, and old entries are never read again
+(they age out by TTL or LRU). Write paths call invalidate_user_results(),
+invalidate_recipe_owner_results() or invalidate_catalog_results(). The
+version is incremented at once, and again after the commit when a
+transaction is open: a reader that cached pre-commit data under the first
+new version is then left behind too.
+
+Admins bypass the cache: their reads span every user.
+
+Backends (RESULT_CACHE_BACKEND):
+
+  * 'memory': an LRU in this process, bounded by entries and bytes, with a
+    TTL. Versions are per process too, so use it with a single process; with
+    several workers a write in one is invisible to the others until the TTL.
+  * 'redis': any server speaking the Redis protocol (Redis, Valkey, KeyDB,
+    Dragonfly) at RESULT_CACHE_REDIS_URL, shared by every worker. Entries get
+    the TTL, version keys don't: run the server with a volatile-* eviction
+    policy so versions are never evicted. Cache errors count as misses and
+    never fail a request; a lost increment leaves entries stale until the TTL.
+"""
+import datetime
+import hashlib
+import socket
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlparse, unquote
+
+from flask import current_app, has_app_context, request, Response
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event, select
+
+from .sharding import ShardedSession
+
+CATALOG = 'catalog'
+_stats_lock = threading.Lock()
+_cache_lock = threading.Lock()
+result_cache_stats = {} # route -> counters
+
+
+def _count(route, key, amount=1):
+    with _stats_lock:
+        counters = result_cache_stats.setdefault(route, {'hits': 0, 'misses': 0, 'stores': 0, 'bypassed': 0, 'errors': 0})
+        counters[key] += amount
+
+
+def result_cache_snapshot():
+    """Counters per route plus hit rates, for this process."""
+    with _stats_lock:
+        routes = {route: dict(counters) for route, counters in result_cache_stats.items()}
+    for counters in routes.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else None
+    hits = sum(c['hits'] for c in routes.values())
+    lookups = hits + sum(c['misses'] for c in routes.values())
+    return {'hit_rate': round(hits / lookups, 4) if lookups else None, 'routes': routes}
+
+
+class MemoryResultCache:
+    """LRU of (expires_at, body) bounded by max_entries and max_bytes, plus version counters."""
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._bytes = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def versions(self, *names):
+        with self._lock:
+            return [self._versions.get(name, 0) for name in names]
+
+    def bump(self, names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def info(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+
+class RedisProtocolError(Exception):
+    pass
+
+
+class RedisResultCache:
+    """
+    The same operations over the Redis protocol (RESP). One connection per
+    thread, opened on first use and reopened after an error.
+    """
+
+    def __init__(self, url, ttl, timeout, prefix='nutrition:rc:'):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.database = int(parsed.path.lstrip('/') or 0)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.prefix = prefix
+        self._local = threading.local()
+
+    # --- RESP ---
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._call('AUTH', *([self.username] if self.username else []), self.password)
+        if self.database:
+            self._call('SELECT', self.database)
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                self._local.reader.close()
+                sock.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _encode(args):
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(out)
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError("Connection closed by the cache server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest
+        if kind == b'-':
+            raise RedisProtocolError(rest.decode(errors='replace'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RedisProtocolError(f"Unexpected reply {line[:20]!r}")
+
+    def _call(self, *args):
+        return self._pipeline([args])[0]
+
+    def _pipeline(self, commands):
+        """Sends several commands in one round trip; returns their replies."""
+        if getattr(self._local, 'sock', None) is None:
+            self._connect()
+        try:
+            self._local.sock.sendall(b''.join(self._encode(args) for args in commands))
+            return [self._read_reply() for _ in commands]
+        except (OSError, ConnectionError, ValueError):
+            self._close()
+            raise
+
+    # --- Cache operations ---
+
+    def versions(self, *names):
+        values = self._call('MGET', *[f'{self.prefix}v:{name}' for name in names])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, names):
+        self._pipeline([('INCR', f'{self.prefix}v:{name}') for name in names])
+
+    def get(self, key):
+        return self._call('GET', f'{self.prefix}{key}')
+
+    def set(self, key, value):
+        self._call('SET', f'{self.prefix}{key}', value, 'PX', int(self.ttl * 1000))
+
+    def info(self):
+        return {'backend': 'redis', 'host': self.host, 'port': self.port, 'db': self.database}
+
+
+def get_result_cache(app=None):
+    """The app's cache backend, or None when RESULT_CACHE_BACKEND is 'off'."""
+    app = app or current_app
+    config = app.config
+    backend = config.get('RESULT_CACHE_BACKEND', 'off')
+    if backend == 'off':
+        return None
+    cache = app.extensions.get('result_cache')
+    if cache is not None:
+        return cache
+    with _cache_lock:
+        if 'result_cache' not in app.extensions:
+            ttl = config['RESULT_CACHE_TTL_SECONDS']
+            if backend == 'redis':
+                cache = RedisResultCache(config['RESULT_CACHE_REDIS_URL'], ttl, config['RESULT_CACHE_REDIS_TIMEOUT'])
+            elif backend == 'memory':
+                cache = MemoryResultCache(config['RESULT_CACHE_MAX_ENTRIES'], config['RESULT_CACHE_MAX_BYTES'], ttl)
+            else:
+                raise ValueError(f"RESULT_CACHE_BACKEND must be 'off', 'memory' or 'redis', not {backend!r}")
+            app.extensions['result_cache'] = cache
+        return app.extensions['result_cache']
+
+
+def _user_version_name(user_id):
+    return f'user:{user_id}'
+
+
+# --- Read side ---
+
+def _pack(response):
+    return response.mimetype.encode() + b'\n' + response.get_data()
+
+
+def _unpack(value):
+    mimetype, _, body = value.partition(b'\n')
+    return mimetype.decode(), body
+
+
+def cached_result(route):
+    """Caches the view's 200 responses per user; place it under @jwt_required()."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_result_cache()
+            if cache is None:
+                return view(*args, **kwargs)
+            if get_jwt().get("role") == 'admin':
+                _count(route, 'bypassed')
+                return view(*args, **kwargs)
+
+            user_id = get_jwt_identity()
+            # Today's date is part of the key: windows like "the last 7 days" end today
+            params = hashlib.blake2b(
+                f"{sorted(kwargs.items())}|{sorted(request.args.items(multi=True))}|{datetime.date.today()}".encode(),
+                digest_size=12,
+            ).hexdigest()
+            try:
+                user_version, catalog_version = cache.versions(_user_version_name(user_id), CATALOG)
+                key = f'{route}:{user_id}:{user_version}.{catalog_version}:{params}'
+                value = cache.get(key)
+            except Exception as e:
+                current_app.logger.warning("Result cache read failed: %s", e)
+                _count(route, 'errors')
+                return view(*args, **kwargs)
+
+            if value is not None:
+                _count(route, 'hits')
+                mimetype, body = _unpack(value)
+                response = Response(body, status=200, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            _count(route, 'misses')
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                try:
+                    cache.set(key, _pack(response))
+                    _count(route, 'stores')
+                except Exception as e:
+                    current_app.logger.warning("Result cache write failed: %s", e)
+                    _count(route, 'errors')
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+# --- Invalidation ---
+
+def _bump(names):
+    try:
+        get_result_cache().bump(names)
+    except Exception as e:
+        current_app.logger.warning("Result cache invalidation failed: %s", e)
+        _count('invalidation', 'errors')
+
+
+def _invalidate(names):
+    from .extensions import db
+    if not has_app_context() or get_result_cache() is None:
+        return
+    names = {name for name in names if name}
+    if not names:
+        return
+    _bump(names) # Covers writes already committed
+    session = db.session()
+    if session.in_transaction():
+        session.info.setdefault('result_cache_pending', set()).update(names) # And writes about to be
+
+
+def invalidate_user_results(*user_ids):
+    """Call when a write changes rows the users' cached reads depend on."""
+    _invalidate(_user_version_name(user_id) for user_id in user_ids if user_id is not None)
+
+
+def invalidate_catalog_results():
+    """Call when shared data (ingredients, nutrition, recipe contents) changes."""
+    _invalidate([CATALOG])
+
+
+def invalidate_recipe_owner_results(recipe_id):
+    """A recipe's ratings changed: its creator's recipe lists are stale."""
+    from .extensions import db
+    from .models import Recipe
+    if not has_app_context() or get_result_cache() is None:
+        return
+    invalidate_user_results(db.session.scalar(select(Recipe.Creator_User_ID).where(Recipe.Recipe_ID == recipe_id)))
+
+
+@event.listens_for(ShardedSession, 'after_commit')
+def _apply_pending_invalidations(session):
+    names = session.info.pop('result_cache_pending', None)
+    if names:
+        _bump(names)
+
+
+@event.listens_for(ShardedSession, 'after_rollback')
+def _discard_pending_invalidations(session):
+    session.info.pop('result_cache_pending', None)
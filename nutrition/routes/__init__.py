@@ -0,0 +1,7 @@
+"""One blueprint per domain. Paths are spelled out in full (/api/...) in each module."""
+
+
+def register_blueprints(app):
+    from . import auth, users, admin, recipes, ingredients, mealplans, dietlogs, feedback, jobs, events, analytics, sync
+    for module in (auth, users, admin, recipes, ingredients, mealplans, dietlogs, feedback, jobs, events, analytics, sync):
+        app.register_blueprint(module.bp)
@@ -0,0 +1,334 @@
+from collections import Counter
+from decimal import Decimal
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import text, select, func
+
+from ..admission import admission_controlled, admission_snapshot
+from ..compression import compression_stats, _compress_cache, _compress_lock, brotli_module
+from ..decorators import admin_required
+from ..diettags import rebuild_recipe_tags, update_restrictions
+from ..extensions import db, bcrypt
+from ..jobs import job_handler, wants_background, enqueue_job, job_accepted_response
+from ..lognutrition import backfill_log_nutrition
+from ..models import Recipe, User, User_Diet_Log
+from ..ratings import rebuild_recipe_ratings
+from ..resultcache import get_result_cache, invalidate_user_results, result_cache_snapshot
+from ..sharding import ALL_ROWS, add_page_headers, copy_catalog, page_args, scatter_all, scatter_count, scatter_gather, sharding_enabled, use_shard, users_by_shard
+from ..singleflight import coalesced, coalescing_snapshot
+from ..sync import prune_tombstones
+from .users import delete_user_accounts, update_user_email
+
+bp = Blueprint('admin', __name__)
+
+# --- NEW: Admin-only User Management Routes ---
+@bp.route('/api/admin/users', methods=['GET'])
+@admin_required()
+@admission_controlled('admin')
+def get_all_users():
+    # Every shard is queried and the results merged by User_ID. ?page=&per_page= pages the merged list.
+    page, per_page = page_args(request.args)
+    offset = (page - 1) * per_page if per_page else 0
+    rows = scatter_gather(select(User).order_by(User.User_ID), sort_key=lambda row: row[0].User_ID,
+                          offset=offset, limit=per_page)
+    response = jsonify([user.to_dict(exclude=['Password']) for (user,) in rows])
+    if per_page:
+        add_page_headers(response, page, per_page, scatter_count(select(func.count()).select_from(User)))
+    return response
+
+@bp.route('/api/admin/users/<int:user_id>', methods=['GET'])
+@admin_required()
+def admin_get_user(user_id):
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(user.to_dict(exclude=['Password']))
+
+@bp.route('/api/admin/users/<int:user_id>', methods=['PUT'])
+@admin_required()
+def admin_update_user(user_id):
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    
+    data = request.json
+    error = update_user_email(user, data.get('Email'))
+    if error:
+        return error
+    user.Name = data.get('Name', user.Name)
+    user.Date_Of_Birth = data.get('Date_Of_Birth', user.Date_Of_Birth)
+    user.Gender = data.get('Gender', user.Gender)
+    user.Height_cm = data.get('Height_cm', user.Height_cm)
+    user.Weight_kg = data.get('Weight_kg', user.Weight_kg)
+    user.Activity_Level = data.get('Activity_Level', user.Activity_Level)
+    user.Dietary_Preferences = data.get('Dietary_Preferences', user.Dietary_Preferences)
+    user.Allergies = data.get('Allergies', user.Allergies)
+    user.role = data.get('role', user.role) # <-- Admin can change role
+    update_restrictions(user)
+    
+    db.session.commit()
+    invalidate_user_results(user_id) # Recipe lists filtered by their restrictions
+    return jsonify(user.to_dict(exclude=['Password']))
+
+@bp.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
+@admin_required()
+def admin_delete_user(user_id):
+    # Prevent admin from deleting themselves
+    current_admin_id = get_jwt_identity()
+    if current_admin_id == user_id:
+        return jsonify({"error": "Admin cannot delete their own account."}), 403
+
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    
+    if wants_background():
+        job = enqueue_job('delete_user', {"user_id": user_id}, created_by=current_admin_id)
+        return job_accepted_response(job, "User deletion queued")
+    
+    try:
+        delete_user_accounts([user_id])
+        return jsonify({"message": "User deleted successfully"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to delete user. Database error: {str(e)}"}), 500
+
+# --- NEW: Admin Bulk User Operations ---
+@bp.route('/api/admin/users/bulk', methods=['POST'])
+@admin_required()
+def admin_bulk_users():
+    """Deletes or changes the role of many users in one request."""
+    current_admin_id = get_jwt_identity()
+    data = request.json or {}
+    action = data.get('action')
+    user_ids = data.get('user_ids')
+    
+    if not isinstance(user_ids, list) or not user_ids:
+        return jsonify({"error": "user_ids must be a non-empty list"}), 400
+    try:
+        user_ids = sorted({int(uid) for uid in user_ids})
+    except (TypeError, ValueError):
+        return jsonify({"error": "user_ids must be integers"}), 400
+    
+    if action == 'delete':
+        if current_admin_id in user_ids:
+            return jsonify({"error": "Admin cannot delete their own account."}), 403
+        
+        if wants_background():
+            job = enqueue_job('delete_users', {"user_ids": user_ids}, created_by=current_admin_id)
+            return job_accepted_response(job, f"Deletion of {len(user_ids)} users queued")
+        
+        try:
+            deleted = delete_user_accounts(user_ids)
+            return jsonify({"action": action, "requested": len(user_ids), "deleted": deleted}), 200
+        except Exception as e:
+            return jsonify({"error": f"Failed to delete users. Database error: {str(e)}"}), 500
+    
+    if action == 'set_role':
+        role = data.get('role')
+        if role not in ('user', 'admin'):
+            return jsonify({"error": "role must be 'user' or 'admin'"}), 400
+        
+        groups = users_by_shard(user_ids) if sharding_enabled() else {None: user_ids}
+        updated = 0
+        for shard, ids in groups.items():
+            with use_shard(shard):
+                updated += User.query.filter(User.User_ID.in_(ids))\
+                    .update({'role': role}, synchronize_session=False)
+                db.session.commit()
+        return jsonify({"action": action, "requested": len(user_ids), "updated": updated, "role": role}), 200
+    
+    return jsonify({"error": "action must be 'delete' or 'set_role'"}), 400
+
+# --- NEW: Admin Password Reset Route ---
+@bp.route('/api/admin/users/<int:user_id>/reset-password', methods=['POST'])
+@admin_required()
+def admin_reset_password(user_id):
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+        
+    data = request.json
+    new_password = data.get('new_password')
+    if not new_password:
+        return jsonify({"error": "New password is required"}), 400
+        
+    # Hash the new password and save it
+    user.Password = bcrypt.generate_password_hash(new_password).decode('utf-8')
+    db.session.commit()
+    
+    return jsonify({"message": f"Password for {user.Email} has been reset."})
+
+# --- NEW: Admin Analytics Route ---
+# Counted from the catalog, which every shard has a copy of; other counts add up over the shards
+CATALOG_STATISTICS = ('total_recipes', 'total_ingredients')
+
+def _statistic_number(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit(): # Counts sharing a column with names come back as text
+        return int(value)
+    return None
+
+def merged_admin_statistics():
+    """GetAdminStatistics on every shard, merged: user-owned counts added up, the most logged recipe over all shards."""
+    stats = {}
+    for rows in scatter_all(text("CALL GetAdminStatistics()")):
+        for metric, value in rows:
+            metric = str(metric)
+            number = _statistic_number(value)
+            if metric not in stats:
+                stats[metric] = value if number is None else number
+            elif number is not None and metric not in CATALOG_STATISTICS:
+                stats[metric] += number
+    logs_per_recipe = Counter()
+    for rows in scatter_all(select(User_Diet_Log.Recipe_ID, func.count())
+                            .where(User_Diet_Log.Recipe_ID.is_not(None)).group_by(User_Diet_Log.Recipe_ID)):
+        logs_per_recipe.update(dict(rows))
+    stats.pop('most_popular_recipe', None)
+    if logs_per_recipe:
+        recipe_id = logs_per_recipe.most_common(1)[0][0]
+        stats['most_popular_recipe'] = db.session.scalar(select(Recipe.Recipe_Name).where(Recipe.Recipe_ID == recipe_id))
+    return stats
+
+@bp.route('/api/admin/statistics', methods=['GET'])
+@admin_required()
+@coalesced('admin_statistics', scope='role')
+@admission_controlled('admin')
+def get_admin_statistics():
+    try:
+        if sharding_enabled():
+            stats = merged_admin_statistics()
+        else:
+            # Call the new procedure
+            result_proxy = db.session.execute(text("CALL GetAdminStatistics()"))
+
+            stats = {}
+            for row in result_proxy:
+                # Manually convert keys/values
+                metric = str(row[0])
+                value = row[1]
+                stats[metric] = value
+            
+        # Handle case where there are no logged recipes yet
+        if 'most_popular_recipe' not in stats:
+            stats['most_popular_recipe'] = 'N/A'
+
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+# --- NEW: Response compression stats (payload size before vs. after) ---
+@bp.route('/api/admin/compression-stats', methods=['GET'])
+@admin_required()
+def get_compression_stats():
+    with _compress_lock:
+        stats = dict(compression_stats)
+    stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 4) if stats['bytes_in'] else None
+    stats['cached_bodies'] = len(_compress_cache)
+    stats['brotli_available'] = brotli_module() is not None
+    return jsonify(stats)
+
+# --- NEW: Recompute every recipe's rating aggregates from Feedback ---
+@bp.route('/api/admin/recipe-ratings/rebuild', methods=['POST'])
+@admin_required()
+def admin_rebuild_recipe_ratings():
+    if wants_background():
+        job = enqueue_job('rebuild_recipe_ratings', {}, created_by=get_jwt_identity())
+        return job_accepted_response(job, "Rating rebuild queued")
+    try:
+        return jsonify({"message": "Recipe ratings rebuilt", "recipes": rebuild_recipe_ratings()})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+# --- NEW: Recompute every recipe's allergen/diet Tag_Mask from its ingredients ---
+@bp.route('/api/admin/recipe-tags/rebuild', methods=['POST'])
+@admin_required()
+def admin_rebuild_recipe_tags():
+    if wants_background():
+        job = enqueue_job('rebuild_recipe_tags', {}, created_by=get_jwt_identity())
+        return job_accepted_response(job, "Recipe tag rebuild queued")
+    try:
+        return jsonify({"message": "Recipe tags rebuilt", "recipes": rebuild_recipe_tags()})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+# --- NEW: Drop delta sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS ---
+@bp.route('/api/admin/sync/tombstones/prune', methods=['POST'])
+@admin_required()
+def admin_prune_sync_tombstones():
+    if wants_background():
+        job = enqueue_job('prune_sync_tombstones', {}, created_by=get_jwt_identity())
+        return job_accepted_response(job, "Tombstone pruning queued")
+    try:
+        return jsonify({"message": "Tombstones pruned", "deleted": prune_tombstones()})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+# --- NEW: Fill in (or, with ?recompute=1, recompute) diet log nutrition snapshots in batches ---
+@bp.route('/api/admin/dietlogs/nutrition/backfill', methods=['POST'])
+@admin_required()
+def admin_backfill_log_nutrition():
+    recompute = request.args.get('recompute', '').lower() in ('1', 'true', 'yes')
+    batch_size = request.args.get('batch_size', type=int)
+    if wants_background():
+        job = enqueue_job('backfill_log_nutrition', {"recompute": recompute, "batch_size": batch_size},
+                          created_by=get_jwt_identity())
+        return job_accepted_response(job, "Diet log nutrition backfill queued")
+    try:
+        return jsonify({"message": "Diet log nutrition backfilled", "logs": backfill_log_nutrition(recompute, batch_size)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+# --- NEW: Admission control stats (requests admitted vs. shed, this process) ---
+@bp.route('/api/admin/admission-stats', methods=['GET'])
+@admin_required()
+def get_admission_stats():
+    return jsonify(admission_snapshot(current_app))
+
+# --- NEW: Result cache hit rates (this process) ---
+@bp.route('/api/admin/result-cache-stats', methods=['GET'])
+@admin_required()
+def get_result_cache_stats():
+    stats = result_cache_snapshot()
+    cache = get_result_cache()
+    stats['backend'] = cache.info() if cache else {'backend': 'off'}
+    return jsonify(stats)
+
+# --- NEW: Request coalescing counters (this process) ---
+@bp.route('/api/admin/coalescing-stats', methods=['GET'])
+@admin_required()
+def get_coalescing_stats():
+    return jsonify(coalescing_snapshot())
+
+@job_handler('rebuild_recipe_ratings')
+def rebuild_recipe_ratings_job(payload):
+    return {"recipes": rebuild_recipe_ratings()}
+
+@job_handler('rebuild_recipe_tags')
+def rebuild_recipe_tags_job(payload):
+    return {"recipes": rebuild_recipe_tags()}
+
+@job_handler('backfill_log_nutrition')
+def backfill_log_nutrition_job(payload):
+    # Committed batches stay written: without recompute, a retry carries on where this run stopped
+    return {"logs": backfill_log_nutrition(payload.get('recompute', False), payload.get('batch_size'))}
+
+@job_handler('delete_users')
+def delete_users_job(payload):
+    return {"deleted": delete_user_accounts(payload['user_ids'])}
+
+@job_handler('prune_sync_tombstones')
+def prune_sync_tombstones_job(payload):
+    return {"deleted": prune_tombstones()}
+
+@job_handler('copy_catalog')
+def copy_catalog_job(payload):
+    # Queued after a bulk catalog write whose rows could not be told (see sharding.py)
+    copy_catalog({name: ALL_ROWS for name in payload['tables']})
+    return {"tables": payload['tables']}
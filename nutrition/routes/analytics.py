@@ -0,0 +1,114 @@
+import datetime
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+
+from ..admission import admission_controlled
+from ..analytics import (
+    build_snapshot, current_snapshot, numpy_module, to_day,
+    calorie_distribution, macro_trends, cuisine_popularity,
+)
+from ..decorators import admin_required
+from ..jobs import job_handler, wants_background, enqueue_job, job_accepted_response
+
+bp = Blueprint('analytics', __name__)
+
+# --- NEW: Population analytics from the columnar snapshot (see analytics.py) ---
+# These routes never query the database; POST /api/admin/analytics/snapshot (or
+# `python analytics_snapshot.py`) refreshes what they read.
+
+def _snapshot_or_error():
+    if numpy_module() is None:
+        return None, (jsonify({"error": "Analytics snapshots need numpy, which is not installed"}), 503)
+    snapshot = current_snapshot(current_app)
+    if snapshot is None:
+        return None, (jsonify({"error": "No analytics snapshot yet. POST /api/admin/analytics/snapshot to build one."}), 404)
+    return snapshot, None
+
+def _day_range():
+    """(start_day, end_day) from ?from=&to= (YYYY-MM-DD, both optional). Raises ValueError."""
+    days = []
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        days.append(to_day(datetime.datetime.strptime(value, '%Y-%m-%d').date()) if value else None)
+    return tuple(days)
+
+def _analytics_response(snapshot, results):
+    return jsonify({"snapshot": snapshot.info(), "from": request.args.get('from'), "to": request.args.get('to'),
+                    "results": results})
+
+@bp.route('/api/admin/analytics/snapshot', methods=['GET'])
+@admin_required()
+def get_analytics_snapshot():
+    snapshot, error = _snapshot_or_error()
+    if error:
+        return error
+    info = snapshot.info()
+    info['partitions'] = [{"name": p['name'], "rows": p['rows']} for p in snapshot.manifest['partitions']]
+    return jsonify(info)
+
+@bp.route('/api/admin/analytics/snapshot', methods=['POST'])
+@admin_required()
+@admission_controlled('admin')
+def refresh_analytics_snapshot():
+    if numpy_module() is None:
+        return jsonify({"error": "Analytics snapshots need numpy, which is not installed"}), 503
+    if wants_background():
+        job = enqueue_job('build_analytics_snapshot', {}, created_by=get_jwt_identity())
+        return job_accepted_response(job, "Analytics snapshot build queued")
+    try:
+        build_snapshot()
+    except Exception as e:
+        return jsonify({"error": f"Snapshot build failed: {str(e)}"}), 500
+    return jsonify(current_snapshot(current_app).info()), 201
+
+@job_handler('build_analytics_snapshot')
+def build_analytics_snapshot_job(payload):
+    manifest = build_snapshot()
+    return {"snapshot_id": manifest['snapshot_id'], "rows": manifest['rows']}
+
+@bp.route('/api/admin/analytics/calorie-distribution', methods=['GET'])
+@admin_required()
+def get_calorie_distribution():
+    """Daily calories per user-day by Activity_Level: ?from=&to=&bin_width=250&include_planned=0"""
+    snapshot, error = _snapshot_or_error()
+    if error:
+        return error
+    try:
+        start_day, end_day = _day_range()
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+    bin_width = max(10, request.args.get('bin_width', 250, type=int))
+    finished_only = request.args.get('include_planned', '0') != '1'
+    return _analytics_response(snapshot, calorie_distribution(snapshot, start_day, end_day, bin_width, finished_only))
+
+@bp.route('/api/admin/analytics/macro-trends', methods=['GET'])
+@admin_required()
+def get_macro_trends():
+    """Average daily nutrients and macro energy split per period: ?from=&to=&bucket=day|week|month"""
+    snapshot, error = _snapshot_or_error()
+    if error:
+        return error
+    try:
+        start_day, end_day = _day_range()
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+    bucket = request.args.get('bucket', 'week')
+    if bucket not in ('day', 'week', 'month'):
+        return jsonify({"error": "bucket must be day, week or month"}), 400
+    finished_only = request.args.get('include_planned', '0') != '1'
+    return _analytics_response(snapshot, macro_trends(snapshot, start_day, end_day, bucket, finished_only))
+
+@bp.route('/api/admin/analytics/cuisine-popularity', methods=['GET'])
+@admin_required()
+def get_cuisine_popularity():
+    """Logs, distinct users and calories per cuisine: ?from=&to=&finished_only=0"""
+    snapshot, error = _snapshot_or_error()
+    if error:
+        return error
+    try:
+        start_day, end_day = _day_range()
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+    finished_only = request.args.get('finished_only', '0') == '1'
+    return _analytics_response(snapshot, cuisine_popularity(snapshot, start_day, end_day, finished_only))
@@ -0,0 +1,98 @@
+import datetime
+
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import create_access_token
+from sqlalchemy.exc import IntegrityError
+
+from ..admission import admission_controlled
+from ..diettags import parse_restrictions
+from ..extensions import db, bcrypt
+from ..models import User
+from ..sharding import register_user, shard_for_email, sharding_enabled, unregister_users, use_shard
+
+bp = Blueprint('auth', __name__)
+
+@bp.route('/api/users', methods=['POST'])
+@admission_controlled('auth')
+def create_user():
+    """SIGNUP Route."""
+    data = request.json
+    
+    if sharding_enabled():
+        return _create_sharded_user(data)
+    
+    if User.query.filter_by(Email=data['Email']).first():
+        return jsonify({"error": "Email already exists"}), 409
+
+    new_user = _new_user(data)
+    db.session.add(new_user)
+    db.session.commit()
+    return jsonify(new_user.to_dict(exclude=['Password'])), 201
+
+def _new_user(data, **fields):
+    hashed_password = bcrypt.generate_password_hash(data['Password']).decode('utf-8')
+    return User(
+        **fields,
+        Name=data['Name'],
+        Email=data['Email'],
+        Password=hashed_password,
+        Date_Of_Birth=data.get('Date_Of_Birth'),
+        Gender=data.get('Gender'),
+        Height_cm=data.get('Height_cm'),
+        Weight_kg=data.get('Weight_kg'),
+        Activity_Level=data.get('Activity_Level'),
+        Dietary_Preferences=data.get('Dietary_Preferences'),
+        Allergies=data.get('Allergies'),
+        Restriction_Mask=parse_restrictions(data.get('Allergies'), data.get('Dietary_Preferences'))
+        # 'role' defaults to 'user' automatically
+    )
+
+def _create_sharded_user(data):
+    """Signup with sharding on: the directory allocates the User_ID and shard, then the User row goes there."""
+    try:
+        user_id, shard = register_user(data['Email'])
+    except IntegrityError:
+        return jsonify({"error": "Email already exists"}), 409
+    
+    new_user = _new_user(data, User_ID=user_id)
+    try:
+        with use_shard(shard):
+            db.session.add(new_user)
+            db.session.commit()
+            return jsonify(new_user.to_dict(exclude=['Password'])), 201
+    except Exception:
+        db.session.rollback()
+        unregister_users([user_id])
+        raise
+
+@bp.route('/api/login', methods=['POST'])
+@admission_controlled('auth')
+def login_user():
+    """LOGIN Route."""
+    data = request.json
+    email = data.get('Email')
+    password = data.get('Password')
+    
+    if sharding_enabled():
+        found = shard_for_email(email)
+        if found is None:
+            return jsonify({"error": "Invalid email or password"}), 401
+        with use_shard(found[1]):
+            user = db.session.get(User, found[0])
+    else:
+        user = User.query.filter_by(Email=email).first()
+    
+    if user and bcrypt.check_password_hash(user.Password, password):
+        # --- TOKEN EXPIRY FIX ---
+        expires = datetime.timedelta(days=7)
+        access_token = create_access_token(
+            identity=user.User_ID, 
+            expires_delta=expires,
+            additional_claims={"role": user.role} # Add role to token
+        )
+        # --- END FIX ---
+        
+        # Return role so frontend can save it
+        return jsonify(access_token=access_token, user_id=user.User_ID, role=user.role)
+    
+    return jsonify({"error": "Invalid email or password"}), 401
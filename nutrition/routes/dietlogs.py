@@ -0,0 +1,391 @@
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy import case, func, select, not_, or_
+
+from ..admission import admission_controlled
+from ..events import publish
+from ..extensions import db
+from ..groupcommit import diet_log_write_buffer
+from ..lognutrition import log_nutrition, log_nutrition_for_update, logged_nutrition
+from ..models import Recipe, User_Diet_Log
+from ..ownership import guarded_update, guarded_delete, not_found_or_forbidden
+from ..resultcache import cached_result, invalidate_user_results
+
+bp = Blueprint('dietlogs', __name__)
+
+DIET_LOG_UPDATE_FIELDS = ('Recipe_ID', 'Date', 'Time', 'Portion_Size', 'Notes')
+
+# --- Diet Log Routes ---
+@bp.route('/api/dietlogs', methods=['POST'])
+@jwt_required()
+def add_diet_log():
+    user_id = get_jwt_identity()
+    data = request.json
+    
+    values = dict(
+        User_ID=user_id,
+        Recipe_ID=data.get('Recipe_ID'),
+        Date=data['Date'],
+        Time=data.get('Time'),
+        Portion_Size=data.get('Portion_Size', 1),
+        Notes=data.get('Notes'),
+        is_finished=data.get('is_finished', False)
+    )
+    values.update(log_nutrition(values['Recipe_ID'], values['Portion_Size']))
+    write_buffer = diet_log_write_buffer(current_app)
+    if write_buffer:
+        # Committed together with other concurrent writes; resolves after the commit
+        log_data = write_buffer.insert(values).result()
+    else:
+        new_log = User_Diet_Log(**values)
+        db.session.add(new_log)
+        db.session.commit()
+        log_data = new_log.to_dict()
+    invalidate_user_results(user_id)
+    publish(user_id, 'dietlog.created', log_data)
+    return jsonify(log_data), 201
+
+@bp.route('/api/dietlogs', methods=['GET'])
+@jwt_required()
+@cached_result('diet_logs')
+def get_diet_logs():
+    user_id = get_jwt_identity()
+    
+    date_filter = request.args.get('date')
+    date_obj = None
+    if date_filter:
+        try:
+            date_obj = datetime.datetime.strptime(date_filter, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+    
+    logs = db.session.execute(diet_logs_statement(user_id, date_obj)).all()
+    return jsonify([serialize_diet_log(log, recipe_name) for log, recipe_name in logs])
+
+# Statement builders and serializers below are shared with the async handlers in asgi.py
+def diet_logs_statement(user_id, date_obj=None):
+    stmt = select(User_Diet_Log, Recipe.Recipe_Name)\
+        .outerjoin(Recipe, User_Diet_Log.Recipe_ID == Recipe.Recipe_ID)\
+        .where(User_Diet_Log.User_ID == user_id)
+    if date_obj:
+        stmt = stmt.where(User_Diet_Log.Date == date_obj)
+    return stmt.order_by(User_Diet_Log.Date.desc(), User_Diet_Log.Time.desc())
+
+def serialize_diet_log(log, recipe_name):
+    log_data = log.to_dict()
+    log_data['Recipe_Name'] = recipe_name or 'Unknown Recipe'
+    return log_data
+
+@bp.route('/api/dietlogs/<int:log_id>', methods=['PUT'])
+@jwt_required()
+def update_diet_log(log_id):
+    data = request.json
+    values = {key: data[key] for key in DIET_LOG_UPDATE_FIELDS if key in data}
+    values.update(log_nutrition_for_update(log_id, values))
+    error = guarded_update(User_Diet_Log, User_Diet_Log.Log_ID, log_id, User_Diet_Log.User_ID, values, "Log not found")
+    if error:
+        return error
+    log_data = db.session.get(User_Diet_Log, log_id).to_dict()
+    invalidate_user_results(log_data['User_ID'])
+    publish(log_data['User_ID'], 'dietlog.updated', log_data)
+    return jsonify(log_data)
+
+@bp.route('/api/dietlogs/<int:log_id>', methods=['DELETE'])
+@jwt_required()
+def delete_diet_log(log_id):
+    # Admins may delete anyone's log; the event goes to the owner
+    owner_id = get_jwt_identity()
+    if get_jwt().get("role") == 'admin':
+        owner_id = db.session.scalar(select(User_Diet_Log.User_ID).where(User_Diet_Log.Log_ID == log_id))
+    error = guarded_delete(User_Diet_Log, User_Diet_Log.Log_ID, log_id, User_Diet_Log.User_ID, "Log not found",
+                           synced_owner_id=owner_id)
+    if error:
+        return error
+    invalidate_user_results(owner_id)
+    publish(owner_id, 'dietlog.deleted', {"Log_ID": log_id})
+    return jsonify({"message": "Log deleted"}), 200
+
+@bp.route('/api/dietlogs/<int:log_id>/toggle', methods=['PUT'])
+@jwt_required()
+def toggle_diet_log(log_id):
+    write_buffer = diet_log_write_buffer(current_app)
+    if write_buffer:
+        log_data = write_buffer.toggle(log_id, get_jwt_identity(), get_jwt().get("role") == 'admin').result()
+        if log_data is None:
+            return not_found_or_forbidden(User_Diet_Log.Log_ID, log_id, "Log not found")
+    else:
+        # Flipped in SQL, so concurrent toggles each apply exactly once.
+        error = guarded_update(User_Diet_Log, User_Diet_Log.Log_ID, log_id, User_Diet_Log.User_ID,
+                               {'is_finished': not_(User_Diet_Log.is_finished)}, "Log not found")
+        if error:
+            return error
+        log_data = db.session.get(User_Diet_Log, log_id).to_dict()
+    invalidate_user_results(log_data['User_ID'])
+    publish(log_data['User_ID'], 'dietlog.updated', {"Log_ID": log_id, "is_finished": log_data['is_finished']})
+    return jsonify(log_data)
+
+# --- Nutritional Analysis Route ---
+NUTRIENT_TOTALS = ('total_calories', 'total_protein', 'total_carbs', 'total_fat', 'total_fiber')
+
+SUMMARY_GROUPS = ('day', 'meal', 'recipe')
+SUMMARY_MAX_WINDOWS = 8
+SUMMARY_MAX_DAYS = 3650
+
+# group_by=meal buckets logs by their Time: before 11:00, before 16:00, later, or no time logged
+MEAL_BUCKETS = (('breakfast', datetime.time(11)), ('lunch', datetime.time(16)))
+MEAL_ORDER = ('breakfast', 'lunch', 'dinner', 'unscheduled')
+
+def meal_bucket():
+    return case((User_Diet_Log.Time.is_(None), 'unscheduled'),
+                *[(User_Diet_Log.Time < until, name) for name, until in MEAL_BUCKETS],
+                else_='dinner')
+
+@bp.route('/api/dietlogs/summary', methods=['GET'])
+@jwt_required()
+@cached_result('dietlog_summary') # Hits skip admission control
+@admission_controlled('analytics')
+def get_dietlog_summary():
+    user_id = get_jwt_identity()
+
+    try:
+        options = dietlog_summary_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=options['days'] - 1)
+
+    rows = db.session.execute(dietlog_summary_statement(
+        user_id, start_date, end_date, options['group_by'], options['include_planned'])).all()
+    return jsonify(serialize_dietlog_summary(rows, start_date, end_date, **options))
+
+def dietlog_summary_options(args):
+    """
+    Reads the summary query args:
+      days=N             one window ending today (default 7)
+      windows=1,7,30     several windows ending today, answered from the same query
+      group_by=day|meal|recipe
+      include_planned=1  also total the logs not yet marked finished
+    Raises ValueError with a message for the client.
+    """
+    try:
+        days = max(1, int(args.get('days', 7)))
+    except ValueError:
+        days = 7 # Same as request.args.get(..., type=int) falling back to the default
+    windows = None
+    if 'windows' in args:
+        try:
+            windows = list(dict.fromkeys(max(1, int(w)) for w in args['windows'].split(',') if w.strip()))
+        except ValueError:
+            raise ValueError("windows must be a comma-separated list of day counts, e.g. 1,7,30.")
+        if not windows or len(windows) > SUMMARY_MAX_WINDOWS:
+            raise ValueError(f"windows must list between 1 and {SUMMARY_MAX_WINDOWS} day counts.")
+        days = max(windows)
+    if days > SUMMARY_MAX_DAYS:
+        raise ValueError(f"days and windows must be at most {SUMMARY_MAX_DAYS}.")
+    group_by = args.get('group_by') or None
+    if group_by and group_by not in SUMMARY_GROUPS:
+        raise ValueError(f"group_by must be one of: {', '.join(SUMMARY_GROUPS)}.")
+    include_planned = args.get('include_planned', '').lower() in ('1', 'true', 'yes')
+    return {'days': days, 'windows': windows, 'group_by': group_by, 'include_planned': include_planned}
+
+def dietlog_summary_statement(user_id, start_date, end_date, group_by=None, include_planned=False):
+    """
+    Nutrient totals per (day, finished) over the widest window, also per meal bucket or
+    recipe when grouped. Every window and group total is summed from these rows.
+    """
+    columns = [User_Diet_Log.Date, User_Diet_Log.is_finished]
+    keys = list(columns)
+    if group_by == 'meal':
+        columns.append(meal_bucket().label('meal'))
+        keys.append('meal') # By label, so the CASE is not repeated in GROUP BY
+    elif group_by == 'recipe':
+        columns += [User_Diet_Log.Recipe_ID, Recipe.Recipe_Name]
+        keys += [User_Diet_Log.Recipe_ID, Recipe.Recipe_Name]
+    # The logs carry their own nutrition (nutrition/lognutrition.py); only logs
+    # not backfilled yet, and group_by=recipe for the names, look at the recipes.
+    nutrition = logged_nutrition()
+    stmt = select(
+        *columns,
+        func.sum(nutrition['Calories']).label('total_calories'),
+        func.sum(nutrition['Protein_g']).label('total_protein'),
+        func.sum(nutrition['Carbohydrates_g']).label('total_carbs'),
+        func.sum(nutrition['Fat_g']).label('total_fat'),
+        func.sum(nutrition['Fiber_g']).label('total_fiber')
+    )\
+    .select_from(User_Diet_Log)\
+    .where(User_Diet_Log.User_ID == user_id)\
+    .where(User_Diet_Log.Date.between(start_date, end_date))\
+    .where(or_(User_Diet_Log.Calories.is_not(None), User_Diet_Log.Recipe_ID.is_not(None))) # Else no nutrition at all
+    if group_by == 'recipe':
+        stmt = stmt.outerjoin(Recipe, User_Diet_Log.Recipe_ID == Recipe.Recipe_ID) # Recipe deleted since: no name
+    if not include_planned:
+        stmt = stmt.where(User_Diet_Log.is_finished == True)
+    return stmt.group_by(*keys)
+
+def _zero_totals():
+    return dict.fromkeys(NUTRIENT_TOTALS, 0.0)
+
+def _add_totals(totals, values):
+    for name in NUTRIENT_TOTALS:
+        totals[name] += float(values[name] or 0)
+
+def serialize_dietlog_summary(rows, start_date, end_date, days, windows=None, group_by=None, include_planned=False):
+    """
+    Folds the rows of dietlog_summary_statement into the response. The top-level totals
+    cover `days` (finished logs only, as before); 'windows', 'groups' and 'planned' are
+    only present when asked for.
+    """
+    by_day = {True: {}, False: {}} # is_finished -> date -> totals
+    by_group = {True: {}, False: {}} # is_finished -> group key -> totals
+    for row in rows:
+        values = row._mapping
+        _add_totals(by_day[bool(row.is_finished)].setdefault(row.Date, _zero_totals()), values)
+        if group_by == 'meal':
+            group = row.meal
+        elif group_by == 'recipe':
+            group = (row.Recipe_ID, row.Recipe_Name)
+        else:
+            continue
+        _add_totals(by_group[bool(row.is_finished)].setdefault(group, _zero_totals()), values)
+
+    def totals_since(finished, since):
+        totals = _zero_totals()
+        for date, values in by_day[finished].items():
+            if date >= since:
+                _add_totals(totals, values)
+        return totals
+
+    def entry(fields, finished, planned):
+        entry = {**fields, **finished}
+        if include_planned:
+            entry['planned'] = planned
+        return entry
+
+    result = entry({'days': days, 'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
+                   totals_since(True, start_date), totals_since(False, start_date))
+    if windows:
+        result['windows'] = []
+        for window in windows:
+            since = end_date - datetime.timedelta(days=window - 1)
+            result['windows'].append(entry(
+                {'days': window, 'start_date': since.isoformat(), 'end_date': end_date.isoformat()},
+                totals_since(True, since), totals_since(False, since)))
+    if group_by == 'day':
+        dates = [start_date + datetime.timedelta(days=i) for i in range(days)]
+        result['groups'] = [entry({'date': date.isoformat()},
+                                  by_day[True].get(date, _zero_totals()), by_day[False].get(date, _zero_totals()))
+                            for date in dates]
+    elif group_by == 'meal':
+        result['groups'] = [entry({'meal': meal},
+                                  by_group[True].get(meal, _zero_totals()), by_group[False].get(meal, _zero_totals()))
+                            for meal in MEAL_ORDER]
+    elif group_by == 'recipe':
+        recipes = sorted(by_group[True].keys() | by_group[False].keys(),
+                         key=lambda key: (-by_group[True].get(key, _zero_totals())['total_calories'], key[0] or 0))
+        result['groups'] = [entry({'Recipe_ID': recipe_id, 'Recipe_Name': recipe_name or 'Unknown Recipe'},
+                                  by_group[True].get((recipe_id, recipe_name), _zero_totals()),
+                                  by_group[False].get((recipe_id, recipe_name), _zero_totals()))
+                            for recipe_id, recipe_name in recipes]
+    return result
+
+# --- NEW: Streaming diet history export (CSV / NDJSON) ---
+EXPORT_COLUMNS = [
+    'Log_ID', 'Date', 'Time', 'Recipe_ID', 'Recipe_Name', 'Portion_Size', 'is_finished', 'Notes',
+    'Calories', 'Protein_g', 'Carbohydrates_g', 'Fat_g', 'Fiber_g'
+]
+
+EXPORT_YIELD_PER = 1000
+
+def _export_value(val):
+    if isinstance(val, (datetime.date, datetime.time)):
+        return val.isoformat()
+    if isinstance(val, Decimal):
+        return float(val)
+    return val
+
+@bp.route('/api/dietlogs/export', methods=['GET'])
+@jwt_required()
+def export_diet_logs():
+    """Streams every diet log in a date range with per-log nutrition, one row at a time."""
+    user_id = get_jwt_identity()
+    
+    # --- ADMIN OVERRIDE --- (dietitians/admins can export another user's history)
+    claims = get_jwt()
+    target_user_id = request.args.get('user_id', user_id, type=int)
+    if claims.get("role") != 'admin' and target_user_id != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    
+    try:
+        from_date = request.args.get('from')
+        to_date = request.args.get('to')
+        from_date = datetime.datetime.strptime(from_date, '%Y-%m-%d').date() if from_date else None
+        to_date = datetime.datetime.strptime(to_date, '%Y-%m-%d').date() if to_date else None
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+    
+    # One row per log, nutrition off the log (see logged_nutrition); the outer join only adds the recipe name.
+    nutrition = logged_nutrition()
+    query = db.session.query(
+        User_Diet_Log.Log_ID,
+        User_Diet_Log.Date,
+        User_Diet_Log.Time,
+        User_Diet_Log.Recipe_ID,
+        Recipe.Recipe_Name,
+        User_Diet_Log.Portion_Size,
+        User_Diet_Log.is_finished,
+        User_Diet_Log.Notes,
+        *[nutrition[name].label(name) for name in ('Calories', 'Protein_g', 'Carbohydrates_g', 'Fat_g', 'Fiber_g')]
+    )\
+        .select_from(User_Diet_Log)\
+        .outerjoin(Recipe, User_Diet_Log.Recipe_ID == Recipe.Recipe_ID)\
+        .filter(User_Diet_Log.User_ID == target_user_id)
+    
+    if from_date:
+        query = query.filter(User_Diet_Log.Date >= from_date)
+    if to_date:
+        query = query.filter(User_Diet_Log.Date <= to_date)
+    
+    query = query.order_by(User_Diet_Log.Date, User_Diet_Log.Time, User_Diet_Log.Log_ID)
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            # Send the header before the query runs so the download starts right away
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+        
+        # stream_results uses a server-side cursor, so rows are fetched as they are written
+        rows = db.session.execute(
+            query.statement,
+            execution_options={'stream_results': True, 'yield_per': EXPORT_YIELD_PER}
+        )
+        if export_format == 'csv':
+            for row in rows:
+                buffer.seek(0)
+                buffer.truncate(0)
+                writer.writerow([_export_value(v) for v in row])
+                yield buffer.getvalue()
+        else:
+            for row in rows:
+                record = {col: _export_value(v) for col, v in zip(EXPORT_COLUMNS, row)}
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"dietlogs_{target_user_id}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
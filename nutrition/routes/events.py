@@ -0,0 +1,60 @@
+import queue
+
+from flask import Blueprint, Response, current_app, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from ..events import HEARTBEAT, RESYNC, format_sse, get_broker
+
+bp = Blueprint('events', __name__)
+
+# --- NEW: Per-user change feed (Server-Sent Events) ---
+# EventSource cannot set headers, so the token may also be passed as ?jwt=<token>.
+# Under asgi.py this path is served by a native async handler instead.
+@bp.route('/api/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_events():
+    user_id = get_jwt_identity()
+    config = current_app.config
+    broker = get_broker(current_app)
+
+    if config['EVENTS_MAX_CONNECTIONS'] <= 0:
+        # A stream holds a worker thread for its whole life; gunicorn.conf.py sets
+        # the limit to 0 on single-threaded workers, which a stream would block
+        return jsonify({"error": "Event streams are not available on this server"}), 503, {'Retry-After': '300'}
+
+    events = queue.Queue(maxsize=config['EVENTS_QUEUE_SIZE'])
+
+    def deliver(event):
+        try:
+            events.put_nowait(event)
+        except queue.Full:
+            pass # The stream is already behind; it ends with a resync below
+
+    token, refused = broker.subscribe_within(
+        user_id, deliver, config['EVENTS_MAX_CONNECTIONS'], config['EVENTS_MAX_CONNECTIONS_PER_USER'])
+    if refused == 'total':
+        return jsonify({"error": "Too many open event streams"}), 503, {'Retry-After': '30'}
+    if refused == 'user':
+        return jsonify({"error": "Too many open event streams for this user"}), 429, {'Retry-After': '30'}
+    heartbeat = config['EVENTS_HEARTBEAT_SECONDS']
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                if events.full():
+                    yield format_sse(RESYNC)
+                    return
+                try:
+                    event = events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield HEARTBEAT # Keeps proxies from closing the idle connection
+                    continue
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(user_id, token)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
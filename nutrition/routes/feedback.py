@@ -0,0 +1,166 @@
+from collections import Counter
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import text, select, update, delete, func
+
+from ..extensions import db
+from ..models import User, Recipe, Feedback, Recipe_Rating
+from ..ownership import guarded_update, owned_row_clause, not_found_or_forbidden
+from ..ratings import apply_rating_delta, refresh_recipe_ratings
+from ..sharding import add_page_headers, page_args, scatter_count, scatter_gather, sharding_enabled
+
+FEEDBACK_PAGE_SIZE = 50
+FEEDBACK_MAX_PAGE_SIZE = 200
+
+bp = Blueprint('feedback', __name__)
+
+def commit_with_rating(recipe_id, deltas):
+    """
+    Commits a Feedback change together with its recipe's rating aggregates.
+    With shards they are on different databases, so the aggregates are
+    recomputed from the shards once the Feedback change has committed.
+    """
+    if sharding_enabled():
+        db.session.commit()
+        try:
+            refresh_recipe_ratings([recipe_id])
+        except Exception as e:
+            # The feedback is saved; the recipe's next change or a rebuild recomputes it
+            db.session.rollback()
+            current_app.logger.warning("Rating refresh for recipe %s failed: %s", recipe_id, e)
+    else:
+        apply_rating_delta(recipe_id, deltas)
+        db.session.commit()
+
+def rating_value(data):
+    """The request's Rating as an int; raises ValueError unless it is a whole number from 1 to 5."""
+    rating = data.get('Rating')
+    if isinstance(rating, str) and rating.strip().isdigit():
+        rating = int(rating)
+    if isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 5:
+        raise ValueError("Rating must be a whole number from 1 to 5.")
+    return rating
+
+def rating_deltas(before, after):
+    """{rating: change in count} between two Counters of ratings; unchanged ratings come out as 0."""
+    return {r: after[r] - before[r] for r in before.keys() | after.keys()}
+
+# --- Feedback Routes ---
+@bp.route('/api/recipes/<int:recipe_id>/feedback', methods=['POST'])
+@jwt_required()
+def add_feedback(recipe_id):
+    user_id = get_jwt_identity()
+    data = request.json
+    
+    try:
+        rating = rating_value(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not db.session.get(Recipe, recipe_id):
+        return jsonify({"error": "Recipe not found"}), 404
+    
+    # AddFeedback may update the user's earlier feedback instead of adding a row,
+    # so the aggregates move by the difference between their ratings before and after
+    users_ratings = select(Feedback.Rating).where(Feedback.User_ID == user_id, Feedback.Recipe_ID == recipe_id)
+    try:
+        before = Counter(db.session.scalars(users_ratings.with_for_update()))
+        db.session.execute(
+            text("CALL AddFeedback(:p_userId, :p_recipeId, :p_rating, :p_comments)"),
+            {
+                "p_userId": user_id,
+                "p_recipeId": recipe_id,
+                "p_rating": rating,
+                "p_comments": data.get('Comments')
+            }
+        )
+        after = Counter(db.session.scalars(users_ratings))
+        commit_with_rating(recipe_id, rating_deltas(before, after))
+        return jsonify({"message": "Feedback added successfully"}), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+@bp.route('/api/recipes/<int:recipe_id>/feedback', methods=['GET'])
+@jwt_required()
+def get_feedback(recipe_id):
+    # Paginated, newest first: ?page=1&per_page=50. The total comes from Recipe_Rating, not COUNT(*).
+    # A recipe's feedback is spread over every user shard, so each page is merged from all of them.
+    page, per_page = page_args(request.args, FEEDBACK_PAGE_SIZE, FEEDBACK_MAX_PAGE_SIZE)
+    
+    feedback_list = scatter_gather(
+        select(Feedback, User.Name)
+        .join(User, Feedback.User_ID == User.User_ID)
+        .where(Feedback.Recipe_ID == recipe_id)
+        .order_by(Feedback.Date.desc(), Feedback.Feedback_ID.desc()),
+        sort_key=lambda row: (row[0].Date, row[0].Feedback_ID), reverse=True,
+        offset=(page - 1) * per_page, limit=per_page,
+    )
+        
+    result = []
+    for feedback, user_name in feedback_list:
+        fb_data = feedback.to_dict()
+        fb_data['User_Name'] = user_name
+        result.append(fb_data)
+    
+    total = db.session.scalar(select(Recipe_Rating.Rating_Count).where(Recipe_Rating.Recipe_ID == recipe_id))
+    if total is None:
+        # No aggregate row yet (not backfilled, see backfill_recipe_ratings): count the rows
+        total = scatter_count(select(func.count()).select_from(Feedback).where(Feedback.Recipe_ID == recipe_id))
+    return add_page_headers(jsonify(result), page, per_page, total)
+
+@bp.route('/api/feedback/<int:feedback_id>', methods=['PUT'])
+@jwt_required()
+def update_feedback(feedback_id):
+    data = request.json
+    values = {key: data[key] for key in ('Rating', 'Comments') if key in data}
+    if 'Rating' in values:
+        try:
+            values['Rating'] = rating_value(values)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    if 'Rating' not in values:
+        error = guarded_update(Feedback, Feedback.Feedback_ID, feedback_id, Feedback.User_ID, values, "Feedback not found")
+        if error:
+            return error
+        return jsonify(db.session.get(Feedback, feedback_id).to_dict())
+    
+    # A rating change moves the recipe's aggregates, so read the old rating (row-locked) first
+    old = db.session.execute(
+        select(Feedback.Recipe_ID, Feedback.Rating)
+        .where(owned_row_clause(Feedback.Feedback_ID, feedback_id, Feedback.User_ID))
+        .with_for_update()
+    ).first()
+    if old is None:
+        db.session.rollback()
+        return not_found_or_forbidden(Feedback.Feedback_ID, feedback_id, "Feedback not found")
+    try:
+        db.session.execute(update(Feedback).where(Feedback.Feedback_ID == feedback_id).values(values)
+                           .execution_options(synchronize_session=False))
+        commit_with_rating(old.Recipe_ID, rating_deltas(Counter([old.Rating]), Counter([values['Rating']])))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    return jsonify(db.session.get(Feedback, feedback_id).to_dict())
+
+@bp.route('/api/feedback/<int:feedback_id>', methods=['DELETE'])
+@jwt_required()
+def delete_feedback(feedback_id):
+    # The deleted rating has to come off the recipe's aggregates (see commit_with_rating)
+    old = db.session.execute(
+        select(Feedback.Recipe_ID, Feedback.Rating)
+        .where(owned_row_clause(Feedback.Feedback_ID, feedback_id, Feedback.User_ID))
+        .with_for_update()
+    ).first()
+    if old is None:
+        db.session.rollback()
+        return not_found_or_forbidden(Feedback.Feedback_ID, feedback_id, "Feedback not found")
+    try:
+        db.session.execute(delete(Feedback).where(Feedback.Feedback_ID == feedback_id)
+                           .execution_options(synchronize_session=False))
+        commit_with_rating(old.Recipe_ID, {old.Rating: -1})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    return jsonify({"message": "Feedback deleted"}), 200
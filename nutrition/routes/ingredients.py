@@ -0,0 +1,160 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy.orm import joinedload, load_only
+
+from ..decorators import admin_required
+from ..diettags import recipes_using, refresh_recipe_tags, tag_mask, tag_names
+from ..extensions import db
+from ..fields import parse_fields, model_columns
+from ..models import Recipe, Ingredient, Nutrition
+from ..resultcache import invalidate_catalog_results
+from ..singleflight import coalesced
+from ..warmup import warmup_task
+
+bp = Blueprint('ingredients', __name__)
+
+# --- Ingredient CRUD (Admins only) ---
+@bp.route('/api/ingredients', methods=['POST'])
+@admin_required() # <-- Only admins can create ingredients
+def create_ingredient():
+    data = request.json
+    try:
+        tags = tag_mask(data.get('tags', []))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    new_ing = Ingredient(
+        Ingredient_Name=data['Ingredient_Name'],
+        Unit_Of_Measure=data['Unit_Of_Measure'],
+        Category=data['Category'],
+        Notes=data.get('Notes'),
+        Tag_Mask=tags
+    )
+    db.session.add(new_ing)
+    db.session.commit()
+    
+    if 'nutrition' in data:
+        nut_data = data['nutrition']
+        new_nut = Nutrition(
+            Ingredient_ID=new_ing.Ingredient_ID,
+            Calories=nut_data.get('Calories'),
+            Carbohydrates_g=nut_data.get('Carbohydrates_g'),
+            Protein_g=nut_data.get('Protein_g'),
+            Fat_g=nut_data.get('Fat_g'),
+            Fiber_g=nut_data.get('Fiber_g'),
+            Vitamins=nut_data.get('Vitamins'),
+            Minerals=nut_data.get('Minerals'),
+            Other_Nutrients=nut_data.get('Other_Nutrients')
+        )
+        db.session.add(new_nut)
+        db.session.commit()
+        
+    return jsonify(new_ing.to_dict()), 201
+
+@bp.route('/api/ingredients', methods=['GET'])
+@jwt_required() # All logged-in users can see ingredients
+@coalesced('ingredients', scope='public')
+def get_ingredients():
+    try:
+        fields, nested = parse_fields(Ingredient, {'nutrition': Nutrition})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    ingredients = ingredient_query(fields, nested).all()
+    return jsonify([serialize_ingredient(ing, fields, nested) for ing in ingredients])
+
+@bp.route('/api/ingredients/<int:ing_id>', methods=['GET'])
+@jwt_required() # All logged-in users can see a single ingredient
+def get_ingredient(ing_id):
+    try:
+        fields, nested = parse_fields(Ingredient, {'nutrition': Nutrition})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    ingredient = ingredient_query(fields, nested).get(ing_id)
+    
+    if not ingredient:
+        return jsonify({"error": "Ingredient not found"}), 404
+    
+    return jsonify(serialize_ingredient(ingredient, fields, nested))
+
+def ingredient_query(fields, nested):
+    """Ingredient query that SELECTs only the requested columns (and nutrition only if asked for)."""
+    if fields is None:
+        return Ingredient.query.options(joinedload(Ingredient.nutrition))
+    
+    query = Ingredient.query.options(load_only(*model_columns(Ingredient, fields)))
+    if 'nutrition' in nested:
+        nutrition_load = joinedload(Ingredient.nutrition)
+        if nested['nutrition'] is not None:
+            nutrition_load = nutrition_load.load_only(*model_columns(Nutrition, nested['nutrition']))
+        query = query.options(nutrition_load)
+    return query
+
+def serialize_ingredient(ing, fields=None, nested=None):
+    ing_data = ing.to_dict(only=fields)
+    if fields is None:
+        ing_data['tags'] = tag_names(ing.Tag_Mask)
+    if fields is None or 'nutrition' in nested:
+        nut_fields = nested.get('nutrition') if nested else None
+        ing_data['nutrition'] = ing.nutrition.to_dict(only=nut_fields) if ing.nutrition else None
+    return ing_data
+
+@bp.route('/api/ingredients/<int:ing_id>', methods=['PUT'])
+@admin_required() # <-- Only admins can change ingredients
+def update_ingredient(ing_id):
+    ingredient = db.session.get(Ingredient, ing_id)
+    if not ingredient:
+        return jsonify({"error": "Ingredient not found"}), 404
+    
+    data = request.json
+    if 'tags' in data:
+        try:
+            tags = tag_mask(data['tags'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if tags != ingredient.Tag_Mask:
+            ingredient.Tag_Mask = tags
+            db.session.flush()
+            refresh_recipe_tags(recipes_using(ing_id)) # Same transaction as the tag change
+    ingredient.Ingredient_Name = data.get('Ingredient_Name', ingredient.Ingredient_Name)
+    ingredient.Unit_Of_Measure = data.get('Unit_Of_Measure', ingredient.Unit_Of_Measure)
+    ingredient.Category = data.get('Category', ingredient.Category)
+    ingredient.Notes = data.get('Notes', ingredient.Notes)
+    
+    if 'nutrition' in data:
+        if not ingredient.nutrition:
+            ingredient.nutrition = Nutrition(Ingredient_ID=ing_id)
+            db.session.add(ingredient.nutrition)
+            
+        nut_data = data['nutrition']
+        for key, value in nut_data.items():
+            if hasattr(ingredient.nutrition, key):
+                setattr(ingredient.nutrition, key, value)
+    
+    db.session.commit()
+    invalidate_catalog_results() # Summaries of logs not backfilled yet read it (see logged_nutrition)
+    
+    ingredient = Ingredient.query.options(joinedload(Ingredient.nutrition)).get(ing_id)
+    return jsonify(serialize_ingredient(ingredient))
+
+@bp.route('/api/ingredients/<int:ing_id>', methods=['DELETE'])
+@admin_required() # <-- Only admins can delete ingredients
+def delete_ingredient(ing_id):
+    ingredient = db.session.get(Ingredient, ing_id)
+    if not ingredient:
+        return jsonify({"error": "Ingredient not found"}), 404
+        
+    try:
+        db.session.delete(ingredient)
+        db.session.commit()
+        invalidate_catalog_results()
+        return jsonify({"message": "Ingredient deleted"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Cannot delete: Ingredient is in use by a recipe. " + str(e)}), 409
+
+@warmup_task
+def warm_catalog():
+    """Reads the ingredient catalog once so DB pages and SQLAlchemy's statement cache are hot."""
+    ingredient_query(None, {}).all()
+    Recipe.query.limit(1).all()
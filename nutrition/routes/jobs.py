@@ -0,0 +1,25 @@
+import json
+
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+
+from ..extensions import db
+from ..models import Background_Job
+
+bp = Blueprint('jobs', __name__)
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    job = db.session.get(Background_Job, job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+        
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and job.Created_By != get_jwt_identity():
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    job_data = job.to_dict(exclude=['Payload', 'Result', 'Locked_By'])
+    job_data['Result'] = json.loads(job.Result) if job.Result else None
+    return jsonify(job_data)
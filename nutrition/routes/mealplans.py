@@ -0,0 +1,427 @@
+import datetime
+
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy import text, select, insert, literal, union_all, true, func
+from sqlalchemy.orm import joinedload
+
+from ..events import publish
+from ..extensions import db
+from ..jobs import job_handler, wants_background, enqueue_job, job_accepted_response
+from ..lognutrition import log_nutrition, recipe_nutrition
+from ..models import Recipe, Ingredient, Recipe_Ingredient, Meal_Plan, MealPlan_Recipe, User_Diet_Log
+from ..ownership import guarded_update
+from ..resultcache import cached_result, invalidate_user_results
+from ..sharding import add_page_headers, page_args, scatter_count, scatter_gather
+from ..sql import date_add_days
+from ..units import convert_quantity
+
+bp = Blueprint('mealplans', __name__)
+
+MEALPLAN_CLONE_MAX_REPEAT = 52
+
+# --- Meal_Plan CRUD (User-specific OR Admin) ---
+@bp.route('/api/mealplans', methods=['POST'])
+@jwt_required()
+def create_mealplan():
+    data = request.json
+    user_id = get_jwt_identity()
+    
+    new_plan = Meal_Plan(
+        User_ID=user_id,
+        Plan_Name=data['Plan_Name'],
+        Start_Date=data.get('Start_Date'),
+        End_Date=data.get('End_Date'),
+        Notes=data.get('Notes')
+    )
+    db.session.add(new_plan)
+    db.session.commit()
+    plan_data = new_plan.to_dict()
+    invalidate_user_results(user_id)
+    publish(user_id, 'mealplan.created', plan_data)
+    return jsonify(plan_data), 201
+
+@bp.route('/api/mealplans', methods=['GET'])
+@jwt_required()
+@cached_result('mealplans')
+def get_mealplans():
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") == 'admin':
+        # Admin gets all meal plans, merged from every shard; ?page=&per_page= pages the merged list
+        page, per_page = page_args(request.args)
+        offset = (page - 1) * per_page if per_page else 0
+        rows = scatter_gather(select(Meal_Plan).order_by(Meal_Plan.User_ID, Meal_Plan.MealPlan_ID),
+                              sort_key=lambda row: (row[0].User_ID or 0, row[0].MealPlan_ID),
+                              offset=offset, limit=per_page)
+        response = jsonify([plan.to_dict() for (plan,) in rows])
+        if per_page:
+            add_page_headers(response, page, per_page, scatter_count(select(func.count()).select_from(Meal_Plan)))
+        return response
+    
+    user_id = get_jwt_identity()
+    plans = Meal_Plan.query.filter_by(User_ID=user_id).all() # User gets only their own
+    return jsonify([plan.to_dict() for plan in plans])
+
+@bp.route('/api/mealplans/<int:plan_id>', methods=['GET'])
+@jwt_required()
+def get_mealplan(plan_id):
+    user_id = get_jwt_identity()
+    
+    plan = Meal_Plan.query.options(
+        joinedload(Meal_Plan.recipes).joinedload(MealPlan_Recipe.recipe)
+    ).filter_by(MealPlan_ID=plan_id).first() # Get plan by ID first
+    
+    if not plan:
+        return jsonify({"error": "Meal plan not found"}), 404
+        
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and plan.User_ID != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    plan_data = plan.to_dict()
+    plan_data['recipes'] = [serialize_mealplan_recipe(mpr) for mpr in plan.recipes]
+    return jsonify(plan_data)
+
+def serialize_mealplan_recipe(mpr):
+    return {
+        "MealPlan_Recipe_ID": mpr.id,
+        "Recipe_ID": mpr.Recipe_ID,
+        "Recipe_Name": mpr.recipe.Recipe_Name if mpr.recipe else None, # The recipe may be gone (see delete_recipe)
+        "Day_of_Plan": mpr.Day_of_Plan.isoformat() if mpr.Day_of_Plan else None,
+        "Meal_Type": mpr.Meal_Type
+    }
+
+@bp.route('/api/mealplans/<int:plan_id>', methods=['PUT'])
+@jwt_required()
+def update_mealplan(plan_id):
+    data = request.json
+    values = {key: data[key] for key in ('Plan_Name', 'Start_Date', 'End_Date', 'Notes') if key in data}
+    error = guarded_update(Meal_Plan, Meal_Plan.MealPlan_ID, plan_id, Meal_Plan.User_ID, values, "Meal plan not found")
+    if error:
+        return error
+    plan_data = db.session.get(Meal_Plan, plan_id).to_dict()
+    invalidate_user_results(plan_data['User_ID'])
+    publish(plan_data['User_ID'], 'mealplan.updated', plan_data)
+    return jsonify(plan_data)
+
+@bp.route('/api/mealplans/<int:plan_id>', methods=['DELETE'])
+@jwt_required()
+def delete_mealplan(plan_id):
+    user_id = get_jwt_identity()
+    plan = db.session.get(Meal_Plan, plan_id)
+
+    if not plan:
+        return jsonify({"error": "Meal plan not found"}), 404
+        
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and plan.User_ID != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    owner_id = plan.User_ID
+    db.session.delete(plan)
+    db.session.commit()
+    invalidate_user_results(owner_id)
+    publish(owner_id, 'mealplan.deleted', {"MealPlan_ID": plan_id})
+    return jsonify({"message": "Meal plan deleted"}), 200
+
+# --- Manage Recipes IN a Meal Plan (MealPlan_Recipe) ---
+@bp.route('/api/mealplans/<int:plan_id>/recipes', methods=['POST'])
+@jwt_required()
+def add_recipe_to_mealplan(plan_id):
+    data = request.json
+    user_id = get_jwt_identity()
+    
+    plan = Meal_Plan.query.filter_by(MealPlan_ID=plan_id, User_ID=user_id).first()
+    
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") == 'admin':
+        plan = db.session.get(Meal_Plan, plan_id) # Admin can add to any plan
+        
+    if not plan:
+        return jsonify({"error": "Meal plan not found or unauthorized"}), 404
+        
+    if not db.session.get(Recipe, data['Recipe_ID']):
+        return jsonify({"error": "Recipe not found"}), 404
+        
+    new_mpr = MealPlan_Recipe(
+        MealPlan_ID=plan_id,
+        Recipe_ID=data['Recipe_ID'],
+        Day_of_Plan=data.get('Day_of_Plan'),
+        Meal_Type=data.get('Meal_Type')
+    )
+    db.session.add(new_mpr)
+    db.session.commit()
+    mpr_data = new_mpr.to_dict()
+    invalidate_user_results(plan.User_ID)
+    publish(plan.User_ID, 'mealplan.recipe_added', mpr_data)
+    return jsonify(mpr_data), 201
+
+    
+@bp.route('/api/mealplan-recipes/<int:mpr_id>', methods=['DELETE'])
+@jwt_required()
+def remove_recipe_from_mealplan(mpr_id):
+    mpr = db.session.get(MealPlan_Recipe, mpr_id)
+    if not mpr:
+        return jsonify({"error": "Meal plan recipe entry not found"}), 404
+        
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and mpr.meal_plan.User_ID != get_jwt_identity():
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    owner_id, plan_id = mpr.meal_plan.User_ID, mpr.MealPlan_ID
+    db.session.delete(mpr)
+    db.session.commit()
+    invalidate_user_results(owner_id)
+    publish(owner_id, 'mealplan.recipe_removed', {"id": mpr_id, "MealPlan_ID": plan_id})
+    return jsonify({"message": "Recipe removed from meal plan"}), 200
+
+# --- NEW: Clone a meal plan (optionally repeating it week after week) ---
+@bp.route('/api/mealplans/<int:plan_id>/clone', methods=['POST'])
+@jwt_required()
+def clone_mealplan(plan_id):
+    """
+    Body (all optional):
+      day_offset   - days between the source plan and the first copy (default 7)
+      repeat       - number of consecutive copies in the new plan (default 1)
+      period_days  - days between copies when repeat > 1 (default 7)
+      Plan_Name    - name of the new plan
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+
+    plan = db.session.get(Meal_Plan, plan_id)
+    if not plan:
+        return jsonify({"error": "Meal plan not found"}), 404
+
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and plan.User_ID != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        day_offset = int(data.get('day_offset', 7))
+        repeat = int(data.get('repeat', 1))
+        period_days = int(data.get('period_days', 7))
+    except (TypeError, ValueError):
+        return jsonify({"error": "day_offset, repeat and period_days must be integers"}), 400
+    if not 1 <= repeat <= MEALPLAN_CLONE_MAX_REPEAT:
+        return jsonify({"error": f"repeat must be between 1 and {MEALPLAN_CLONE_MAX_REPEAT}"}), 400
+
+    last_shift = datetime.timedelta(days=day_offset + (repeat - 1) * period_days)
+    new_plan = Meal_Plan(
+        User_ID=plan.User_ID, # An admin cloning a user's plan creates it for that user
+        Plan_Name=data.get('Plan_Name') or f"{plan.Plan_Name} (copy)",
+        Start_Date=plan.Start_Date + datetime.timedelta(days=day_offset) if plan.Start_Date else None,
+        End_Date=plan.End_Date + last_shift if plan.End_Date else None,
+        Notes=plan.Notes,
+    )
+    try:
+        db.session.add(new_plan)
+        db.session.flush()
+
+        # One INSERT ... SELECT: every source row x every copy number, with the day shifted
+        copy_numbers = union_all(*[select(literal(n).label('n')) for n in range(repeat)]).subquery()
+        shift = day_offset + copy_numbers.c.n * period_days
+        rows = (
+            select(
+                literal(new_plan.MealPlan_ID),
+                MealPlan_Recipe.Recipe_ID,
+                date_add_days(MealPlan_Recipe.Day_of_Plan, shift),
+                MealPlan_Recipe.Meal_Type,
+            )
+            .select_from(MealPlan_Recipe)
+            .join(copy_numbers, true())
+            .where(MealPlan_Recipe.MealPlan_ID == plan_id)
+        )
+        result = db.session.execute(
+            insert(MealPlan_Recipe).from_select(['MealPlan_ID', 'Recipe_ID', 'Day_of_Plan', 'Meal_Type'], rows)
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+    plan_data = new_plan.to_dict()
+    plan_data['recipes_copied'] = result.rowcount
+    invalidate_user_results(new_plan.User_ID)
+    publish(new_plan.User_ID, 'mealplan.created', plan_data)
+    return jsonify(plan_data), 201
+
+# --- NEW: Shopping list for a meal plan (one grouped query) ---
+@bp.route('/api/mealplans/<int:plan_id>/shopping-list', methods=['GET'])
+@jwt_required()
+def get_mealplan_shopping_list(plan_id):
+    user_id = get_jwt_identity()
+
+    try:
+        from_date = request.args.get('from')
+        to_date = request.args.get('to')
+        from_date = datetime.datetime.strptime(from_date, '%Y-%m-%d').date() if from_date else None
+        to_date = datetime.datetime.strptime(to_date, '%Y-%m-%d').date() if to_date else None
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
+
+    plan = db.session.get(Meal_Plan, plan_id)
+    if not plan:
+        return jsonify({"error": "Meal plan not found"}), 404
+
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and plan.User_ID != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    # Every planned recipe contributes its ingredient lines; a recipe planned
+    # twice counts twice. Grouped per (ingredient, recipe unit) in the database.
+    stmt = (
+        select(
+            Ingredient.Ingredient_ID,
+            Ingredient.Ingredient_Name,
+            Ingredient.Category,
+            Ingredient.Unit_Of_Measure,
+            Recipe_Ingredient.Unit,
+            func.sum(Recipe_Ingredient.Quantity).label('quantity'),
+        )
+        .select_from(MealPlan_Recipe)
+        .join(Recipe_Ingredient, Recipe_Ingredient.Recipe_ID == MealPlan_Recipe.Recipe_ID)
+        .join(Ingredient, Ingredient.Ingredient_ID == Recipe_Ingredient.Ingredient_ID)
+        .where(MealPlan_Recipe.MealPlan_ID == plan_id)
+        .group_by(Ingredient.Ingredient_ID, Ingredient.Ingredient_Name, Ingredient.Category,
+                  Ingredient.Unit_Of_Measure, Recipe_Ingredient.Unit)
+    )
+    if from_date:
+        stmt = stmt.where(MealPlan_Recipe.Day_of_Plan >= from_date)
+    if to_date:
+        stmt = stmt.where(MealPlan_Recipe.Day_of_Plan <= to_date)
+
+    # Merge the per-unit sums into the ingredient's own unit where the units convert
+    items = {}
+    for row in db.session.execute(stmt):
+        converted = convert_quantity(row.quantity, row.Unit, row.Unit_Of_Measure)
+        unit = row.Unit_Of_Measure if converted is not None else row.Unit
+        key = (row.Ingredient_ID, unit)
+        item = items.setdefault(key, {
+            "Ingredient_ID": row.Ingredient_ID,
+            "Ingredient_Name": row.Ingredient_Name,
+            "Category": row.Category,
+            "Quantity": 0,
+            "Unit": unit,
+            "normalized": converted is not None,
+        })
+        item["Quantity"] += converted if converted is not None else row.quantity
+
+    categories = {}
+    for item in sorted(items.values(), key=lambda i: (i["Category"], i["Ingredient_Name"], i["Unit"])):
+        item["Quantity"] = round(float(item["Quantity"]), 3)
+        categories.setdefault(item.pop("Category"), []).append(item)
+
+    return jsonify({
+        "MealPlan_ID": plan_id,
+        "from": from_date.isoformat() if from_date else None,
+        "to": to_date.isoformat() if to_date else None,
+        "categories": [{"Category": name, "items": entries} for name, entries in categories.items()],
+    })
+
+@bp.route('/api/mealplans/<int:plan_id>/summary', methods=['GET'])
+@jwt_required()
+def call_get_mealplan_summary(plan_id):
+    """Calls 'GetMealPlanSummary' procedure for a specific plan."""
+    user_id = get_jwt_identity()
+    
+    plan = db.session.get(Meal_Plan, plan_id)
+    if not plan:
+        return jsonify({"error": "Plan not found"}), 404
+        
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and plan.User_ID != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    try:
+        # The procedure is already filtered by user ID, so we use the plan's owner ID
+        result_proxy = db.session.execute(
+            text("CALL GetMealPlanSummary(:id)"),
+            {"id": plan.User_ID} 
+        )
+        
+        summary_for_plan = [
+            {
+                "Plan_Name": row.Plan_Name,
+                "Day_of_Plan": row.Day_of_Plan.isoformat(),
+                "Meal_Type": row.Meal_Type,
+                "Recipe_Name": row.Recipe_Name,
+                "Recipe_Calories": float(row.Recipe_Calories)
+            } for row in result_proxy if row.Plan_Name == plan.Plan_Name
+        ]
+        
+        return jsonify(summary_for_plan)
+    except Exception as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+# --- NEW: Route to log a full meal plan day ---
+@bp.route('/api/mealplans/log-day', methods=['POST'])
+@jwt_required()
+def log_meal_plan_day():
+    user_id = get_jwt_identity()
+    data = request.json
+    plan_id = data.get('plan_id')
+    date_to_log = data.get('date')
+
+    if not plan_id or not date_to_log:
+        return jsonify({"error": "plan_id and date are required"}), 400
+    
+    plan = db.session.get(Meal_Plan, plan_id)
+    if not plan or plan.User_ID != user_id:
+        return jsonify({"error": "Plan not found or unauthorized"}), 403
+
+    if wants_background():
+        job = enqueue_job('log_meal_plan_day', {"user_id": user_id, "plan_id": plan_id, "date": date_to_log}, created_by=user_id)
+        return job_accepted_response(job, "Meal plan day logging queued")
+
+    try:
+        logged = _log_meal_plan_day(plan, user_id, date_to_log)
+        if not logged:
+            return jsonify({"error": "No recipes found for this day on this plan."}), 404
+        return jsonify({"message": f"Successfully logged {logged} meals."}), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+def _log_meal_plan_day(plan, user_id, date_to_log):
+    """Creates finished diet logs for every recipe on one day of a plan. Returns the count."""
+    recipes_for_day = MealPlan_Recipe.query.filter_by(
+        MealPlan_ID=plan.MealPlan_ID,
+        Day_of_Plan=date_to_log
+    ).join(Meal_Plan).filter(Meal_Plan.User_ID == user_id).all()
+    
+    per_recipe = recipe_nutrition(item.Recipe_ID for item in recipes_for_day) # One query for the whole day
+    for item in recipes_for_day:
+        new_log = User_Diet_Log(
+            User_ID=user_id,
+            Recipe_ID=item.Recipe_ID,
+            Date=item.Day_of_Plan,
+            Portion_Size=1, # Default to 1 portion
+            Notes=f"From meal plan: {plan.Plan_Name}",
+            is_finished=True, # Mark as finished since they are logging it
+            **log_nutrition(item.Recipe_ID, 1, per_recipe)
+        )
+        db.session.add(new_log)
+        
+    db.session.commit()
+    if recipes_for_day:
+        invalidate_user_results(user_id)
+        # One event for the whole day; clients refetch that date
+        publish(user_id, 'dietlog.bulk_created', {"Date": str(date_to_log), "count": len(recipes_for_day)})
+    return len(recipes_for_day)
+
+@job_handler('log_meal_plan_day')
+def log_meal_plan_day_job(payload):
+    plan = db.session.get(Meal_Plan, payload['plan_id'])
+    if not plan or plan.User_ID != payload['user_id']:
+        raise ValueError("Plan not found or unauthorized")
+    return {"logged": _log_meal_plan_day(plan, payload['user_id'], payload['date'])}
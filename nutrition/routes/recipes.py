@@ -0,0 +1,363 @@
+import json
+
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.orm import joinedload, load_only
+
+from ..admission import admission_controlled
+from ..diettags import refresh_recipe_tags, requested_restrictions, suitable_for, tag_names
+from ..extensions import db
+from ..fields import parse_fields, model_columns
+from ..models import Recipe, Ingredient, Recipe_Ingredient, Recipe_Log, Recipe_Rating, MealPlan_Recipe, User_Diet_Log, Feedback
+from ..ratings import serialize_rating
+from ..recipeimport import import_recipes
+from ..resultcache import cached_result, invalidate_user_results, invalidate_catalog_results
+from ..sharding import scatter_count, scatter_execute, sharding_enabled
+from ..singleflight import coalesced
+
+bp = Blueprint('recipes', __name__)
+
+# --- Recipe CRUD (Admin can edit/delete any recipe) ---
+@bp.route('/api/recipes', methods=['POST'])
+@jwt_required()
+def create_recipe():
+    data = request.json
+    creator_id = get_jwt_identity()
+    
+    new_recipe = Recipe(
+        Recipe_Name=data['Recipe_Name'],
+        Description=data.get('Description'),
+        Cuisine_Type=data.get('Cuisine_Type'),
+        Preparation_Time_minutes=data.get('Preparation_Time_minutes'),
+        Cooking_Time_minutes=data.get('Cooking_Time_minutes'),
+        Serving_Size=data.get('Serving_Size', 1),
+        Difficulty_Level=data.get('Difficulty_Level'),
+        Instructions=data.get('Instructions'),
+        Creator_User_ID=creator_id
+    )
+    db.session.add(new_recipe)
+    db.session.commit()
+    invalidate_user_results(creator_id)
+    return jsonify(new_recipe.to_dict()), 201
+
+# --- NEW: Bulk import (see nutrition/recipeimport.py) ---
+def recipe_import_items():
+    """
+    (position, recipe) pairs from the request body, positions counting from 1:
+    NDJSON is read line by line as it streams in, a line that is not JSON
+    becomes a ValueError for its position. Raises ValueError if a JSON body
+    is not a list of recipes or {"recipes": [...]}.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        def lines():
+            for number, line in enumerate(request.stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, ValueError(f"Line {number} is not valid JSON.")
+        return lines()
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('recipes')
+    if not isinstance(data, list):
+        raise ValueError('Send a JSON list of recipes, {"recipes": [...]}, or NDJSON with one recipe per line.')
+    return enumerate(data, 1)
+
+@bp.route('/api/recipes/import', methods=['POST'])
+@jwt_required()
+@admission_controlled('import')
+def import_recipes_route():
+    creator_id = get_jwt_identity()
+    # --- ADMIN OVERRIDE ---
+    if request.args.get('user_id'):
+        if get_jwt().get("role") != 'admin':
+            return jsonify({"error": "Unauthorized"}), 403
+        try:
+            creator_id = int(request.args['user_id'])
+        except ValueError:
+            return jsonify({"error": "user_id must be an integer."}), 400
+    try:
+        items = recipe_import_items()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    partial = request.args.get('partial', '').lower() in ('1', 'true', 'yes')
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    report = import_recipes(items, creator_id, partial=partial, dry_run=dry_run)
+    if report['recipe_ids']:
+        invalidate_user_results(creator_id)
+    return jsonify(report), 201 if report['recipe_ids'] else 200
+
+@bp.route('/api/recipes', methods=['GET'])
+@jwt_required() 
+@cached_result('recipes')
+def get_recipes():
+    # --- ADMIN OVERRIDE ---
+    try:
+        fields, _ = parse_fields(Recipe)
+        restrictions = requested_restrictions(request.args, get_jwt_identity())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    query = Recipe.query
+    if fields is not None:
+        query = query.options(load_only(*model_columns(Recipe, fields)))
+    else:
+        query = query.options(joinedload(Recipe.rating))
+    if restrictions:
+        query = query.filter(suitable_for(restrictions)) # One bitwise test per recipe, no ingredient scan
+    
+    claims = get_jwt()
+    if claims.get("role") == 'admin':
+        recipes = query.all() # Admin gets all recipes
+    else:
+        user_id = get_jwt_identity()
+        recipes = query.filter_by(Creator_User_ID=user_id).all() # User gets only their own
+    
+    if fields is not None:
+        return jsonify([recipe.to_dict(only=fields) for recipe in recipes])
+    return jsonify([dict(recipe.to_dict(), rating=serialize_rating(recipe.rating), tags=tag_names(recipe.Tag_Mask))
+                    for recipe in recipes])
+
+# --- NEW: Best-rated recipes, read straight from the Recipe_Rating index ---
+@bp.route('/api/recipes/top-rated', methods=['GET'])
+@jwt_required()
+def get_top_rated_recipes():
+    limit = min(max(1, request.args.get('limit', 20, type=int)), 100)
+    min_count = max(1, request.args.get('min_count', 3, type=int)) # Avoid one 5-star review topping the list
+    try:
+        restrictions = requested_restrictions(request.args, get_jwt_identity())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    query = db.session.query(Recipe, Recipe_Rating)\
+        .join(Recipe_Rating, Recipe_Rating.Recipe_ID == Recipe.Recipe_ID)\
+        .filter(Recipe_Rating.Rating_Count >= min_count)\
+        .order_by(Recipe_Rating.Avg_Rating.desc(), Recipe_Rating.Rating_Count.desc())
+    if restrictions:
+        query = query.filter(suitable_for(restrictions))
+    
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin':
+        query = query.filter(Recipe.Creator_User_ID == get_jwt_identity()) # Same visibility as GET /api/recipes
+    
+    return jsonify([
+        dict(recipe.to_dict(), rating=serialize_rating(rating)) for recipe, rating in query.limit(limit).all()
+    ])
+
+@bp.route('/api/recipes/<int:recipe_id>', methods=['GET'])
+@jwt_required()
+def get_recipe(recipe_id):
+    try:
+        fields, nested = parse_fields(Recipe, {'ingredients': Recipe_Ingredient})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with_ingredients = fields is None or 'ingredients' in nested
+    
+    query = Recipe.query
+    if fields is not None:
+        # Creator_User_ID is always needed for the ownership check below
+        query = query.options(load_only(*model_columns(Recipe, fields | {'Creator_User_ID'})))
+    ingredient_fields = nested.get('ingredients')
+    if with_ingredients and ingredient_fields is None:
+        query = query.options(joinedload(Recipe.ingredients).joinedload(Recipe_Ingredient.ingredient))
+    elif with_ingredients:
+        # ingredients.<col> selectors: just those Recipe_Ingredient columns, no Ingredient join
+        ingredient_fields = ingredient_fields | {'RecipeIngredient_ID'}
+        query = query.options(joinedload(Recipe.ingredients).load_only(*model_columns(Recipe_Ingredient, ingredient_fields)))
+    if fields is None:
+        query = query.options(joinedload(Recipe.rating))
+    recipe = query.get(recipe_id)
+    
+    if not recipe:
+        return jsonify({"error": "Recipe not found"}), 404
+    
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and recipe.Creator_User_ID != get_jwt_identity():
+         return jsonify({"error": "Unauthorized"}), 403
+
+    recipe_data = recipe.to_dict(only=fields)
+    if fields is None:
+        recipe_data['rating'] = serialize_rating(recipe.rating)
+        recipe_data['tags'] = tag_names(recipe.Tag_Mask)
+    if not with_ingredients:
+        return jsonify(recipe_data)
+    if ingredient_fields is not None:
+        recipe_data['ingredients'] = [ri.to_dict(only=ingredient_fields) for ri in recipe.ingredients]
+        return jsonify(recipe_data)
+    recipe_data['ingredients'] = [
+        serialize_recipe_ingredient(ri, ri.ingredient.Ingredient_Name) for ri in recipe.ingredients
+    ]
+    return jsonify(recipe_data)
+
+def serialize_recipe_ingredient(ri, ingredient_name):
+    return {
+        "RecipeIngredient_ID": ri.RecipeIngredient_ID,
+        "Ingredient_ID": ri.Ingredient_ID,
+        "Ingredient_Name": ingredient_name,
+        "Quantity": float(ri.Quantity),
+        "Unit": ri.Unit
+    }
+
+@bp.route('/api/recipes/<int:recipe_id>', methods=['PUT'])
+@jwt_required()
+def update_recipe(recipe_id):
+    recipe = db.session.get(Recipe, recipe_id)
+    if not recipe:
+        return jsonify({"error": "Recipe not found"}), 404
+    
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and recipe.Creator_User_ID != get_jwt_identity():
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    data = request.json
+    
+    # --- THIS IS THE FIX for AttributeError ---
+    # Do NOT loop. Explicitly set the fields you want to update.
+    recipe.Recipe_Name = data.get('Recipe_Name', recipe.Recipe_Name)
+    recipe.Description = data.get('Description', recipe.Description)
+    recipe.Cuisine_Type = data.get('Cuisine_Type', recipe.Cuisine_Type)
+    recipe.Preparation_Time_minutes = data.get('Preparation_Time_minutes', recipe.Preparation_Time_minutes)
+    recipe.Cooking_Time_minutes = data.get('Cooking_Time_minutes', recipe.Cooking_Time_minutes)
+    recipe.Serving_Size = data.get('Serving_Size', recipe.Serving_Size)
+    recipe.Difficulty_Level = data.get('Difficulty_Level', recipe.Difficulty_Level)
+    recipe.Instructions = data.get('Instructions', recipe.Instructions)
+    # We specifically DO NOT update 'ingredients' or 'Creator_User_ID' here.
+    # --- END OF FIX ---
+            
+    db.session.commit()
+    invalidate_catalog_results() # Anyone's diet logs may show this recipe
+    return jsonify(recipe.to_dict())
+
+@bp.route('/api/recipes/<int:recipe_id>', methods=['DELETE'])
+@jwt_required()
+def delete_recipe(recipe_id):
+    recipe = db.session.get(Recipe, recipe_id)
+    if not recipe:
+        return jsonify({"error": "Recipe not found"}), 404
+        
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and recipe.Creator_User_ID != get_jwt_identity():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    # Meal plans may be on any shard, where there is no foreign key to refuse this (RESTRICT)
+    in_plans = select(func.count()).select_from(MealPlan_Recipe).where(MealPlan_Recipe.Recipe_ID == recipe_id)
+    if scatter_count(in_plans):
+        return jsonify({"error": "Recipe is used in a meal plan; remove it from the plan first"}), 409
+
+    db.session.delete(recipe)
+    db.session.commit()
+    if sharding_enabled():
+        # What the foreign keys do on one database: logs keep their day (SET NULL), feedback goes (CASCADE)
+        scatter_execute(
+            update(User_Diet_Log).where(User_Diet_Log.Recipe_ID == recipe_id).values(Recipe_ID=None),
+            delete(Feedback).where(Feedback.Recipe_ID == recipe_id),
+        )
+    invalidate_catalog_results()
+    return jsonify({"message": "Recipe deleted"}), 200
+
+# --- Manage Ingredients IN a Recipe (Recipe_Ingredient) ---
+@bp.route('/api/recipes/<int:recipe_id>/ingredients', methods=['POST'])
+@jwt_required()
+def add_ingredient_to_recipe(recipe_id):
+    data = request.json
+    recipe = db.session.get(Recipe, recipe_id)
+    if not recipe:
+        return jsonify({"error": "Recipe not found"}), 404
+    
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and recipe.Creator_User_ID != get_jwt_identity():
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    ingredient = db.session.get(Ingredient, data['Ingredient_ID'])
+    if not ingredient:
+        return jsonify({"error": "Ingredient not found"}), 404
+        
+    new_ri = Recipe_Ingredient(
+        Recipe_ID=recipe_id,
+        Ingredient_ID=data['Ingredient_ID'],
+        Quantity=data['Quantity'],
+        Unit=data['Unit']
+    )
+    db.session.add(new_ri)
+    recipe.Tag_Mask = (recipe.Tag_Mask or 0) | ingredient.Tag_Mask # Adding can only add tags
+    db.session.commit()
+    invalidate_catalog_results() # Logs not backfilled yet are summed from the recipe (see logged_nutrition)
+    return jsonify(new_ri.to_dict()), 201
+
+@bp.route('/api/recipe-ingredients/<int:ri_id>', methods=['PUT'])
+@jwt_required()
+def update_ingredient_in_recipe(ri_id):
+    ri = db.session.get(Recipe_Ingredient, ri_id)
+    if not ri:
+        return jsonify({"error": "Recipe ingredient entry not found"}), 404
+        
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and ri.recipe.Creator_User_ID != get_jwt_identity():
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    data = request.json
+    ri.Quantity = data.get('Quantity', ri.Quantity)
+    ri.Unit = data.get('Unit', ri.Unit)
+    db.session.commit()
+    invalidate_catalog_results()
+    return jsonify(ri.to_dict())
+
+@bp.route('/api/recipe-ingredients/<int:ri_id>', methods=['DELETE'])
+@jwt_required()
+def delete_ingredient_from_recipe(ri_id):
+    ri = db.session.get(Recipe_Ingredient, ri_id)
+    if not ri:
+        return jsonify({"error": "Recipe ingredient entry not found"}), 404
+        
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and ri.recipe.Creator_User_ID != get_jwt_identity():
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    recipe_id = ri.Recipe_ID
+    db.session.delete(ri)
+    refresh_recipe_tags([recipe_id]) # Another ingredient may still carry the same tag
+    db.session.commit()
+    invalidate_catalog_results()
+    return jsonify({"message": "Ingredient removed from recipe"}), 200
+
+@bp.route('/api/recipes/<int:recipe_id>/calories', methods=['GET'])
+@jwt_required()
+@coalesced('recipe_calories', scope='public') # Any user may ask, and popular recipes are asked for at once
+def call_get_recipe_calories(recipe_id):
+    """Calls 'GetRecipeCalories' SQL function."""
+    try:
+        result = db.session.execute(
+            text("SELECT GetRecipeCalories(:id)"),
+            {"id": recipe_id}
+        ).scalar()
+
+        return jsonify({
+            "Recipe_ID": recipe_id,
+            "Total_Calories": float(result) if result is not None else 0
+        })
+    except Exception as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+# --- NEW: Route to get Recipe_Log activity ---
+@bp.route('/api/recipe-log', methods=['GET'])
+@jwt_required()
+@cached_result('recipe_log')
+def get_recipe_log():
+    user_id = get_jwt_identity()
+    
+    logs = Recipe_Log.query.filter_by(Created_By=user_id)\
+        .order_by(Recipe_Log.Created_At.desc())\
+        .limit(10)\
+        .all()
+        
+    return jsonify([log.to_dict() for log in logs])
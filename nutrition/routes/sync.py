@@ -0,0 +1,124 @@
+import base64
+import datetime
+import json
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy.orm import joinedload, selectinload
+
+from ..diettags import tag_names
+from ..models import Recipe, Ingredient, Recipe_Ingredient, Meal_Plan, MealPlan_Recipe, User_Diet_Log
+from ..sync import DELETED, SOURCES, SOURCE_FOR_TABLE, STREAMS, keyset_position, read_stream, sync_window
+from .dietlogs import serialize_diet_log
+from .ingredients import serialize_ingredient
+from .mealplans import serialize_mealplan_recipe
+from .recipes import serialize_recipe_ingredient
+
+bp = Blueprint('sync', __name__)
+
+# --- NEW: Delta sync (see nutrition/sync.py) ---
+def _sync_recipe(recipe):
+    recipe_data = recipe.to_dict()
+    recipe_data['tags'] = tag_names(recipe.Tag_Mask)
+    recipe_data['ingredients'] = [serialize_recipe_ingredient(ri, ri.ingredient.Ingredient_Name) for ri in recipe.ingredients]
+    return recipe_data
+
+def _sync_mealplan(plan):
+    plan_data = plan.to_dict()
+    plan_data['recipes'] = [serialize_mealplan_recipe(mpr) for mpr in plan.recipes]
+    return plan_data
+
+def _sync_diet_log(log):
+    return serialize_diet_log(log, log.recipe.Recipe_Name if log.recipe else None)
+
+# Source -> (loader options, serializer), each row shaped like the source's own GET routes
+SYNC_SERIALIZERS = {
+    'ingredients': ([joinedload(Ingredient.nutrition)], serialize_ingredient),
+    'recipes': (
+        [selectinload(Recipe.ingredients).joinedload(Recipe_Ingredient.ingredient).load_only(Ingredient.Ingredient_Name)],
+        _sync_recipe,
+    ),
+    'meal_plans': (
+        [selectinload(Meal_Plan.recipes).joinedload(MealPlan_Recipe.recipe).load_only(Recipe.Recipe_Name)],
+        _sync_mealplan,
+    ),
+    'diet_logs': ([joinedload(User_Diet_Log.recipe).load_only(Recipe.Recipe_Name)], _sync_diet_log),
+}
+
+
+def _timestamp(value, name):
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a watermark returned by /api/sync.")
+
+
+def encode_sync_cursor(since, until, full, streams, after):
+    state = {
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat(),
+        'full': full,
+        'streams': streams,
+        'after': [after[0].isoformat(), after[1]] if after else None,
+    }
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode()
+
+
+def decode_sync_cursor(cursor):
+    """(since, until, full, streams left, keyset position in the first). Raises ValueError."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        streams = [name for name in state['streams'] if name in STREAMS]
+        after = state['after'] and (_timestamp(state['after'][0], 'cursor'), int(state['after'][1]))
+        since = state['since'] and _timestamp(state['since'], 'cursor')
+        return since, _timestamp(state['until'], 'cursor'), bool(state['full']), streams, after
+    except (ValueError, KeyError, TypeError, IndexError):
+        raise ValueError("Invalid cursor; restart the sync from your last watermark.")
+
+
+@bp.route('/api/sync', methods=['GET'])
+@jwt_required()
+def sync():
+    user_id = get_jwt_identity()
+    is_admin = get_jwt().get("role") == 'admin'
+    page_size = current_app.config['SYNC_PAGE_SIZE']
+    limit = min(max(1, request.args.get('limit', page_size, type=int)), page_size)
+    try:
+        if request.args.get('cursor'):
+            since, until, full, streams, after = decode_sync_cursor(request.args['cursor'])
+        else:
+            since = _timestamp(request.args['since'], 'since') if request.args.get('since') else None
+            since, until, full, changed = sync_window(user_id, is_admin, since)
+            streams, after = [name for name in STREAMS if name in changed], None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    changes = {name: [] for name in SOURCES}
+    deleted = {name: [] for name in SOURCES}
+    next_cursor = None
+    for index, name in enumerate(streams):
+        if limit == 0:
+            next_cursor = encode_sync_cursor(since, until, full, streams[index:], None)
+            break
+        options, serialize = SYNC_SERIALIZERS.get(name, ((), None))
+        rows = read_stream(name, user_id, is_admin, since, until, after if index == 0 else None, limit + 1, options)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_sync_cursor(since, until, full, streams[index:], keyset_position(name, rows[-1]))
+        if name == DELETED:
+            for tombstone in rows:
+                if tombstone.Table_Name in SOURCE_FOR_TABLE:
+                    deleted[SOURCE_FOR_TABLE[tombstone.Table_Name]].append(tombstone.Row_ID)
+        else:
+            changes[name].extend(serialize(row) for row in rows)
+        if next_cursor:
+            break
+        limit -= len(rows)
+
+    return jsonify({
+        "changes": changes,
+        "deleted": deleted,
+        "watermark": until.isoformat(),
+        "full": full,
+        "next_cursor": next_cursor,
+    })
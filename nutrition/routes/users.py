@@ -0,0 +1,297 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from ..diettags import update_restrictions
+from ..extensions import db
+from ..jobs import job_handler, wants_background, enqueue_job, job_accepted_response
+from ..models import (
+    User, Recipe, User_Diet_Log, Meal_Plan, MealPlan_Recipe, Feedback,
+    User_Weight_History, Recipe_Log
+)
+from ..ratings import refresh_recipe_ratings, remove_feedback_from_ratings
+from ..resultcache import cached_result, invalidate_user_results
+from ..sharding import set_user_email, sharding_enabled, unregister_users, use_shard, users_by_shard
+
+bp = Blueprint('users', __name__)
+
+# --- Set-based account deletion (shared by the user, admin and background paths) ---
+USER_DELETE_BATCH_SIZE = 5000
+
+def _delete_in_batches(model, pk_column, user_column, user_ids):
+    """Deletes a user's rows from a large table a batch of primary keys at a time."""
+    total = 0
+    while True:
+        ids = [row[0] for row in db.session.query(pk_column)
+               .filter(user_column.in_(user_ids))
+               .limit(USER_DELETE_BATCH_SIZE)
+               .all()]
+        if not ids:
+            return total
+        total += model.query.filter(pk_column.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+def delete_user_accounts(user_ids):
+    """
+    Deletes users and everything they own with set-based DELETEs, never loading
+    child rows into the session. The big per-user tables are deleted in batches so
+    memory and lock time stay bounded. Safe to re-run if it fails halfway.
+    Returns the number of User rows deleted.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    if not sharding_enabled():
+        deleted = _delete_accounts(user_ids)
+        invalidate_user_results(*user_ids) # Their tokens stay valid until they expire
+        return deleted
+    
+    deleted = 0
+    for shard, ids in users_by_shard(user_ids).items():
+        with use_shard(shard):
+            deleted += _delete_accounts(ids)
+    unregister_users(user_ids)
+    invalidate_user_results(*user_ids)
+    return deleted
+
+def _delete_accounts(user_ids):
+    _delete_in_batches(User_Diet_Log, User_Diet_Log.Log_ID, User_Diet_Log.User_ID, user_ids)
+    _delete_in_batches(User_Weight_History, User_Weight_History.History_ID, User_Weight_History.User_ID, user_ids)
+    
+    try:
+        plan_ids = db.session.query(Meal_Plan.MealPlan_ID).filter(Meal_Plan.User_ID.in_(user_ids))
+        MealPlan_Recipe.query.filter(MealPlan_Recipe.MealPlan_ID.in_(plan_ids.scalar_subquery()))\
+            .delete(synchronize_session=False)
+        Meal_Plan.query.filter(Meal_Plan.User_ID.in_(user_ids)).delete(synchronize_session=False)
+        rated = set()
+        if sharding_enabled():
+            # Recipe_Rating is on the global database: recomputed below, once the shard has committed
+            rated = {recipe_id for (recipe_id,) in db.session.query(Feedback.Recipe_ID)
+                     .filter(Feedback.User_ID.in_(user_ids)).distinct()}
+        else:
+            remove_feedback_from_ratings(Feedback.User_ID.in_(user_ids))
+        Feedback.query.filter(Feedback.User_ID.in_(user_ids)).delete(synchronize_session=False)
+        # Recipes and their log outlive their creator (same as the SET NULL foreign keys)
+        Recipe.query.filter(Recipe.Creator_User_ID.in_(user_ids))\
+            .update({'Creator_User_ID': None}, synchronize_session=False)
+        Recipe_Log.query.filter(Recipe_Log.Created_By.in_(user_ids))\
+            .update({'Created_By': None}, synchronize_session=False)
+        deleted = User.query.filter(User.User_ID.in_(user_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    refresh_recipe_ratings(rated)
+    
+    db.session.expire_all()
+    return deleted
+
+def update_user_email(user, email):
+    """Sets user.Email, keeping the shard directory's copy in step. Returns an error response if the email is taken."""
+    if email is None or email == user.Email:
+        return None
+    if sharding_enabled():
+        try:
+            set_user_email(user.User_ID, email)
+        except IntegrityError:
+            return jsonify({"error": "Email already exists"}), 409
+    user.Email = email
+    return None
+
+# --- User CRUD (for a user to manage THEMSELVES) ---
+@bp.route('/api/users/<int:user_id>', methods=['GET'])
+@jwt_required()
+def get_user(user_id):
+    current_user_id = get_jwt_identity()
+    if current_user_id != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(user.to_dict(exclude=['Password']))
+
+@bp.route('/api/users/<int:user_id>', methods=['PUT'])
+@jwt_required()
+def update_user(user_id):
+    current_user_id = get_jwt_identity()
+    if current_user_id != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    
+    data = request.json
+    error = update_user_email(user, data.get('Email'))
+    if error:
+        return error
+    user.Name = data.get('Name', user.Name)
+    user.Date_Of_Birth = data.get('Date_Of_Birth', user.Date_Of_Birth)
+    user.Gender = data.get('Gender', user.Gender)
+    user.Height_cm = data.get('Height_cm', user.Height_cm)
+    user.Weight_kg = data.get('Weight_kg', user.Weight_kg)
+    user.Activity_Level = data.get('Activity_Level', user.Activity_Level)
+    user.Dietary_Preferences = data.get('Dietary_Preferences', user.Dietary_Preferences)
+    user.Allergies = data.get('Allergies', user.Allergies)
+    update_restrictions(user)
+    
+    db.session.commit()
+    invalidate_user_results(user_id) # Recipe lists filtered by their restrictions
+    return jsonify(user.to_dict(exclude=['Password']))
+
+@bp.route('/api/users/<int:user_id>', methods=['DELETE'])
+@jwt_required()
+def delete_user(user_id):
+    current_user_id = get_jwt_identity()
+    if current_user_id != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    
+    # --- NEW: ?background=1 hands the cascade off to the job worker ---
+    if wants_background():
+        job = enqueue_job('delete_user', {"user_id": user_id}, created_by=current_user_id)
+        return job_accepted_response(job, "User deletion queued")
+    
+    delete_user_accounts([user_id])
+    return jsonify({"message": "User deleted"}), 200
+
+@bp.route('/api/users/<int:user_id>/weight', methods=['PUT'])
+@jwt_required()
+def call_update_user_weight(user_id):
+    """Calls 'UpdateUserWeight' stored procedure."""
+    current_user_id = get_jwt_identity()
+    
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and current_user_id != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    data = request.json
+    new_weight = data.get('weight')
+    
+    if not new_weight:
+        return jsonify({"error": "New weight is required"}), 400
+        
+    try:
+        db.session.execute(
+            text("CALL UpdateUserWeight(:id, :weight)"),
+            {"id": user_id, "weight": new_weight}
+        )
+        db.session.commit()
+        invalidate_user_results(user_id) # Drops their cached weight trends
+        return jsonify({"message": f"User {user_id} weight updated to {new_weight}"})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+@bp.route('/api/users/<int:user_id>/weight-history', methods=['GET'])
+@jwt_required()
+def get_user_weight_history(user_id):
+    """Fetches User_Weight_History for a user."""
+    current_user_id = get_jwt_identity()
+    
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and current_user_id != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+        
+    history = User_Weight_History.query.filter_by(User_ID=user_id).order_by(User_Weight_History.Updated_At.desc()).all()
+    return jsonify([h.to_dict() for h in history])
+
+# --- NEW: Downsampled weight trend (rolling average + rate of change) ---
+# Results go through the result cache, keyed on the user's data version;
+# call_update_user_weight bumps it.
+WEIGHT_TREND_MAX_POINTS = 2000
+WEIGHT_TREND_MAX_WINDOW_DAYS = 3650
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape of (x, y)."""
+    import numpy as np # Deferred: only the weight-trend route needs NumPy
+    
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    bucket_size = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+    return indices
+
+def compute_weight_trend(user_id, points, window_days):
+    import numpy as np # Deferred: only the weight-trend route needs NumPy
+    
+    rows = db.session.query(User_Weight_History.Updated_At, User_Weight_History.New_Weight)\
+        .filter(User_Weight_History.User_ID == user_id, User_Weight_History.New_Weight.isnot(None))\
+        .order_by(User_Weight_History.Updated_At, User_Weight_History.History_ID)\
+        .all()
+    if not rows:
+        return []
+    
+    dates = [r[0] for r in rows]
+    t = np.array([d.timestamp() for d in dates], dtype=np.float64)
+    w = np.array([float(r[1]) for r in rows], dtype=np.float64)
+    
+    # Time-based rolling mean over the previous `window_days`, via prefix sums
+    starts = np.searchsorted(t, t - window_days * 86400, side='left')
+    csum = np.concatenate(([0.0], np.cumsum(w)))
+    ends = np.arange(1, len(w) + 1)
+    rolling = (csum[ends] - csum[starts]) / (ends - starts)
+    
+    # Rate of change of the smoothed weight, in kg per week
+    if len(w) > 1 and t[-1] > t[0]:
+        rate = np.gradient(rolling, t) * 7 * 86400
+        rate = np.nan_to_num(rate, nan=0.0, posinf=0.0, neginf=0.0)
+    else:
+        rate = np.zeros_like(w)
+    
+    keep = lttb_indices(t, w, points)
+    return [
+        {
+            "Date": dates[i].isoformat(),
+            "Weight": round(w[i], 2),
+            "Rolling_Avg": round(float(rolling[i]), 2),
+            "Rate_kg_per_week": round(float(rate[i]), 3)
+        } for i in keep
+    ]
+
+@bp.route('/api/users/<int:user_id>/weight-trend', methods=['GET'])
+@jwt_required()
+@cached_result('weight_trend')
+def get_user_weight_trend(user_id):
+    """Rolling-average weight trend, downsampled with LTTB to at most ?points= entries."""
+    current_user_id = get_jwt_identity()
+    
+    # --- ADMIN OVERRIDE ---
+    claims = get_jwt()
+    if claims.get("role") != 'admin' and current_user_id != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    points = min(max(3, request.args.get('points', 200, type=int)), WEIGHT_TREND_MAX_POINTS)
+    window_days = min(max(1, request.args.get('window', 7, type=int)), WEIGHT_TREND_MAX_WINDOW_DAYS)
+    series = compute_weight_trend(user_id, points, window_days)
+    
+    return jsonify({
+        "User_ID": user_id,
+        "points": len(series),
+        "window_days": window_days,
+        "series": series
+    })
+
+@job_handler('delete_user')
+def delete_user_job(payload):
+    return {"deleted": delete_user_accounts([payload['user_id']]) > 0}
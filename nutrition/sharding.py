@@ -0,0 +1,682 @@
+"""
+User-ID sharding (opt-in: SHARD_DATABASE_URLS).
+
+With SHARD_DATABASE_URLS set to a comma-separated list of database URLs, the
+tables a user owns (USER_SHARDED_TABLES) live on one of those shard databases,
+chosen per user, while everything else stays on the global database
+(SQLALCHEMY_DATABASE_URI):
+
+  * The User_Shard table on the global database is the directory: it hands out
+    User_IDs and records each user's shard. Lookups are cached per process for
+    SHARD_DIRECTORY_CACHE_SECONDS.
+  * Before each request the shard is picked from the caller's JWT (for admins,
+    the <user_id> in the URL or ?user_id= when given). db.session then sends
+    every statement that touches a user table to that shard and the rest to the
+    global database, so route code is unchanged.
+  * The catalog (CATALOG_TABLES) is owned by the global database and copied to
+    every shard, because diet log summaries, shopping lists and the stored
+    procedures join user rows with it. The catalog rows written through
+    db.session (ORM objects and bulk statements alike) are copied to the
+    shards after commit; a bulk statement whose rows cannot be told (no
+    WHERE clause) queues a 'copy_catalog' job instead. `python shards.py
+    sync-catalog` copies everything.
+  * Admin list endpoints query every shard in parallel and merge the sorted
+    results (scatter_gather).
+
+Row IDs (Log_ID, MealPlan_ID, ...) are only unique within a shard, so an admin
+editing another user's row passes ?user_id=<owner>. Foreign keys only exist
+between tables on the same database. `python shards.py --help` has the setup
+and rebalancing commands.
+"""
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g, has_app_context, jsonify, request
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import MetaData, TextClause, UniqueConstraint, delete, event, func, insert, select, tuple_, update
+from sqlalchemy.engine import CursorResult
+from sqlalchemy.exc import ResourceClosedError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+SHARD_BIND_PREFIX = 'shard'
+USER_SHARDED_TABLES = frozenset({
+    'User', 'User_Diet_Log', 'User_Weight_History', 'Meal_Plan', 'MealPlan_Recipe', 'Feedback',
+})
+CATALOG_TABLES = ('Ingredient', 'Nutrition', 'Recipe', 'Recipe_Ingredient')
+MOVE_RETRY_AFTER_SECONDS = 5
+
+
+class NoShardSelected(RuntimeError):
+    """A user table was queried without a shard (no user in the request, and no use_shard())."""
+
+
+class UserBeingMoved(RuntimeError):
+    """The user's rows are being copied to another shard (see move_user)."""
+
+
+def shard_binds(urls):
+    """SQLALCHEMY_BINDS entries for the shard URLs: {'shard0': url0, ...}."""
+    return {f'{SHARD_BIND_PREFIX}{n}': url for n, url in enumerate(urls)}
+
+
+class ShardRouter:
+    """Per-app shard list and cached User_Shard lookups."""
+
+    def __init__(self, app):
+        self.keys = list(shard_binds(app.config['SHARD_DATABASE_URLS']))
+        self.cache_seconds = app.config['SHARD_DIRECTORY_CACHE_SECONDS']
+        self._cache = {} # user_id -> (shard key, locked, expires)
+        self._lock = threading.Lock()
+
+    def initial_shard(self, user_id):
+        return self.keys[int(user_id) % len(self.keys)]
+
+    def lookup(self, user_id):
+        """(shard key, locked) for the user, or None if the directory does not know them."""
+        from .models import User_Shard
+        user_id = int(user_id)
+        now = time.monotonic()
+        cached = self._cache.get(user_id)
+        if cached and cached[2] > now:
+            return cached[:2]
+        row = _global_row(select(User_Shard.Shard, User_Shard.Locked).where(User_Shard.User_ID == user_id))
+        if row is None:
+            return None
+        entry = (self.keys[row.Shard], bool(row.Locked))
+        with self._lock:
+            self._cache[user_id] = (*entry, now + self.cache_seconds)
+        return entry
+
+    def forget(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._cache.pop(int(user_id), None)
+
+
+def _global_row(stmt):
+    from .extensions import db
+    with Session(db.engine) as session:
+        return session.execute(stmt).first()
+
+
+def get_router(app=None):
+    """The app's ShardRouter, or None when sharding is off."""
+    return (app or current_app).extensions.get('sharding')
+
+
+def sharding_enabled():
+    return get_router() is not None
+
+
+def init_sharding(app):
+    """Adds the shard binds to the config. Call before db.init_app(app)."""
+    urls = app.config['SHARD_DATABASE_URLS']
+    if not urls:
+        return
+    app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}), **shard_binds(urls)}
+    app.extensions['sharding'] = ShardRouter(app)
+    app.before_request(select_request_shard)
+
+
+# --- Which shard is current ---
+
+def current_shard():
+    return g.get('user_shard') if has_app_context() else None
+
+
+@contextlib.contextmanager
+def use_shard(key):
+    """Sends db.session's user-table statements to shard `key` inside the block."""
+    previous = g.get('user_shard')
+    g.user_shard = key
+    try:
+        yield
+    finally:
+        g.user_shard = previous
+
+
+def shard_for_user(user_id):
+    """The user's shard key; users the directory does not know map to where a new user with that ID would go."""
+    router = get_router()
+    entry = router.lookup(user_id)
+    return entry[0] if entry else router.initial_shard(user_id)
+
+
+@contextlib.contextmanager
+def on_user_shard(user_id):
+    """
+    use_shard() for the given user, or a no-op when sharding is off or user_id
+    is None. Raises UserBeingMoved while the user is locked for a move.
+    """
+    if user_id is None or not sharding_enabled():
+        yield
+        return
+    entry = get_router().lookup(user_id)
+    if entry and entry[1]:
+        raise UserBeingMoved(f"User {user_id} is being moved to another shard")
+    with use_shard(entry[0] if entry else get_router().initial_shard(user_id)):
+        yield
+
+
+def select_request_shard():
+    """before_request hook: selects the shard of the user the request is about."""
+    from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None # The view's own @jwt_required reports bad tokens
+    if identity is None:
+        return None # Signup/login find their shard through the directory
+
+    user_id = identity
+    # --- ADMIN OVERRIDE ---
+    if get_jwt().get('role') == 'admin':
+        user_id = (request.view_args or {}).get('user_id') or request.args.get('user_id', type=int) or identity
+    try:
+        entry = get_router().lookup(user_id)
+    except (TypeError, ValueError):
+        return None
+    if entry is None:
+        g.user_shard = get_router().initial_shard(user_id)
+        return None
+    if entry[1]:
+        return jsonify({"error": "This account is being moved; try again shortly."}), 503, \
+            {'Retry-After': str(MOVE_RETRY_AFTER_SECONDS)}
+    g.user_shard = entry[0]
+    return None
+
+
+# --- Session routing ---
+
+def _touches_user_tables(mapper, clause):
+    if clause is not None:
+        if isinstance(clause, TextClause):
+            return True # Raw SQL and stored procedure CALLs run next to the user's rows
+        return any(t.name in USER_SHARDED_TABLES for t in find_tables(clause, include_crud=True))
+    table = getattr(mapper, 'local_table', None) if mapper is not None else None
+    return table is not None and table.name in USER_SHARDED_TABLES
+
+
+class ShardedSession(FlaskSession):
+    """db.session: user tables go to the current shard, everything else to the global database."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and 'sharding' in current_app.extensions:
+            if _touches_user_tables(mapper, clause):
+                key = current_shard()
+                if key is not None:
+                    return self._db.engines[key]
+                if not isinstance(clause, TextClause):
+                    raise NoShardSelected(
+                        "Query touches user tables but no shard is selected; wrap it in use_shard()/on_user_shard()"
+                    )
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# --- Directory (User_Shard) ---
+
+def register_user(email):
+    """Allocates a User_ID and shard for a new account. Raises IntegrityError if the email is taken."""
+    from .extensions import db
+    from .models import User_Shard
+    router = get_router()
+    with Session(db.engine) as session:
+        entry = User_Shard(Email=email, Shard=0)
+        session.add(entry)
+        session.flush()
+        entry.Shard = router.keys.index(router.initial_shard(entry.User_ID))
+        session.commit()
+        return entry.User_ID, router.keys[entry.Shard]
+
+
+def unregister_users(user_ids):
+    from .extensions import db
+    from .models import User_Shard
+    user_ids = list(user_ids)
+    with Session(db.engine) as session:
+        session.execute(delete(User_Shard).where(User_Shard.User_ID.in_(user_ids)))
+        session.commit()
+    get_router().forget(user_ids)
+
+
+def shard_for_email(email):
+    """(user_id, shard key) of the account with this email, or None."""
+    from .models import User_Shard
+    row = _global_row(select(User_Shard.User_ID, User_Shard.Shard).where(User_Shard.Email == email))
+    return (row.User_ID, get_router().keys[row.Shard]) if row else None
+
+
+def set_user_email(user_id, email):
+    """Keeps the directory's copy of the login email in step. Raises IntegrityError if it is taken."""
+    from .extensions import db
+    from .models import User_Shard
+    with Session(db.engine) as session:
+        session.execute(update(User_Shard).where(User_Shard.User_ID == user_id).values(Email=email))
+        session.commit()
+
+
+def users_by_shard(user_ids):
+    """{shard key: [user ids]} for the given users."""
+    groups = {}
+    for user_id in user_ids:
+        groups.setdefault(shard_for_user(user_id), []).append(user_id)
+    return groups
+
+
+# --- Scatter-gather ---
+
+def shard_engines():
+    """Every database holding user tables: the shards, or just the main database when sharding is off."""
+    from .extensions import db
+    router = get_router()
+    return [db.engines[key] for key in router.keys] if router else [db.engine]
+
+
+def _on_every_shard(run):
+    engines = shard_engines()
+    if len(engines) == 1:
+        return [run(engines[0])]
+    with ThreadPoolExecutor(max_workers=len(engines)) as pool:
+        return list(pool.map(run, engines))
+
+
+def scatter_gather(statement, sort_key, reverse=False, offset=0, limit=None):
+    """
+    Runs statement (already ORDER BY the same order as sort_key) on every shard
+    and merges the results, returning rows offset .. offset+limit of the merged
+    order. Each shard only needs to return its first offset+limit rows.
+    """
+    if limit is not None:
+        statement = statement.limit(offset + limit)
+
+    def run(engine):
+        with Session(engine) as session:
+            return session.execute(statement).all()
+
+    merged = heapq.merge(*_on_every_shard(run), key=sort_key, reverse=reverse)
+    return list(itertools.islice(merged, offset, None if limit is None else offset + limit))
+
+
+def scatter_all(statement):
+    """Runs statement on every shard; one list of rows per shard."""
+    def run(engine):
+        with Session(engine) as session:
+            return session.execute(statement).all()
+    return _on_every_shard(run)
+
+
+def scatter_count(statement):
+    """Sum of a COUNT(*) statement over every shard."""
+    def run(engine):
+        with Session(engine) as session:
+            return session.scalar(statement) or 0
+    return sum(_on_every_shard(run))
+
+
+def scatter_execute(*statements):
+    """Runs the write statements in one transaction per shard. Returns each statement's total rowcount."""
+    def run(engine):
+        with Session(engine) as session:
+            counts = [session.execute(statement).rowcount for statement in statements]
+            session.commit()
+            return counts
+    return [sum(counts) for counts in zip(*_on_every_shard(run))]
+
+
+def page_args(args, default_per_page=None, max_per_page=200):
+    """(page, per_page) from ?page=&per_page=; per_page is None (no paging) when neither is given and there is no default."""
+    page = max(1, args.get('page', 1, type=int))
+    per_page = args.get('per_page', default_per_page, type=int)
+    if per_page is None and 'page' in args:
+        per_page = max_per_page
+    if per_page is not None:
+        per_page = min(max(1, per_page), max_per_page)
+    return page, per_page
+
+
+def add_page_headers(response, page, per_page, total):
+    """X-Total-Count, plus a rel="next" Link while there are more pages."""
+    response.headers['X-Total-Count'] = str(total)
+    if page * per_page < total:
+        response.headers['Link'] = f'<{request.path}?page={page + 1}&per_page={per_page}>; rel="next"'
+    return response
+
+
+# --- Catalog replication ---
+
+ALL_ROWS = None
+
+
+def _catalog_changes(session):
+    return session.info.setdefault('catalog_changes', {})
+
+
+def _note_catalog_changes(session, table_name, pks):
+    """Adds primary keys (or ALL_ROWS) to the rows to copy after commit."""
+    changes = _catalog_changes(session)
+    if pks is ALL_ROWS:
+        changes[table_name] = ALL_ROWS
+    elif changes.get(table_name, set()) is not ALL_ROWS:
+        changes.setdefault(table_name, set()).update(pks)
+
+
+@event.listens_for(ShardedSession, 'after_flush')
+def _collect_catalog_rows(session, flush_context):
+    if not (has_app_context() and sharding_enabled()):
+        return
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is not None and table.name in CATALOG_TABLES:
+            _note_catalog_changes(session, table.name, {getattr(obj, table.primary_key.columns[0].key)})
+
+
+def _parameter_sets(parameters):
+    if not parameters:
+        return []
+    return list(parameters) if isinstance(parameters, (list, tuple)) else [parameters]
+
+
+def _inserted_keys(session, table, pk_column, parameter_sets, result):
+    """
+    (primary keys, result to hand back) for an INSERT that did not name them:
+    from RETURNING, the single row's inserted_primary_key, or a unique key
+    every parameter set carries. The keys are ALL_ROWS when none of these work.
+    """
+    try:
+        columns = list(result.keys())
+    except ResourceClosedError:
+        columns = [] # No RETURNING
+    if pk_column.key in columns:
+        frozen = result.freeze()
+        index = columns.index(pk_column.key)
+        return {row[index] for row in frozen()}, frozen()
+    if isinstance(result, CursorResult) and len(parameter_sets) <= 1:
+        return set(result.inserted_primary_key[:1]), result
+    for constraint in table.constraints:
+        names = [column.key for column in getattr(constraint, 'columns', ())]
+        if isinstance(constraint, UniqueConstraint) and parameter_sets and \
+                all(name in params for params in parameter_sets for name in names):
+            values = [tuple(params[name] for name in names) for params in parameter_sets]
+            columns = [table.c[name] for name in names]
+            return set(session.scalars(select(pk_column).where(tuple_(*columns).in_(values)))), result
+    return ALL_ROWS, result
+
+
+@event.listens_for(ShardedSession, 'do_orm_execute')
+def _collect_catalog_bulk_writes(orm_execute_state):
+    """
+    Notes which catalog rows a bulk INSERT/UPDATE/DELETE writes, by primary
+    key: from the parameter sets (bulk UPDATE by primary key), by reading the
+    WHERE clause's rows first, or from what the INSERT returns. Statements
+    whose rows cannot be told are copied whole, in the background.
+    """
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return None
+    if not (has_app_context() and sharding_enabled()):
+        return None
+    statement, session = orm_execute_state.statement, orm_execute_state.session
+    table = statement.table
+    if table.name not in CATALOG_TABLES:
+        return None
+    pk_column = table.primary_key.columns[0]
+    parameter_sets = _parameter_sets(orm_execute_state.parameters)
+    if parameter_sets and all(pk_column.key in params for params in parameter_sets):
+        keys = {params[pk_column.key] for params in parameter_sets}
+    elif orm_execute_state.is_insert:
+        keys, result = _inserted_keys(session, table, pk_column, parameter_sets, orm_execute_state.invoke_statement())
+        _note_catalog_changes(session, table.name, keys)
+        return result
+    elif statement.whereclause is not None:
+        keys = set(session.scalars(select(pk_column).where(statement.whereclause)))
+    else:
+        keys = ALL_ROWS
+    _note_catalog_changes(session, table.name, keys)
+    return None
+
+
+@event.listens_for(ShardedSession, 'after_commit')
+def _replicate_catalog_rows(session):
+    changes = session.info.pop('catalog_changes', None)
+    if not changes:
+        return
+    whole_tables = sorted(name for name, pks in changes.items() if pks is ALL_ROWS)
+    try:
+        rows = {name: pks for name, pks in changes.items() if pks is not ALL_ROWS and pks}
+        if rows:
+            copy_catalog(rows)
+        if whole_tables:
+            # Re-copying whole tables takes too long for a request; a worker does it
+            from .extensions import db
+            from .jobs import enqueue_job
+            with Session(db.engine) as job_session:
+                enqueue_job('copy_catalog', {'tables': whole_tables}, session=job_session)
+    except Exception as e:
+        # The write itself committed; replicas catch up on the next change or sync-catalog
+        current_app.logger.warning("Catalog replication failed: %s", e)
+
+
+@event.listens_for(ShardedSession, 'after_rollback')
+def _discard_catalog_rows(session):
+    session.info.pop('catalog_changes', None)
+
+
+def _is_global_database(engine):
+    from .extensions import db
+    return engine.url == db.engine.url
+
+
+def copy_catalog(changes=None, chunk_size=1000):
+    """
+    Copies catalog rows from the global database to every shard: {table name:
+    set of primary keys, or ALL_ROWS}; all catalog tables when changes is None.
+    Replicas have no foreign keys, so rows are simply deleted and re-inserted.
+    """
+    from .extensions import db
+    if changes is None:
+        changes = {name: ALL_ROWS for name in CATALOG_TABLES}
+    snapshot = {}
+    with db.engine.connect() as source:
+        for name, pks in changes.items():
+            table = db.metadata.tables[name]
+            pk_column = table.primary_key.columns[0]
+            stmt = select(table)
+            if pks is not ALL_ROWS:
+                stmt = stmt.where(pk_column.in_(pks))
+            snapshot[name] = (pk_column, pks, [dict(row._mapping) for row in source.execute(stmt)])
+
+    for engine in shard_engines():
+        if _is_global_database(engine):
+            continue # That shard shares the global database, catalog included
+        with engine.begin() as target:
+            for name, (pk_column, pks, rows) in snapshot.items():
+                table = db.metadata.tables[name]
+                clear = delete(table) if pks is ALL_ROWS else delete(table).where(pk_column.in_(pks))
+                target.execute(clear)
+                for start in range(0, len(rows), chunk_size):
+                    target.execute(insert(table), rows[start:start + chunk_size])
+
+
+# --- Schema and maintenance (used by shards.py) ---
+
+def _schema_for(tables, keep_foreign_key):
+    """Copies of `tables` whose foreign keys are limited to the ones keep_foreign_key(table, referred) accepts."""
+    from .extensions import db
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    copies = [metadata.tables[table.name] for table in tables]
+    for table in copies:
+        for constraint in list(table.foreign_key_constraints):
+            if not keep_foreign_key(table.name, constraint.referred_table.name):
+                table.constraints.discard(constraint)
+                for column in constraint.columns:
+                    column.foreign_keys.difference_update(constraint.elements)
+                table.foreign_keys.difference_update(constraint.elements)
+    return metadata, copies
+
+
+def create_schemas():
+    """Creates the global tables on the global database and the user tables plus catalog replicas on each shard."""
+    from .extensions import db
+    global_tables = [t for t in db.metadata.sorted_tables if t.name not in USER_SHARDED_TABLES]
+    metadata, copies = _schema_for(
+        global_tables, lambda table, referred: referred not in USER_SHARDED_TABLES
+    )
+    metadata.create_all(db.engine, tables=copies)
+
+    shard_tables = [t for t in db.metadata.sorted_tables if t.name in USER_SHARDED_TABLES or t.name in CATALOG_TABLES]
+    metadata, copies = _schema_for(
+        shard_tables, lambda table, referred: table in USER_SHARDED_TABLES and referred in USER_SHARDED_TABLES
+    )
+    for engine in shard_engines():
+        if _is_global_database(engine):
+            # Shares the catalog with the global database, so keep the original foreign keys
+            db.metadata.create_all(engine, tables=[t for t in shard_tables if t.name in USER_SHARDED_TABLES])
+        else:
+            metadata.create_all(engine, tables=copies)
+
+
+def adopt_existing_users():
+    """Adds directory entries for users already present on a shard (e.g. when an existing database becomes shard0)."""
+    from .extensions import db
+    from .models import User, User_Shard
+    router = get_router()
+    known = {user_id for (user_id,) in db.session.execute(select(User_Shard.User_ID))}
+    added = 0
+    for index, key in enumerate(router.keys):
+        with Session(db.engines[key]) as session:
+            rows = session.execute(select(User.User_ID, User.Email)).all()
+        new = [{'User_ID': user_id, 'Email': email, 'Shard': index, 'Locked': False}
+               for user_id, email in rows if user_id not in known]
+        if new:
+            db.session.execute(insert(User_Shard), new)
+            known.update(row['User_ID'] for row in new)
+            added += len(new)
+    db.session.commit()
+    return added
+
+
+def shard_status():
+    """Per shard: users in the directory, users currently locked for a move, and User rows on the shard."""
+    from .extensions import db
+    from .models import User, User_Shard
+    router = get_router()
+    directory = {
+        shard: (users, locked or 0) for shard, users, locked in db.session.execute(
+            select(User_Shard.Shard, func.count(), func.sum(User_Shard.Locked.cast(db.Integer))).group_by(User_Shard.Shard)
+        )
+    }
+    status = []
+    for index, key in enumerate(router.keys):
+        with Session(db.engines[key]) as session:
+            rows = session.scalar(select(func.count()).select_from(User))
+        users, locked = directory.get(index, (0, 0))
+        status.append({'shard': key, 'directory_users': users, 'locked': int(locked), 'user_rows': rows})
+    return status
+
+
+def _copy_user_rows(source, target, user_id):
+    """Copies one user's rows; row IDs are re-assigned on the target except User_ID."""
+    from .models import User, User_Diet_Log, User_Weight_History, Meal_Plan, MealPlan_Recipe, Feedback
+    def rows(stmt):
+        return [dict(row._mapping) for row in source.execute(stmt)]
+
+    def without(row, column):
+        row.pop(column.key)
+        return row
+
+    user = User.__table__
+    target.execute(insert(user), rows(select(user).where(user.c.User_ID == user_id)))
+    counts = {'User': 1}
+    for model, pk in ((User_Diet_Log, User_Diet_Log.Log_ID),
+                      (User_Weight_History, User_Weight_History.History_ID),
+                      (Feedback, Feedback.Feedback_ID)):
+        table = model.__table__
+        copied = [without(row, pk) for row in rows(select(table).where(table.c.User_ID == user_id))]
+        if copied:
+            target.execute(insert(table), copied)
+        counts[table.name] = len(copied)
+
+    plans, entries = Meal_Plan.__table__, MealPlan_Recipe.__table__
+    new_plan_ids = {}
+    for plan in rows(select(plans).where(plans.c.User_ID == user_id)):
+        old_id = plan.pop('MealPlan_ID')
+        new_plan_ids[old_id] = target.execute(insert(plans).values(plan)).inserted_primary_key[0]
+    counts['Meal_Plan'] = len(new_plan_ids)
+    copied = []
+    if new_plan_ids:
+        for entry in rows(select(entries).where(entries.c.MealPlan_ID.in_(list(new_plan_ids)))):
+            entry.pop('id')
+            entry['MealPlan_ID'] = new_plan_ids[entry['MealPlan_ID']]
+            copied.append(entry)
+        if copied:
+            target.execute(insert(entries), copied)
+    counts['MealPlan_Recipe'] = len(copied)
+    return counts
+
+
+def _delete_user_rows(connection, user_id):
+    from .models import User, User_Diet_Log, User_Weight_History, Meal_Plan, MealPlan_Recipe, Feedback
+    plan_ids = select(Meal_Plan.MealPlan_ID).where(Meal_Plan.User_ID == user_id).scalar_subquery()
+    connection.execute(delete(MealPlan_Recipe.__table__).where(MealPlan_Recipe.MealPlan_ID.in_(plan_ids)))
+    for model in (Meal_Plan, User_Diet_Log, User_Weight_History, Feedback, User):
+        table = model.__table__
+        connection.execute(delete(table).where(table.c.User_ID == user_id))
+
+
+def move_user(user_id, target_key, settle_seconds=None, log=print):
+    """
+    Moves a user's rows to another shard:
+
+      1. lock the directory entry (requests for the user get 503 + Retry-After)
+      2. wait until every process's directory cache has seen the lock
+      3. copy the rows to the target (after clearing leftovers of an interrupted move)
+      4. point the directory at the target
+      5. delete the rows from the source and unlock
+
+    The user's row IDs other than User_ID change; Moved_At makes their devices'
+    next sync a full one (see sync_window). Re-running after a failure is safe.
+    """
+    from .extensions import db
+    from .models import User_Shard
+    router = get_router()
+    entry = db.session.get(User_Shard, user_id)
+    if entry is None:
+        raise ValueError(f"User {user_id} is not in the shard directory")
+    source_key, target_index = router.keys[entry.Shard], router.keys.index(target_key)
+    if source_key == target_key:
+        if entry.Locked:
+            entry.Locked = False
+            db.session.commit()
+        return None
+
+    entry.Locked = True
+    db.session.commit()
+    router.forget([user_id])
+    settle = router.cache_seconds + 1 if settle_seconds is None else settle_seconds
+    log(f"user {user_id} locked; waiting {settle}s for directory caches and in-flight requests")
+    time.sleep(settle)
+
+    source, target = db.engines[source_key], db.engines[target_key]
+    with source.connect() as src, target.begin() as dst:
+        _delete_user_rows(dst, user_id)
+        counts = _copy_user_rows(src, dst, user_id)
+    log(f"copied {counts} to {target_key}")
+
+    entry = db.session.get(User_Shard, user_id)
+    entry.Shard = target_index
+    entry.Moved_At = func.now()
+    db.session.commit()
+    with source.begin() as src:
+        _delete_user_rows(src, user_id)
+    entry = db.session.get(User_Shard, user_id)
+    entry.Locked = False
+    db.session.commit()
+    router.forget([user_id])
+    return counts
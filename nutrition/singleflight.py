@@ -0,0 +1,160 @@
+"""
+Request coalescing for expensive reads.
+
+A read route opts in with @coalesced('<name>', scope=...) under its auth
+decorator. Identical requests in flight at once in one worker process (same
+route, path arguments, query string and scope) run the view once: the first
+(the leader) runs it and the others wait for its response and get a copy,
+whichever threads they arrive on. scope decides whose requests are identical:
+
+  * 'user': the caller's identity (default), for reads of the caller's rows;
+  * 'role': the caller's role, for reads every admin sees alike;
+  * 'public': everyone, for reads that do not depend on who asks.
+
+Each in-flight key has a deadline, timeout seconds after its leader started
+(COALESCE_TIMEOUT_SECONDS unless the route passes its own). Waiters give up
+at the deadline and run the view themselves, and a request arriving after it
+leads a fresh execution rather than joining the slow one. Waiters also run
+the view themselves if the leader raised or streamed its response. Errors
+the view returns (404, 500, ...) are shared like any other response.
+
+Place it under @cached_result so only cache misses coalesce, and above
+@admission_controlled so waiters take no slot. asgi.py's native handlers use
+coalesced_call(), the same thing for coroutines on the worker's event loop.
+Counters per route (this process) are at GET /api/admin/coalescing-stats.
+"""
+import asyncio
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request, Response
+from flask_jwt_extended import get_jwt, get_jwt_identity
+
+_stats_lock = threading.Lock()
+_inflight_lock = threading.Lock()
+coalescing_stats = {} # route -> counters
+_inflight = {} # key -> _Call
+_async_inflight = {} # key -> (task, deadline), on the ASGI event loop
+
+
+def _count(route, key, amount=1):
+    with _stats_lock:
+        counters = coalescing_stats.setdefault(route, {
+            'executions': 0, 'coalesced': 0, 'timeouts': 0, 'unshared': 0, 'max_waiters': 0,
+        })
+        if key == 'max_waiters':
+            counters[key] = max(counters[key], amount)
+        else:
+            counters[key] += amount
+
+
+def coalescing_snapshot():
+    """Counters per route plus the share of requests that were coalesced, for this process."""
+    with _stats_lock:
+        routes = {route: dict(counters) for route, counters in coalescing_stats.items()}
+    for counters in routes.values():
+        requests = counters['executions'] + counters['coalesced']
+        counters['coalesced_rate'] = round(counters['coalesced'] / requests, 4) if requests else None
+    with _inflight_lock:
+        in_flight = len(_inflight) + len(_async_inflight)
+    return {'in_flight': in_flight, 'routes': routes}
+
+
+class _Call:
+    """One execution of a view, and what its waiters need to copy its response."""
+
+    def __init__(self, timeout):
+        self.done = threading.Event()
+        self.deadline = time.monotonic() + timeout
+        self.waiters = 0
+        self.result = None # (body, status, headers), or None if it could not be shared
+
+
+def _scope_key(scope):
+    if scope == 'public':
+        return 'public'
+    if scope == 'role':
+        return f"role:{get_jwt().get('role')}"
+    return f"user:{get_jwt_identity()}"
+
+
+def coalesced(route, scope='user', timeout=None):
+    """Collapses identical concurrent requests into one execution of the view."""
+    if scope not in ('user', 'role', 'public'):
+        raise ValueError(f"Unknown coalescing scope: {scope}")
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config['COALESCE_ENABLED']:
+                return view(*args, **kwargs)
+            key = (route, _scope_key(scope), tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+            now = time.monotonic()
+            with _inflight_lock:
+                call = _inflight.get(key)
+                leader = call is None or now >= call.deadline # Past its deadline: start afresh
+                if leader:
+                    call = _inflight[key] = _Call(timeout or current_app.config['COALESCE_TIMEOUT_SECONDS'])
+                else:
+                    call.waiters += 1
+                    waiters = call.waiters
+
+            if leader:
+                _count(route, 'executions')
+                try:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if not response.is_streamed:
+                        call.result = (response.get_data(), response.status_code, list(response.headers.items()))
+                    return response
+                finally:
+                    with _inflight_lock:
+                        if _inflight.get(key) is call:
+                            del _inflight[key]
+                    call.done.set()
+
+            _count(route, 'max_waiters', waiters)
+            if not call.done.wait(max(0, call.deadline - now)):
+                _count(route, 'timeouts')
+                return view(*args, **kwargs)
+            if call.result is None:
+                _count(route, 'unshared')
+                return view(*args, **kwargs)
+            _count(route, 'coalesced')
+            body, status, headers = call.result
+            response = Response(body, status=status, headers=headers)
+            response.headers['X-Coalesced'] = '1'
+            return response
+        return wrapper
+    return decorator
+
+
+async def coalesced_call(route, key, make, timeout):
+    """
+    Awaits make() once for all concurrent callers with the same key (which
+    should carry the scope, as @coalesced's does) and gives each its result.
+    Waiters run make() themselves past the deadline or if it raised.
+    """
+    now = time.monotonic()
+    entry = _async_inflight.get(key)
+    if entry is None or now >= entry[1]:
+        _count(route, 'executions')
+        entry = (asyncio.ensure_future(make()), now + timeout)
+        _async_inflight[key] = entry
+
+        def finished(_):
+            if _async_inflight.get(key) is entry:
+                del _async_inflight[key]
+        entry[0].add_done_callback(finished)
+        return await asyncio.shield(entry[0]) # A disconnecting leader must not cancel its waiters' result
+    task, deadline = entry
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), deadline - now)
+    except asyncio.TimeoutError:
+        _count(route, 'timeouts')
+        return await make()
+    except Exception:
+        _count(route, 'unshared')
+        return await make()
+    _count(route, 'coalesced')
+    return result
@@ -0,0 +1,23 @@
+"""SQL expressions the ORM does not provide portably."""
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import Date
+
+
+class date_add_days(FunctionElement):
+    """date_add_days(date_column, days) -> the date shifted by `days` (an integer expression)."""
+    type = Date()
+    name = 'date_add_days'
+    inherit_cache = True
+
+
+@compiles(date_add_days)
+def _date_add_days_mysql(element, compiler, **kw):
+    date, days = list(element.clauses)
+    return f"DATE_ADD({compiler.process(date, **kw)}, INTERVAL ({compiler.process(days, **kw)}) DAY)"
+
+
+@compiles(date_add_days, 'sqlite')
+def _date_add_days_sqlite(element, compiler, **kw):
+    date, days = list(element.clauses)
+    return f"date({compiler.process(date, **kw)}, ({compiler.process(days, **kw)}) || ' days')"
@@ -0,0 +1,217 @@
+"""
+Delta sync for offline and mobile clients (GET /api/sync).
+
+A client keeps a watermark. GET /api/sync?since=<watermark> returns the rows
+it may see that were created or changed after it, the ids of rows deleted
+after it, and the watermark to send next time:
+
+    {"changes": {"ingredients": [...], "recipes": [...], "meal_plans": [...], "diet_logs": [...]},
+     "deleted": {"recipes": [12, 40], ...}, "watermark": "2026-10-19T08:15:02",
+     "full": false, "next_cursor": null}
+
+SOURCES, and who sees what:
+
+  * ingredients: every ingredient, with its nutrition and tags;
+  * recipes: the caller's recipes (every recipe for admins), with their
+    ingredient lines;
+  * meal_plans: the caller's plans, with their recipes;
+  * diet_logs: the caller's logs.
+
+Changes are found by Updated_At. MySQL bumps it on every UPDATE (ON UPDATE
+CURRENT_TIMESTAMP) and the models set it on ORM updates too. Child rows travel
+inside their parent, so adding, editing or removing a recipe's ingredient
+line, a plan's recipe or an ingredient's nutrition touches the parent's
+Updated_At (PARENTS). Deleted rows leave a Sync_Tombstone: rows deleted through
+the session get one from the hook below, bulk DELETEs call record_deletions().
+Deleting an account leaves none; its devices are signed out anyway.
+
+A sync covers since < Updated_At <= watermark, the watermark being the
+database clock minus SYNC_LAG_SECONDS, so a row stamped just before a slow
+commit is still picked up next time. Rows come oldest first, ?limit= (at most
+SYNC_PAGE_SIZE) per page; while next_cursor is set the client asks again with
+?cursor= and stores the watermark only after the last page. With no since,
+or one older than SYNC_TOMBSTONE_RETENTION_DAYS (tombstones are pruned after
+that), or one from before the user was moved to another shard (move_user
+gives their rows new ids), every visible row is returned with "full": true
+and the client replaces its copy.
+
+Before reading any rows, one statement asks whether each source has changes
+in the window (EXISTS on the Updated_At indexes), so an up to date client
+costs one cheap query; two with shards, as user tables live on the user's
+shard and the catalog and tombstones on the global database.
+
+Existing MySQL databases need the tombstone table (db.create_all() creates
+it) and the indexes:
+
+    CREATE INDEX ix_Ingredient_Updated ON Ingredient (Updated_At);
+    CREATE INDEX ix_Recipe_Updated ON Recipe (Updated_At);
+    CREATE INDEX ix_Recipe_Creator_Updated ON Recipe (Creator_User_ID, Updated_At);
+    CREATE INDEX ix_Meal_Plan_User_Updated ON Meal_Plan (User_ID, Updated_At);
+    CREATE INDEX ix_User_Diet_Log_User_Updated ON User_Diet_Log (User_ID, Updated_At);
+"""
+import datetime
+import itertools
+
+from flask import current_app
+from sqlalchemy import and_, delete, event, func, or_, select, true
+
+from .extensions import db
+from .models import (
+    Ingredient, Meal_Plan, MealPlan_Recipe, Nutrition, Recipe, Recipe_Ingredient, Sync_Tombstone, User_Diet_Log, User_Shard
+)
+from .sharding import USER_SHARDED_TABLES, ShardedSession, sharding_enabled
+
+# Source name -> model, in the order a sync pages through them; deletions come last
+SOURCES = {
+    'ingredients': Ingredient,
+    'recipes': Recipe,
+    'meal_plans': Meal_Plan,
+    'diet_logs': User_Diet_Log,
+}
+DELETED = 'deleted'
+STREAMS = (*SOURCES, DELETED)
+SOURCE_FOR_TABLE = {model.__tablename__: name for name, model in SOURCES.items()}
+
+# Synced model -> the column naming whose devices see its tombstone (None: everyone's)
+OWNER_COLUMNS = {Ingredient: None, Recipe: 'Creator_User_ID', Meal_Plan: 'User_ID', User_Diet_Log: 'User_ID'}
+# Child model -> (parent model, foreign key): the child is synced inside its parent
+PARENTS = {
+    Recipe_Ingredient: (Recipe, 'Recipe_ID'),
+    MealPlan_Recipe: (Meal_Plan, 'MealPlan_ID'),
+    Nutrition: (Ingredient, 'Ingredient_ID'),
+}
+
+
+def primary_key(model):
+    return model.__table__.primary_key.columns[0]
+
+
+def visible(name, user_id, is_admin):
+    """WHERE clause for the rows of stream `name` the caller may see."""
+    if name == 'ingredients':
+        return true()
+    if name == 'recipes':
+        return true() if is_admin else Recipe.Creator_User_ID == user_id
+    if name == DELETED:
+        return true() if is_admin else or_(Sync_Tombstone.User_ID == user_id, Sync_Tombstone.User_ID.is_(None))
+    return SOURCES[name].User_ID == user_id
+
+
+def stamp_column(name):
+    return Sync_Tombstone.Deleted_At if name == DELETED else SOURCES[name].Updated_At
+
+
+def id_column(name):
+    return Sync_Tombstone.Tombstone_ID if name == DELETED else primary_key(SOURCES[name])
+
+
+def window(name, since, until, after=None):
+    """
+    WHERE clause for stream rows stamped in (since, until], either end open
+    when None, and past the keyset position after=(stamp, id).
+    """
+    stamp = stamp_column(name)
+    clause = true()
+    if since is not None:
+        clause = clause & (stamp > since)
+    if until is not None:
+        clause = clause & (stamp <= until)
+    if after is not None:
+        clause = clause & or_(stamp > after[0], and_(stamp == after[0], id_column(name) > after[1]))
+    return clause
+
+
+def sync_window(user_id, is_admin, since):
+    """
+    (since, until, full, names of the streams with changes) for a sync from
+    `since`, asked in one statement per database. since comes back None for
+    a full sync: none given, or older than the tombstones kept.
+    """
+    groups = [STREAMS]
+    if sharding_enabled():
+        # User tables are on the user's shard; the catalog and tombstones on the global database
+        groups = [[name for name in STREAMS if _on_shard(name)], [name for name in STREAMS if not _on_shard(name)]]
+
+    changed, now, moved = set(), None, False
+    for group in groups:
+        probes = [select(id_column(name)).where(visible(name, user_id, is_admin), window(name, since, None)).exists()
+                  for name in group]
+        with_clock = DELETED in group # The global database's clock, which stamps tombstones
+        if with_clock:
+            probes.append(func.current_timestamp())
+            if sharding_enabled() and since is not None:
+                # move_user re-numbers the user's rows and leaves no tombstones for the old ids
+                probes.append(select(User_Shard.User_ID)
+                              .where(User_Shard.User_ID == user_id, User_Shard.Moved_At > since).exists())
+        row = db.session.execute(select(*probes)).one()
+        changed.update(name for name, flag in zip(group, row) if flag)
+        if with_clock:
+            now = row[len(group)]
+            moved = len(row) > len(group) + 1 and bool(row[-1])
+    until = now - datetime.timedelta(seconds=current_app.config['SYNC_LAG_SECONDS'])
+
+    retention = datetime.timedelta(days=current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'])
+    if since is None:
+        changed.discard(DELETED) # A full sync replaces the client's copy
+        return None, until, True, changed
+    if since < until - retention or moved:
+        return None, until, True, set(SOURCES) # Probed from `since`, so any source may have rows
+    if since >= until:
+        return since, since, False, set() # Synced within the lag: nothing new yet
+    return since, until, False, changed
+
+
+def _on_shard(name):
+    return name != DELETED and SOURCES[name].__tablename__ in USER_SHARDED_TABLES
+
+
+def keyset_position(name, row):
+    """(stamp, id) of a row read from stream `name`, for the next page to start after."""
+    return getattr(row, stamp_column(name).key), getattr(row, id_column(name).key)
+
+
+def read_stream(name, user_id, is_admin, since, until, after, limit, options=()):
+    """Up to `limit` rows of stream `name` in the window, oldest first."""
+    model = Sync_Tombstone if name == DELETED else SOURCES[name]
+    stmt = select(model)\
+        .where(visible(name, user_id, is_admin), window(name, since, until, after))\
+        .order_by(stamp_column(name), id_column(name))\
+        .limit(limit)
+    return db.session.scalars(stmt.options(*options)).unique().all()
+
+
+# --- Write side ---
+
+def record_deletions(model, ids, user_id):
+    """Tombstones for rows of a synced model deleted with a bulk DELETE. Call before commit."""
+    db.session.add_all(
+        Sync_Tombstone(Table_Name=model.__tablename__, Row_ID=row_id, User_ID=user_id) for row_id in ids
+    )
+
+
+@event.listens_for(ShardedSession, 'before_flush')
+def _record_sync_changes(session, flush_context, instances):
+    tombstones, parents = [], set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        model = type(obj)
+        if model in PARENTS and (obj not in session.dirty or session.is_modified(obj)):
+            parent_model, foreign_key = PARENTS[model]
+            parents.add((parent_model, getattr(obj, foreign_key)))
+        if model in OWNER_COLUMNS and obj in session.deleted:
+            owner = OWNER_COLUMNS[model]
+            tombstones.append(Sync_Tombstone(Table_Name=model.__tablename__, Row_ID=getattr(obj, primary_key(model).key),
+                                             User_ID=getattr(obj, owner) if owner else None))
+    session.add_all(tombstones)
+    for parent_model, parent_id in parents:
+        parent = session.get(parent_model, parent_id) if parent_id is not None else None
+        if parent is not None and parent not in session.deleted:
+            parent.Updated_At = func.current_timestamp()
+
+
+def prune_tombstones():
+    """Deletes tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS. Returns how many."""
+    now = db.session.scalar(select(func.current_timestamp())) # The clock Deleted_At was stamped with
+    cutoff = now - datetime.timedelta(days=current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'])
+    result = db.session.execute(delete(Sync_Tombstone).where(Sync_Tombstone.Deleted_At < cutoff))
+    db.session.commit()
+    return result.rowcount
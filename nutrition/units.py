@@ -0,0 +1,36 @@
+"""Unit conversion for recipe quantities (mass and volume; counts are left as they are)."""
+from decimal import Decimal
+
+# unit -> (dimension, size in the dimension's base unit: grams or millilitres)
+UNITS = {
+    'mg': ('mass', Decimal('0.001')),
+    'g': ('mass', Decimal('1')),
+    'gram': ('mass', Decimal('1')),
+    'grams': ('mass', Decimal('1')),
+    'kg': ('mass', Decimal('1000')),
+    'oz': ('mass', Decimal('28.349523125')),
+    'lb': ('mass', Decimal('453.59237')),
+    'lbs': ('mass', Decimal('453.59237')),
+    'ml': ('volume', Decimal('1')),
+    'l': ('volume', Decimal('1000')),
+    'tsp': ('volume', Decimal('4.92892159375')),
+    'tbsp': ('volume', Decimal('14.78676478125')),
+    'cup': ('volume', Decimal('236.5882365')),
+    'cups': ('volume', Decimal('236.5882365')),
+    'fl oz': ('volume', Decimal('29.5735295625')),
+}
+
+
+def normalize_unit(unit):
+    return (unit or '').strip().lower().rstrip('.')
+
+
+def convert_quantity(quantity, from_unit, to_unit):
+    """quantity in from_unit expressed in to_unit, or None if the units are not convertible."""
+    from_unit, to_unit = normalize_unit(from_unit), normalize_unit(to_unit)
+    if from_unit == to_unit:
+        return Decimal(quantity)
+    source, target = UNITS.get(from_unit), UNITS.get(to_unit)
+    if not source or not target or source[0] != target[0]:
+        return None
+    return Decimal(quantity) * source[1] / target[1]
@@ -0,0 +1,39 @@
+"""Warmup tasks run by gunicorn.conf.py before a worker accepts traffic."""
+import time
+
+from sqlalchemy import text
+
+from .extensions import db
+
+WARMUP_TASKS = []
+
+def warmup_task(fn):
+    """Registers a function to run in each worker before it serves its first request."""
+    WARMUP_TASKS.append(fn)
+    return fn
+
+@warmup_task
+def warm_connection_pool():
+    """Opens pool_size connections (per database, shards included) up front so early requests skip the MySQL handshake."""
+    connections = []
+    for engine in db.engines.values():
+        pool_size = getattr(engine.pool, 'size', lambda: 1)()
+        connections += [engine.connect() for _ in range(pool_size)]
+    for conn in connections:
+        conn.execute(text('SELECT 1'))
+    for conn in connections:
+        conn.close()
+
+def run_warmup(app):
+    """Runs every warmup task, logging failures instead of raising. Returns timings in ms."""
+    timings = {}
+    with app.app_context():
+        for task in WARMUP_TASKS:
+            start = time.perf_counter()
+            try:
+                task()
+            except Exception as e:
+                app.logger.warning("Warmup task %s failed: %s", task.__name__, e)
+            timings[task.__name__] = round((time.perf_counter() - start) * 1000, 1)
+        db.session.remove()
+    return timings
@@ -0,0 +1,35 @@
+"""
+Production launcher: prefork gunicorn workers with the app preloaded and warmed up.
+
+    python serve.py                  # Flask app (app:app) on threaded (gthread) workers
+    python serve.py --asgi           # asgi:application on uvicorn workers (experimental, see asgi.py)
+    python serve.py -- --bind :8080  # anything after -- goes straight to gunicorn
+
+Settings live in gunicorn.conf.py and can be overridden from the environment.
+"""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start the production server.")
+    parser.add_argument('--asgi', action='store_true', help="Serve asgi:application with uvicorn workers (experimental)")
+    parser.add_argument('gunicorn_args', nargs=argparse.REMAINDER, help="Extra arguments for gunicorn (after --)")
+    args = parser.parse_args()
+
+    extra = [a for a in args.gunicorn_args if a != '--']
+    command = [sys.executable, '-m', 'gunicorn', '--config', os.path.join(HERE, 'gunicorn.conf.py'), '--chdir', HERE]
+    if args.asgi:
+        print("serve.py: the ASGI mode is experimental; it has not been load-tested against MySQL (see asgi.py)",
+              file=sys.stderr, flush=True)
+        command += ['--worker-class', 'uvicorn.workers.UvicornWorker', 'asgi:application']
+    else:
+        command += ['app:app']
+    os.execvp(command[0], command + extra)
+
+
+if __name__ == '__main__':
+    main()
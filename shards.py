@@ -0,0 +1,69 @@
+"""
+Shard management for SHARD_DATABASE_URLS (see nutrition/sharding.py).
+
+    python shards.py init                 create tables, fill the directory from existing users
+    python shards.py sync-catalog         copy Ingredient/Nutrition/Recipe/Recipe_Ingredient to every shard
+    python shards.py status               users per shard
+    python shards.py move-user 42 shard1  move a user (and everything they own) to another shard
+
+Moving from one database to shards: list the current database first, e.g.
+
+    DATABASE_URL=mysql+pymysql://.../NutritionDB \
+    SHARD_DATABASE_URLS=mysql+pymysql://.../NutritionDB,mysql+pymysql://.../NutritionShard1 \
+    python shards.py init
+
+Existing users stay where they are (shard0); new users are spread over all
+shards by User_ID. Install the stored procedures on every shard too: they run
+next to the user's rows and read the catalog copy there.
+
+Locally, SQLite files work for all of it:
+
+    DATABASE_URL=sqlite:////tmp/global.db \
+    SHARD_DATABASE_URLS=sqlite:////tmp/shard0.db,sqlite:////tmp/shard1.db \
+    python shards.py init
+"""
+import argparse
+import json
+
+from nutrition import create_app
+from nutrition.sharding import adopt_existing_users, copy_catalog, create_schemas, get_router, move_user, shard_status
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage user shards.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('init', help="Create missing tables everywhere and add existing users to the directory")
+    commands.add_parser('sync-catalog', help="Copy the whole catalog from the global database to every shard")
+    commands.add_parser('status', help="Show users per shard")
+    move = commands.add_parser('move-user', help="Move one user to another shard")
+    move.add_argument('user_id', type=int)
+    move.add_argument('shard', help="Target shard, e.g. shard1")
+    move.add_argument('--settle-seconds', type=float, default=None,
+                      help="Wait after locking the user (default: SHARD_DIRECTORY_CACHE_SECONDS + 1)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if get_router() is None:
+            parser.error("SHARD_DATABASE_URLS is not set")
+
+        if args.command == 'init':
+            create_schemas()
+            print(f"Added {adopt_existing_users()} existing user(s) to the directory")
+            copy_catalog()
+            print("Catalog copied to every shard")
+        elif args.command == 'sync-catalog':
+            copy_catalog()
+            print("Catalog copied to every shard")
+        elif args.command == 'status':
+            print(json.dumps(shard_status(), indent=2))
+        elif args.command == 'move-user':
+            if args.shard not in get_router().keys:
+                parser.error(f"Unknown shard {args.shard}; shards are {', '.join(get_router().keys)}")
+            counts = move_user(args.user_id, args.shard, settle_seconds=args.settle_seconds)
+            print(f"User {args.user_id} is on {args.shard}" + (f" (moved {json.dumps(counts)})" if counts else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Background job worker.
+
+Runs the jobs queued in the Background_Job table (see nutrition/jobs.py).
+Start it next to the web server:
+
+    python worker.py --concurrency 4
+
+Concurrency can also be set with the JOB_WORKER_CONCURRENCY environment variable.
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+
+from nutrition import create_app
+from nutrition.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+app = create_app()
+
+
+def worker_loop(worker_id, stop_event, poll_interval, drain):
+    # Each thread gets its own app context, and with it its own DB session.
+    with app.app_context():
+        while not stop_event.is_set():
+            job = claim_next_job(worker_id)
+            if job is None:
+                if drain:
+                    return
+                stop_event.wait(poll_interval)
+                continue
+            job = run_job(job)
+            print(f"[{worker_id}] job {job.Job_ID} ({job.Job_Type}) -> {job.Status}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued background jobs.")
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('JOB_WORKER_CONCURRENCY', 2)),
+                        help="Number of jobs to run at the same time (default: 2)")
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help="Seconds to sleep when the queue is empty (default: 1.0)")
+    parser.add_argument('--drain', action='store_true',
+                        help="Exit once the queue is empty instead of polling forever")
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+    with app.app_context():
+        requeued = requeue_stale_jobs()
+        if requeued:
+            print(f"Requeued {requeued} stale job(s)", flush=True)
+
+    host = socket.gethostname()
+    threads = []
+    for i in range(max(1, args.concurrency)):
+        worker_id = f"{host}:{os.getpid()}:{i}"
+        t = threading.Thread(target=worker_loop, args=(worker_id, stop_event, args.poll_interval, args.drain), daemon=True)
+        t.start()
+        threads.append(t)
+
+    print(f"Worker started with concurrency {len(threads)}", flush=True)
+    last_requeue = time.monotonic()
+    while any(t.is_alive() for t in threads):
+        time.sleep(0.5)
+        # Pick up jobs left behind by workers that died mid-run.
+        if time.monotonic() - last_requeue > 60:
+            with app.app_context():
+                requeue_stale_jobs()
+            last_requeue = time.monotonic()
+
+
+if __name__ == '__main__':
+    main()